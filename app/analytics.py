@@ -3,6 +3,8 @@ from fastapi import HTTPException
 from typing import List
 import asyncio
 import aiohttp
+from app.metrics import track_upstream
+from app.upstreams import GA4_ADMIN_API_URL, GA4_DATA_API_URL
 
 async def fetch_metrics_batch(session, url: str, headers: dict, dimensions: List[dict], metrics: List[dict], date_ranges: List[dict]) -> dict:
     body = {
@@ -11,18 +13,19 @@ async def fetch_metrics_batch(session, url: str, headers: dict, dimensions: List
         "dateRanges": date_ranges
     }
     
-    async with session.post(url, headers=headers, json=body) as response:
-        if response.status != 200:
-            text = await response.text()
-            raise HTTPException(status_code=response.status, detail=f"Error fetching GA4 metrics: {text}")
-        return await response.json()
+    with track_upstream("ga4"):
+        async with session.post(url, headers=headers, json=body) as response:
+            if response.status != 200:
+                text = await response.text()
+                raise HTTPException(status_code=response.status, detail=f"Error fetching GA4 metrics: {text}")
+            return await response.json()
 
 async def get_ga4_metrics_async(token: str, property_id: str):
     # Ensure property_id doesn't contain 'properties/' prefix
     if "properties/" in property_id:
         property_id = property_id.split("/")[1]
 
-    url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}:runReport"
+    url = f"{GA4_DATA_API_URL}/properties/{property_id}:runReport"
     headers = {"Authorization": f"Bearer {token}"}
     
     # Split dimensions into batches of 9 or fewer
@@ -166,9 +169,10 @@ def get_user_analytics_data(token: str):
 
 def get_ga4_properties(token: str):
     headers = {"Authorization": f"Bearer {token}"}
-    ga4_accounts_url = "https://analyticsadmin.googleapis.com/v1beta/accountSummaries"
+    ga4_accounts_url = f"{GA4_ADMIN_API_URL}/accountSummaries"
     
-    response = requests.get(ga4_accounts_url, headers=headers)
+    with track_upstream("ga4"):
+        response = requests.get(ga4_accounts_url, headers=headers)
     
     if response.status_code != 200:
         error_message = response.json().get("error", {}).get("message", "Unknown error")
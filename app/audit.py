@@ -0,0 +1,325 @@
+# app/audit.py
+# Runs the collectors of a site audit. Shared by the HTML pages and the JSON API.
+import asyncio
+import logging
+import os
+import socket
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app import cert_watch
+from app.cache import COLLECTOR_TTLS, NullCache, cache_key, compute_and_store, get_cache, is_cacheable, lookup
+from app.collectors import public_names, register, run_graph
+from app.executors import COLLECTOR_POOLS, POOL_SPECS, run_in_pool
+from app.http_probe import probe_http
+from app.lazy import lazy
+from app.lighthouse_metrics import get_lighthouse_metrics
+from app.metrics import track_collector
+from app.news_fetcher import fetch_news
+from app.resilience import COLLECTOR_UPSTREAMS, UpstreamUnavailable, is_available
+from app.singleflight import SingleFlight
+from app.ssl_audit import check_ssl
+from app.targets import Target, canonicalize
+from app.url_resolver import resolve_canonical_url
+
+PAGE_SPEED_API_KEY = os.getenv("GOOGLE_SEARCH_API_KEY")
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "4"))  # Sites audited at once across all bulk requests
+MAX_BULK_URLS = int(os.getenv("MAX_BULK_URLS", "1000"))
+CSV_HEADERS = {"url", "urls", "domain", "site", "website"}  # First-column names skipped in uploaded lists
+# Answer the ssl section from a local TLS probe while the SSL Labs assessment runs in the background
+TLS_PROBE = os.getenv("TLS_PROBE", "on").lower() not in ("off", "0", "false")
+
+logger = logging.getLogger(__name__)
+
+# Collectors behind heavy imports (pandas, bs4, whois, cryptography) load on first use
+describe_page = lazy("app.description", "describe_page")
+get_meta_tags = lazy("app.description", "get_meta_tags")
+fetch_document = lazy("app.homepage", "fetch_document")
+get_whois_data = lazy("app.domain_whois", "get_whois_data")
+get_social_media_info = lazy("app.socials", "get_social_media_info")
+analyze_keyword = lazy("app.trends", "analyze_keyword")
+probe_tls = lazy("app.tls_probe", "probe_tls")
+
+# Background collector runs by collector and cache key, referenced so they aren't garbage collected mid-flight
+_background: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+async def _fill_in(name: str, func, *args):
+    try:
+        await run_collector(name, func, *args)
+    except Exception as e:
+        logger.warning(f"Background {name} run failed: {type(e).__name__}: {e}")
+
+
+def background_limit(name: str) -> int:
+    """Background runs of a collector allowed at once, half its pool's queue so audits still get a slot"""
+    pool = COLLECTOR_POOLS.get(name)
+    return max(1, POOL_SPECS[pool].queue_limit // 2) if pool else 1
+
+
+def fill_in_later(name: str, func, *args) -> bool:
+    """
+    Run a collector without waiting for it, its result lands in the shared cache for the next audit.
+    One run per host at a time, and none while background_limit() runs are going (e.g. during a
+    bulk audit); a skipped host is filled in when it is audited again. Returns whether a run started.
+    """
+    key = (name, cache_key(name, args[0]))
+    if key in _background:
+        return False
+    if sum(1 for running, _ in _background if running == name) >= background_limit(name):
+        logger.debug(f"Skipping background {name} run for {args[0]}, {background_limit(name)} already running")
+        return False
+    task = asyncio.ensure_future(_fill_in(name, func, *args))
+    _background[key] = task
+    task.add_done_callback(lambda _: _background.pop(key, None))
+    return True
+
+
+def resolve_site_url(target: Target) -> str:
+    """Where the site is served from; a target with a path is audited as given"""
+    return target.url if target.path else resolve_canonical_url(target.site_host)
+
+
+async def resolve_addresses(target: Target) -> List[str]:
+    """The site's IP addresses, looked up once per audit for every collector that connects to it"""
+    infos = await asyncio.get_running_loop().getaddrinfo(target.hostname, None, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+async def check_ssl_fast(target: Target, addresses: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    The graded SSL Labs result when it's cached, otherwise a local TLS probe
+    while SSL Labs assesses the site in the background. Without a shared
+    cache the assessment would have nowhere to land, so only the probe runs.
+    """
+    graded = await asyncio.to_thread(lookup, "ssl", target)
+    if graded is not None:
+        return graded
+    if not isinstance(get_cache(), NullCache):
+        fill_in_later("ssl", check_ssl, target)
+    return await probe_tls(target, addresses=addresses)
+
+
+def _lighthouse(target: Target, canonical_url: Optional[str]):
+    return get_lighthouse_metrics(target, PAGE_SPEED_API_KEY, canonical_url=canonical_url)
+
+
+def fetch_homepage(target: Target, canonical_url: Optional[str]):
+    # A bare domain is fetched where it's served from, without the redirect hops
+    return fetch_document(canonical_url or target.url)
+
+
+# Prerequisites, run once per audit for every collector that needs them
+register("canonical_url", resolve_site_url, cost="network", timeout=30, internal=True)
+register("dns", resolve_addresses, cost="network", timeout=10, internal=True)
+register("keyword", lambda target: target.site_host, cost="cheap", internal=True)
+# Downloaded and parsed once, read by every collector that looks at the page's HTML
+register("homepage", fetch_homepage, inputs=("target", "canonical_url"), internal=True)
+
+# Sections of an audit, in the order they're listed. Collectors in other modules register the same way.
+register("news", fetch_news)
+register("whois", get_whois_data)
+register("lighthouse", _lighthouse, inputs=("target", "canonical_url"), cost="expensive")
+register("http", probe_http, timeout=30)
+register("description", describe_page, inputs=("target", "homepage"), cost="cheap", default=(None, None))
+if TLS_PROBE:
+    register("ssl", check_ssl_fast, inputs=("target", "dns"))
+else:
+    register("ssl", check_ssl, cost="expensive")
+register("socials", get_social_media_info, inputs=("target", "homepage"), cost="expensive")
+register("trends", analyze_keyword, inputs=("keyword",), cost="expensive", default=(None, None))
+register("meta", get_meta_tags, inputs=("target", "homepage"), cost="cheap")
+
+
+def serialize_data(data: Any) -> Any:
+    """
+    Recursively serialize data to ensure JSON compatibility
+    """
+    if data is None:
+        return None
+    elif isinstance(data, (str, int, float, bool)):
+        return data
+    elif isinstance(data, dict):
+        return {k: serialize_data(v) for k, v in data.items() if v is not None}
+    elif isinstance(data, (list, tuple)):
+        return [serialize_data(item) for item in data if item is not None]
+    else:
+        return str(data)
+
+
+# Identical collector calls in flight at the same time share one execution
+collector_flights = SingleFlight("collector")
+
+
+async def run_collector(name: str, func, *args):
+    """
+    Run a blocking collector in its upstream's pool, timing it under its collector name.
+    Coroutine collectors are awaited on the loop. Either way, concurrent calls for the
+    same collector and target are coalesced into one run.
+    """
+    if asyncio.iscoroutinefunction(func):
+        with track_collector(name):
+            return await collector_flights.do(cache_key(name, args[0]), lambda: func(*args))
+    with track_collector(name):
+        return await collector_flights.do(cache_key(name, args[0]), lambda: _collect(name, func, *args))
+
+
+async def _collect(name: str, func, *args):
+    """
+    Results of cacheable collectors are shared with the other workers through app.cache,
+    and an expired result is served when the upstream fails or its circuit is open.
+    """
+    ttl = COLLECTOR_TTLS.get(name)
+    if not ttl:
+        return await _run_blocking(name, func, *args)
+
+    cached = await asyncio.to_thread(lookup, name, args[0])
+    if cached is not None:
+        return cached
+
+    upstream = COLLECTOR_UPSTREAMS.get(name)
+    try:
+        if upstream and not is_available(upstream):
+            raise UpstreamUnavailable(upstream, "circuit open")
+        result = await _run_blocking(name, compute_and_store, name, ttl, func, *args)
+    except Exception as e:
+        stale = await asyncio.to_thread(lookup, name, args[0], True)
+        if stale is None:
+            raise
+        logger.warning(f"Serving stale {name} result: {e}")
+        return stale
+
+    if is_cacheable(result):
+        return result
+    # The collector returned an error, an older result is more useful
+    stale = await asyncio.to_thread(lookup, name, args[0], True)
+    return stale if stale is not None else result
+
+
+async def _run_blocking(name: str, func, *args):
+    pool = COLLECTOR_POOLS.get(name)
+    if pool is None:
+        return await asyncio.to_thread(func, *args)
+    return await run_in_pool(pool, func, *args)
+
+
+async def run_section(name: str, func, *args, default: Any = None):
+    """Run one collector of the results page; a failure or timeout only blanks its own section"""
+    try:
+        return await run_collector(name, func, *args)
+    except Exception as e:
+        logger.error(f"{name} collector failed: {type(e).__name__}: {e}")
+        return default
+
+
+def parse_include(include: Optional[str]) -> List[str]:
+    """Collector names from a comma-separated ?include= value, all collectors if empty"""
+    available = public_names()
+    if not include:
+        return available
+    names = list(dict.fromkeys(name.strip() for name in include.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown collectors: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return names
+
+
+async def run_audit(target: Target, include: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Run the selected collectors and what they depend on, each as soon as its
+    inputs are ready and in the pool of its upstream, and return their raw
+    results by collector name.
+    """
+    results = await run_graph(target, include or public_names(), run_section)
+    if "ssl" in results:
+        await asyncio.to_thread(cert_watch.observe, target.host, results["ssl"])
+    return results
+
+
+def trend_json(trend_data, keyword: str) -> Optional[Dict[str, Any]]:
+    """Interest-over-time DataFrame as dates and popularity lists"""
+    if trend_data is None:
+        return None
+    return {
+        "dates": trend_data.index.strftime('%Y-%m-%d').tolist(),
+        "popularity": trend_data[keyword].tolist()
+    }
+
+
+def section_json(name: str, result: Any, target: Target) -> Any:
+    """JSON shape of one collector's result for the API"""
+    if name == "trends":
+        trend_data, rising_queries = result
+        return {
+            "interest": trend_json(trend_data, target.site_host),
+            "rising_queries": rising_queries.to_dict("records") if rising_queries is not None else None,
+        }
+    if name == "description" and isinstance(result, tuple):
+        title, description = result
+        return {"title": title, "description": description}
+    return serialize_data(result)
+
+
+def parse_url_list(text: str) -> List[str]:
+    """
+    URLs from an uploaded list, one per line. Blank lines, # comments and a
+    CSV header are skipped; CSV rows use their first column.
+    """
+    urls = []
+    for line in text.splitlines():
+        url = line.split(",", 1)[0].strip().strip('"')
+        if url and not url.startswith("#") and url.lower() not in CSV_HEADERS:
+            urls.append(url)
+    return urls
+
+
+# One semaphore per event loop, asyncio primitives can't be shared between loops
+_bulk_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _bulk_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _bulk_slots:
+        _bulk_slots[loop] = asyncio.Semaphore(BULK_CONCURRENCY)
+    return _bulk_slots[loop]
+
+
+async def _audit_one(index: int, url: str, include: Optional[List[str]]) -> Dict[str, Any]:
+    try:
+        target = canonicalize(url)
+    except ValueError as e:
+        return {"index": index, "url": url, "error": str(e)}
+    results = await run_audit(target, include)
+    collectors = {name: section_json(name, result, target) for name, result in results.items()}
+    return {"index": index, "url": url, "target": target.url, "collectors": collectors}
+
+
+async def audit_many(urls: List[str], include: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Audit a batch of URLs, yielding each site's results as soon as it finishes.
+    At most BULK_CONCURRENCY sites are audited at once over all batches, and
+    workers pause while the consumer is behind, so a batch never piles up in memory.
+    """
+    pending = iter(enumerate(urls))
+    finished: asyncio.Queue = asyncio.Queue(maxsize=BULK_CONCURRENCY)
+    slots = _bulk_semaphore()
+
+    async def worker():
+        for index, url in pending:
+            async with slots:
+                try:
+                    result = await _audit_one(index, url, include)
+                except Exception as e:
+                    # Every URL must produce a line, or the consumer waits for it forever
+                    logger.exception(f"Bulk audit of {url} failed")
+                    result = {"index": index, "url": url, "error": f"{type(e).__name__}: {e}"}
+            await finished.put(result)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(BULK_CONCURRENCY, len(urls)))]
+    try:
+        for _ in range(len(urls)):
+            yield await finished.get()
+    finally:
+        # The client went away or the batch is done, stop the remaining audits
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,212 @@
+# app/cache.py
+import logging
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.metrics import CACHE_REQUESTS, record_cache
+from app.targets import Target
+
+# "sqlite" (default) shares results between the workers on one host, "redis" between hosts, "none" disables caching
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+CACHE_PATH = os.getenv("CACHE_PATH", "webly_cache.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = "webly:"
+# Expired results are kept this much longer, to serve while their upstream is down
+STALE_TTL = int(os.getenv("CACHE_STALE_TTL", 7 * 24 * 3600))
+
+# How long each collector's result is reused, in seconds
+COLLECTOR_TTLS: Dict[str, int] = {
+    "lighthouse": int(os.getenv("CACHE_TTL_LIGHTHOUSE", 6 * 3600)),
+    "ssl": int(os.getenv("CACHE_TTL_SSL", 24 * 3600)),
+    "whois": int(os.getenv("CACHE_TTL_WHOIS", 24 * 3600)),
+    "news": int(os.getenv("CACHE_TTL_NEWS", 3600)),
+    "trends": int(os.getenv("CACHE_TTL_TRENDS", 12 * 3600)),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Byte-oriented key/value store with per-key expiry"""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a local SQLite file. WAL mode lets every worker process on the
+    host read while one writes, and entries survive restarts.
+    """
+
+    PURGE_PROBABILITY = 0.01  # Share of writes that also drop expired rows
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl))
+            if random.random() < self.PURGE_PROBABILITY:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def delete(self, key: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache in Redis, for workers spread over several hosts. Only GET, SET EX
+    and DEL are used, so any client with the redis-py interface works,
+    including an in-memory stand-in such as fakeredis.
+    """
+
+    def __init__(self, url: str = REDIS_URL, client: Any = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+
+def create_cache(backend: str = CACHE_BACKEND) -> CacheBackend:
+    if backend == "sqlite":
+        return SQLiteCache()
+    if backend == "redis":
+        return RedisCache()
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = create_cache()
+        return _cache
+
+
+def set_cache(cache: CacheBackend):
+    """Swap the process-wide backend, e.g. for a Redis stand-in"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def cache_key(namespace: str, subject: Any) -> str:
+    if isinstance(subject, Target):
+        subject = subject.key
+    return f"{CACHE_KEY_PREFIX}{namespace}:{subject}"
+
+
+def is_cacheable(value: Any) -> bool:
+    """Errors and empty results are retried on the next request instead of being reused"""
+    if value is None:
+        return False
+    if isinstance(value, (list, dict)) and not value:
+        return False
+    if isinstance(value, dict) and "error" in value:
+        return False
+    if isinstance(value, tuple) and all(item is None for item in value):
+        return False
+    return True
+
+
+def lookup(namespace: str, subject: Any, allow_stale: bool = False) -> Any:
+    """
+    Cached value for a subject, or None. Backend failures count as misses.
+    With allow_stale, results past their TTL are returned too.
+    """
+    try:
+        raw = get_cache().get(cache_key(namespace, subject))
+        fresh_until, value = pickle.loads(raw) if raw is not None else (0, None)
+    except Exception as e:
+        logger.warning(f"Cache read failed for {namespace}: {e}")
+        fresh_until, value = 0, None
+
+    if allow_stale:
+        if value is not None:
+            CACHE_REQUESTS.inc(f"shared_{namespace}", "stale")
+        return value
+    if fresh_until < time.time():
+        value = None
+    record_cache(f"shared_{namespace}", value is not None)
+    return value
+
+
+def store(namespace: str, subject: Any, value: Any, ttl: float):
+    if not is_cacheable(value):
+        return
+    entry = (time.time() + ttl, value)
+    try:
+        get_cache().set(cache_key(namespace, subject), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), ttl + STALE_TTL)
+    except Exception as e:
+        logger.warning(f"Cache write failed for {namespace}: {e}")
+
+
+def compute_and_store(namespace: str, ttl: float, func: Callable, *args) -> Any:
+    """Run a collector and share its result with every other worker"""
+    value = func(*args)
+    store(namespace, args[0], value, ttl)
+    return value
@@ -0,0 +1,268 @@
+# app/cert_watch.py
+"""
+Certificate expiry watch. Every domain's notAfter is stored in SQLite when the
+ssl collector sees it; a scheduler keeps the domains in a min-heap ordered by
+next check and re-probes them on a bounded pool of async workers. Domains near
+expiry are checked often, stable ones rarely.
+
+    python -m app.cert_watch              # run the scheduler in its own process
+"""
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.lazy import lazy
+from app.metrics import Counter, Gauge, registry
+from app.targets import as_target
+
+CERT_WATCH_DB = os.getenv("CERT_WATCH_DB", "cert_watch.db")
+CERT_WATCH_WORKERS = int(os.getenv("CERT_WATCH_WORKERS", "8"))
+MIN_INTERVAL = int(os.getenv("CERT_WATCH_MIN_INTERVAL", 3600))
+MAX_INTERVAL = int(os.getenv("CERT_WATCH_MAX_INTERVAL", 7 * 24 * 3600))
+RECHECK_SHARE = 0.1  # Re-check after this share of the remaining validity
+SYNC_INTERVAL = 60  # How often domains recorded by other processes are picked up
+
+logger = logging.getLogger(__name__)
+
+probe_tls = lazy("app.tls_probe", "probe_tls")
+
+WATCHED_DOMAINS = registry.register(Gauge(
+    "webly_cert_watch_domains", "Domains whose certificate expiry is watched"))
+CERT_CHECKS = registry.register(Counter(
+    "webly_cert_watch_checks_total", "Certificate re-checks by outcome", ("outcome",)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cert_watch (
+    domain TEXT PRIMARY KEY,
+    not_after REAL,
+    issuer TEXT,
+    next_check REAL NOT NULL,
+    last_checked REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cert_watch_updated ON cert_watch (updated_at);
+"""
+
+
+def _connect(db_path: str = CERT_WATCH_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def next_check_interval(not_after: Optional[float], now: Optional[float] = None) -> float:
+    """Seconds until the next check: a tenth of the remaining validity, within MIN/MAX_INTERVAL"""
+    if not_after is None:
+        return MIN_INTERVAL
+    remaining = not_after - (now or time.time())
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, remaining * RECHECK_SHARE))
+
+
+def certificate_expiry(ssl_result: Any) -> Tuple[Optional[float], Optional[str]]:
+    """notAfter (epoch seconds) and issuer from an ssl collector result, if it has them"""
+    if not isinstance(ssl_result, dict):
+        return None, None
+    certificates = ssl_result.get("certificates") or {}
+    not_after = certificates.get("not_after")
+    if not not_after:
+        return None, None
+    return datetime.fromisoformat(not_after).timestamp(), certificates.get("issuer")
+
+
+def record(domain: str, not_after: Optional[float], issuer: Optional[str] = None,
+           error: Optional[str] = None, db_path: str = CERT_WATCH_DB) -> float:
+    """Store a domain's certificate expiry and schedule its next check; returns that time"""
+    now = time.time()
+    next_check = now + next_check_interval(not_after, now)
+    with closing(_connect(db_path)) as conn, conn:
+        conn.execute(
+            """
+            INSERT INTO cert_watch (domain, not_after, issuer, next_check, last_checked, last_error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (domain) DO UPDATE SET
+                not_after = COALESCE(excluded.not_after, not_after),
+                issuer = COALESCE(excluded.issuer, issuer),
+                next_check = excluded.next_check,
+                last_checked = excluded.last_checked,
+                last_error = excluded.last_error,
+                updated_at = excluded.updated_at
+            """,
+            (domain, not_after, issuer, next_check, now, error, now),
+        )
+    return next_check
+
+
+def watch(domains: List[str], db_path: str = CERT_WATCH_DB):
+    """Start watching domains that aren't watched yet, with their first check due now"""
+    now = time.time()
+    with closing(_connect(db_path)) as conn, conn:
+        conn.executemany(
+            "INSERT INTO cert_watch (domain, next_check, updated_at) VALUES (?, ?, ?) ON CONFLICT (domain) DO NOTHING",
+            [(domain, now, now) for domain in domains],
+        )
+
+
+def observe(domain: str, ssl_result: Any, db_path: str = CERT_WATCH_DB):
+    """Called with every ssl collector result, starts watching the domain when it carries an expiry"""
+    not_after, issuer = certificate_expiry(ssl_result)
+    if not_after is None:
+        return
+    try:
+        record(domain, not_after, issuer, db_path=db_path)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record certificate expiry for {domain}: {e}")
+
+
+def list_watched(db_path: str = CERT_WATCH_DB) -> List[Dict[str, Any]]:
+    """Watched domains, soonest expiry first"""
+    with closing(_connect(db_path)) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM cert_watch ORDER BY not_after IS NULL, not_after").fetchall()
+    now = time.time()
+    return [
+        {**dict(row), "days_remaining": int((row["not_after"] - now) // 86400) if row["not_after"] else None}
+        for row in rows
+    ]
+
+
+class CertWatchScheduler:
+    """
+    Min-heap of (next_check, domain). The scheduler pops due domains onto a
+    bounded queue consumed by `workers` probe tasks; each result reschedules
+    its domain. Rescheduled or removed domains leave stale heap entries
+    behind, which are skipped when popped.
+    """
+
+    def __init__(self, db_path: str = CERT_WATCH_DB, workers: int = CERT_WATCH_WORKERS):
+        self.db_path = db_path
+        self.workers = workers
+        self._heap: List[Tuple[float, str]] = []
+        self._scheduled: Dict[str, float] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    def schedule(self, domain: str, when: float):
+        if self._scheduled.get(domain) == when:
+            return
+        self._scheduled[domain] = when
+        heapq.heappush(self._heap, (when, domain))
+        WATCHED_DOMAINS.set(value=len(self._scheduled))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def unschedule(self, domain: str):
+        self._scheduled.pop(domain, None)
+        WATCHED_DOMAINS.set(value=len(self._scheduled))
+
+    def _pop_due(self, now: float) -> Optional[str]:
+        while self._heap and self._heap[0][0] <= now:
+            when, domain = heapq.heappop(self._heap)
+            if self._scheduled.get(domain) == when:
+                del self._scheduled[domain]
+                return domain
+        return None
+
+    def _next_due(self) -> Optional[float]:
+        while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)  # Drop stale entries
+        return self._heap[0][0] if self._heap else None
+
+    async def sync(self):
+        """Pick up domains recorded or rescheduled since the last sync, e.g. by the web workers"""
+        since = self._synced_at
+        self._synced_at = time.time()
+
+        def load():
+            with closing(_connect(self.db_path)) as conn:
+                return conn.execute(
+                    "SELECT domain, next_check FROM cert_watch WHERE updated_at >= ?", (since,)
+                ).fetchall()
+
+        for domain, next_check in await asyncio.to_thread(load):
+            self.schedule(domain, next_check)
+
+    async def check(self, domain: str):
+        try:
+            result = await probe_tls(as_target(domain))
+            not_after, issuer = certificate_expiry(result)
+            error = result.get("error") if not_after is None else None
+        except Exception as e:
+            not_after, issuer, error = None, None, f"{type(e).__name__}: {e}"
+
+        CERT_CHECKS.inc("error" if error else "ok")
+        if error:
+            logger.warning(f"Certificate check for {domain} failed: {error}")
+        next_check = await asyncio.to_thread(record, domain, not_after, issuer, error, self.db_path)
+        self.schedule(domain, next_check)
+
+    async def _worker(self):
+        while True:
+            domain = await self._queue.get()
+            try:
+                await self.check(domain)
+            finally:
+                self._queue.task_done()
+
+    async def _dispatch(self):
+        while True:
+            if time.time() - self._synced_at >= SYNC_INTERVAL:
+                await self.sync()
+            now = time.time()
+            domain = self._pop_due(now)
+            if domain is not None:
+                await self._queue.put(domain)  # Waits while every worker is busy
+                continue
+
+            next_due = self._next_due()
+            timeout = SYNC_INTERVAL if next_due is None else min(SYNC_INTERVAL, next_due - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._wakeup = asyncio.Event()
+        await self.sync()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"cert-watch-{i}") for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._dispatch(), name="cert-watch-dispatch"))
+        logger.info(f"Watching {len(self)} certificates with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+async def _run_forever():
+    scheduler = CertWatchScheduler()
+    await scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await scheduler.stop()
+
+
+if __name__ == "__main__":
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    try:
+        asyncio.run(_run_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,116 @@
+# app/collectors.py
+"""
+Collector registry and dependency-graph scheduler. Each collector declares
+the values it needs (other collectors' outputs, or the audit target), its
+cost class and an optional timeout. An audit runs only what the requested
+collectors need, every prerequisite once, and starts each collector as soon
+as its inputs are ready.
+"""
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = "target"  # The audit target, always available as an input
+# cheap: computed inline on the event loop; network: blocking or async I/O run through the runner;
+# expensive: like network, but against quota-limited third-party APIs
+COST_CLASSES = ("cheap", "network", "expensive")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CollectorSpec:
+    name: str
+    func: Callable
+    inputs: Tuple[str, ...] = (ROOT,)
+    cost: str = "network"
+    timeout: Optional[float] = None  # Seconds, on top of the timeout of the collector's pool
+    default: Any = None  # Result when the collector fails or times out
+    internal: bool = False  # Prerequisites only, not requestable on their own
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "inputs": list(self.inputs), "cost": self.cost, "timeout": self.timeout,
+                "internal": self.internal}
+
+
+REGISTRY: Dict[str, CollectorSpec] = {}
+
+
+def register(name: str, func: Callable, inputs: Tuple[str, ...] = (ROOT,), cost: str = "network",
+             timeout: Optional[float] = None, default: Any = None, internal: bool = False) -> CollectorSpec:
+    """
+    Add a collector. `func` is called with the values of `inputs` in order;
+    the first input also keys its shared cache entry.
+    """
+    if cost not in COST_CLASSES:
+        raise ValueError(f"Unknown cost class {cost!r} for collector {name}")
+    spec = CollectorSpec(name, func, tuple(inputs), cost, timeout, default, internal)
+    REGISTRY[name] = spec
+    return spec
+
+
+def public_names() -> List[str]:
+    """Collectors a caller can request, in registration order"""
+    return [name for name, spec in REGISTRY.items() if not spec.internal]
+
+
+def plan(include: List[str]) -> List[str]:
+    """The requested collectors and everything they depend on, dependencies first"""
+    order: List[str] = []
+    visiting: List[str] = []
+
+    def visit(name: str):
+        if name in order or name == ROOT:
+            return
+        if name in visiting:
+            raise ValueError(f"Collector dependency cycle: {' -> '.join(visiting + [name])}")
+        spec = REGISTRY.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown collector: {name}")
+        visiting.append(name)
+        for dependency in spec.inputs:
+            visit(dependency)
+        visiting.pop()
+        order.append(name)
+
+    for name in include:
+        visit(name)
+    return order
+
+
+Runner = Callable[..., Awaitable[Any]]
+
+
+async def _run_node(spec: CollectorSpec, values: List[Any], runner: Runner) -> Any:
+    try:
+        if spec.cost == "cheap":
+            result = spec.func(*values)
+            return await result if inspect.isawaitable(result) else result
+        call = runner(spec.name, spec.func, *values, default=spec.default)
+        return await (asyncio.wait_for(call, spec.timeout) if spec.timeout else call)
+    except asyncio.TimeoutError:
+        logger.error(f"{spec.name} collector timed out after {spec.timeout}s")
+    except Exception as e:
+        logger.error(f"{spec.name} collector failed: {type(e).__name__}: {e}")
+    return spec.default
+
+
+async def run_graph(target: Any, include: List[str], runner: Runner) -> Dict[str, Any]:
+    """
+    Run the requested collectors and their prerequisites for one target.
+    `runner(name, func, *args, default=...)` executes a non-cheap collector.
+    Returns the results of the requested collectors only.
+    """
+    tasks: Dict[str, asyncio.Future] = {}
+
+    async def run(spec: CollectorSpec) -> Any:
+        values = [target if name == ROOT else await tasks[name] for name in spec.inputs]
+        return await _run_node(spec, values, runner)
+
+    # plan() puts dependencies first, so every task can find the tasks it waits on
+    for name in plan(include):
+        tasks[name] = asyncio.ensure_future(run(REGISTRY[name]))
+    await asyncio.gather(*tasks.values())
+    return {name: tasks[name].result() for name in include}
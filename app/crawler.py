@@ -0,0 +1,539 @@
+# app/crawler.py
+"""
+Sitemap-driven site crawler for page-level metadata. Reads robots.txt and the
+sitemaps it lists (sitemap indexes and .gz included), then fetches every page
+with bounded concurrency and per-host politeness, parsing only up to </head>.
+Discovered URLs and per-page results are streamed to SQLite in batches, so
+memory stays flat however large the site is, and duplicate or missing titles
+and descriptions are reported with SQL. Crawls queued by the web app are run
+by a separate worker process, which resumes the crawls a stopped worker left
+behind from their pending pages.
+
+    python -m app.crawler example.com     # crawl a site and print its report
+    python -m app.crawler --worker        # run queued crawls until stopped
+"""
+import asyncio
+import codecs
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import asynccontextmanager, closing
+from html.parser import HTMLParser
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urldefrag
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import XMLPullParser
+
+from app.metrics import Counter, registry
+from app.targets import Target, canonicalize
+from app.url_resolver import resolve_canonical_url
+
+CRAWL_DB = os.getenv("CRAWL_DB", "crawl.db")
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))  # Pages fetched at once per crawl
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))  # Of which at most this many on one host
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "0.25"))  # Seconds between request starts on one host
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "50000"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "15"))
+CRAWL_POLL_INTERVAL = float(os.getenv("CRAWL_POLL_INTERVAL", "5"))  # Seconds between checks for queued crawls
+CRAWL_MAX_ATTEMPTS = int(os.getenv("CRAWL_MAX_ATTEMPTS", "3"))  # Times an interrupted crawl is resumed
+HEARTBEAT_INTERVAL = 30  # Seconds between a running crawl's heartbeats
+STALE_AFTER = 4 * HEARTBEAT_INTERVAL  # A running crawl without a heartbeat this long has lost its worker
+HEAD_MAX_BYTES = 256 * 1024  # Stop reading a page here even if </head> hasn't shown up
+MAX_SITEMAPS = 1000
+BATCH_SIZE = 200  # Rows per SQLite write, and URLs per read of the pending list
+CHUNK_SIZE = 16 * 1024
+USER_AGENT = "Mozilla/5.0 (compatible; webly-crawler)"
+ROBOTS_AGENT = "webly-crawler"
+
+logger = logging.getLogger(__name__)
+
+CRAWLED_PAGES = registry.register(Counter(
+    "webly_crawl_pages_total", "Pages fetched by the site crawler by outcome", ("outcome",)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site TEXT NOT NULL,
+    state TEXT NOT NULL,
+    sitemaps INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS crawl_pages (
+    crawl_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    status INTEGER,
+    final_url TEXT,
+    title TEXT,
+    description TEXT,
+    canonical TEXT,
+    robots TEXT,
+    error TEXT,
+    fetched_at REAL,
+    PRIMARY KEY (crawl_id, url)
+);
+CREATE INDEX IF NOT EXISTS crawl_pages_state ON crawl_pages (crawl_id, state);
+"""
+
+
+
+def _connect(db_path: str = CRAWL_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(crawls)")}
+    for column, definition in (("heartbeat_at", "REAL"), ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+        if column not in columns:  # Databases created before crawls were run by a worker
+            conn.execute(f"ALTER TABLE crawls ADD COLUMN {column} {definition}")
+    return conn
+
+
+def create_crawl(site: str, db_path: str = CRAWL_DB, state: str = "running") -> int:
+    now = time.time()
+    with closing(_connect(db_path)) as conn, conn:
+        cursor = conn.execute("INSERT INTO crawls (site, state, started_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                              (site, state, now, now))
+        return cursor.lastrowid
+
+
+def queue_crawl(site: str, db_path: str = CRAWL_DB) -> int:
+    """Queue a crawl of a site for the crawl worker; returns the id to poll crawl_report with"""
+    return create_crawl(canonicalize(site).site_host, db_path, state="queued")
+
+
+def claim_crawl(db_path: str = CRAWL_DB) -> Optional[Tuple[int, str]]:
+    """
+    Take the oldest queued crawl, or a running one whose worker stopped sending
+    heartbeats, and mark it running for this worker. Crawls interrupted
+    CRAWL_MAX_ATTEMPTS times are marked failed instead.
+    """
+    now = time.time()
+    with closing(_connect(db_path)) as conn, conn:
+        conn.execute(
+            "UPDATE crawls SET state = 'failed', error = 'Interrupted too often', finished_at = ? "
+            "WHERE state = 'running' AND heartbeat_at < ? AND attempts >= ?",
+            (now, now - STALE_AFTER, CRAWL_MAX_ATTEMPTS))
+        row = conn.execute(
+            "SELECT id, site FROM crawls WHERE state = 'queued' OR (state = 'running' AND heartbeat_at < ?) "
+            "ORDER BY id LIMIT 1", (now - STALE_AFTER,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE crawls SET state = 'running', heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?",
+                     (now, row[0]))
+    return row
+
+
+def _heartbeat(crawl_id: int, db_path: str):
+    with closing(_connect(db_path)) as conn, conn:
+        conn.execute("UPDATE crawls SET heartbeat_at = ? WHERE id = ?", (time.time(), crawl_id))
+
+
+def _page_count(crawl_id: int, db_path: str) -> int:
+    with closing(_connect(db_path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM crawl_pages WHERE crawl_id = ?", (crawl_id,)).fetchone()[0]
+
+
+def _finish_crawl(crawl_id: int, state: str, sitemaps: int, error: Optional[str], db_path: str):
+    with closing(_connect(db_path)) as conn, conn:
+        conn.execute("UPDATE crawls SET state = ?, sitemaps = ?, error = ?, finished_at = ? WHERE id = ?",
+                     (state, sitemaps, error, time.time(), crawl_id))
+
+
+def _add_urls(crawl_id: int, urls: List[str], db_path: str) -> int:
+    """Queue URLs that aren't queued yet; returns how many were new"""
+    with closing(_connect(db_path)) as conn, conn:
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO crawl_pages (crawl_id, url) VALUES (?, ?)",
+                         [(crawl_id, url) for url in urls])
+        return conn.total_changes - before
+
+
+def _pending(crawl_id: int, after: int, db_path: str) -> List[Tuple[int, str]]:
+    with closing(_connect(db_path)) as conn:
+        return conn.execute(
+            "SELECT rowid, url FROM crawl_pages WHERE crawl_id = ? AND state = 'pending' AND rowid > ? "
+            "ORDER BY rowid LIMIT ?", (crawl_id, after, BATCH_SIZE)).fetchall()
+
+
+def _store_pages(crawl_id: int, pages: List[Dict[str, Any]], db_path: str):
+    with closing(_connect(db_path)) as conn, conn:
+        conn.executemany(
+            """
+            UPDATE crawl_pages SET state = :state, status = :status, final_url = :final_url, title = :title,
+                description = :description, canonical = :canonical, robots = :robots, error = :error,
+                fetched_at = :fetched_at
+            WHERE crawl_id = :crawl_id AND url = :url
+            """,
+            [{"crawl_id": crawl_id, **page} for page in pages],
+        )
+
+
+def crawl_report(crawl_id: int, limit: int = 50, db_path: str = CRAWL_DB) -> Optional[Dict[str, Any]]:
+    """Progress of a crawl and its duplicate and missing titles and descriptions, `limit` of each"""
+    with closing(_connect(db_path)) as conn:
+        conn.row_factory = sqlite3.Row
+        crawl = conn.execute("SELECT * FROM crawls WHERE id = ?", (crawl_id,)).fetchone()
+        if crawl is None:
+            return None
+        counts = conn.execute(
+            """
+            SELECT COUNT(*) AS discovered,
+                   SUM(state != 'pending') AS fetched,
+                   SUM(state = 'ok') AS ok,
+                   SUM(state = 'error') AS errors,
+                   SUM(state = 'skipped') AS skipped,
+                   SUM(state = 'ok' AND COALESCE(title, '') = '') AS missing_title,
+                   SUM(state = 'ok' AND COALESCE(description, '') = '') AS missing_description
+            FROM crawl_pages WHERE crawl_id = ?
+            """, (crawl_id,)).fetchone()
+
+        def duplicates(column: str) -> List[Dict[str, Any]]:
+            rows = conn.execute(
+                f"""
+                SELECT {column} AS value, COUNT(*) AS pages FROM crawl_pages
+                WHERE crawl_id = ? AND state = 'ok' AND COALESCE({column}, '') != ''
+                GROUP BY {column} HAVING COUNT(*) > 1 ORDER BY pages DESC LIMIT ?
+                """, (crawl_id, limit)).fetchall()
+            return [
+                {**dict(row), "urls": [url for (url,) in conn.execute(
+                    f"SELECT url FROM crawl_pages WHERE crawl_id = ? AND state = 'ok' AND {column} = ? LIMIT 10",
+                    (crawl_id, row["value"]))]}
+                for row in rows
+            ]
+
+        def missing(column: str) -> List[str]:
+            return [url for (url,) in conn.execute(
+                f"SELECT url FROM crawl_pages WHERE crawl_id = ? AND state = 'ok' AND COALESCE({column}, '') = '' "
+                "LIMIT ?", (crawl_id, limit))]
+
+        return {
+            **dict(crawl),
+            **{key: counts[key] or 0 for key in counts.keys()},
+            "duplicate_titles": duplicates("title"),
+            "duplicate_descriptions": duplicates("description"),
+            "missing_titles": missing("title"),
+            "missing_descriptions": missing("description"),
+        }
+
+
+class HeadParser(HTMLParser):
+    """Title, meta description, robots and canonical link; done once <head> is over"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: Optional[str] = None
+        self.description: Optional[str] = None
+        self.robots: Optional[str] = None
+        self.canonical: Optional[str] = None
+        self.done = False
+        self._title_parts: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or "" for name, value in attrs}
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "meta" and attrs.get("name", "").lower() in ("description", "robots"):
+            setattr(self, attrs["name"].lower(), attrs.get("content", "").strip())
+        elif tag == "link" and "canonical" in attrs.get("rel", "").lower().split():
+            self.canonical = attrs.get("href")
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = " ".join("".join(self._title_parts).split())
+            self._title_parts = None
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+
+class HostThrottle:
+    """At most `per_host` requests in flight on each host, started at least `delay` seconds apart"""
+
+    def __init__(self, per_host: int = CRAWL_PER_HOST, delay: float = CRAWL_DELAY):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, 0.0))
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class SiteCrawler:
+    """One crawl of one site, from robots.txt to the last page"""
+
+    def __init__(self, site: str, db_path: str = CRAWL_DB, concurrency: int = CRAWL_CONCURRENCY,
+                 max_pages: int = CRAWL_MAX_PAGES):
+        self.target: Target = canonicalize(site)
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self.max_pages = max_pages
+        self.throttle = HostThrottle()
+        self.robots = RobotFileParser()
+        self.origin = self.target.origin
+        self.sitemaps_read = 0
+        self.discovered = 0
+
+    def _in_scope(self, url: str) -> bool:
+        try:
+            return canonicalize(url).site_host == self.target.site_host
+        except ValueError:
+            return False
+
+    async def _read_robots(self, session) -> List[str]:
+        """Load robots.txt rules and return the sitemaps it lists, /sitemap.xml if none"""
+        try:
+            async with session.get(f"{self.origin}/robots.txt") as response:
+                text = await response.text(errors="replace") if response.status == 200 else ""
+        except Exception as e:
+            logger.info(f"No robots.txt for {self.origin}: {e}")
+            text = ""
+        self.robots.parse(text.splitlines())
+        delay = self.robots.crawl_delay(ROBOTS_AGENT)
+        if delay:
+            self.throttle.delay = max(self.throttle.delay, float(delay))
+        return self.robots.site_maps() or [f"{self.origin}/sitemap.xml"]
+
+    async def _sitemap_entries(self, session, url: str) -> AsyncIterator[Tuple[str, str]]:
+        """
+        ("sitemap" | "page", loc) for each entry of a sitemap or sitemap index,
+        parsed while it downloads. Gzipped sitemaps are inflated on the fly.
+        """
+        parser = XMLPullParser(events=("start", "end"))
+        root = None
+        async with session.get(url) as response:
+            if response.status != 200:
+                logger.info(f"Sitemap {url} returned {response.status}")
+                return
+            inflate = None
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if inflate is None:
+                    # .gz files are served as binary, not with a Content-Encoding aiohttp would undo
+                    gzipped = chunk[:2] == b"\x1f\x8b"
+                    inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else False
+                parser.feed(inflate.decompress(chunk) if inflate else chunk)
+                for event, element in parser.read_events():
+                    tag = element.tag.rsplit("}", 1)[-1]
+                    if event == "start":
+                        root = root if root is not None else element
+                        continue
+                    if tag in ("url", "sitemap"):
+                        loc = next((child.text for child in element if child.tag.rsplit("}", 1)[-1] == "loc"), None)
+                        if loc and loc.strip():
+                            yield ("sitemap" if tag == "sitemap" else "page"), loc.strip()
+                        root.clear()  # Entries are children of the root, drop the ones already read
+
+    async def _queue_urls(self, crawl_id: int, urls: List[str]):
+        urls = urls[:max(0, self.max_pages - self.discovered)]
+        if urls:
+            self.discovered += await asyncio.to_thread(_add_urls, crawl_id, urls, self.db_path)
+
+    async def discover(self, session, crawl_id: int, sitemaps: List[str]):
+        """Walk the sitemaps breadth-first, queueing in-scope pages robots.txt allows"""
+        pending, seen_sitemaps, batch = list(sitemaps), set(), []
+        while pending and self.discovered < self.max_pages and len(seen_sitemaps) < MAX_SITEMAPS:
+            sitemap = pending.pop(0)
+            if sitemap in seen_sitemaps:
+                continue
+            seen_sitemaps.add(sitemap)
+            entries = self._sitemap_entries(session, sitemap)
+            try:
+                async for kind, loc in entries:
+                    if kind == "sitemap":
+                        pending.append(urljoin(sitemap, loc))
+                        continue
+                    url = urldefrag(urljoin(sitemap, loc))[0]
+                    if self._in_scope(url) and self.robots.can_fetch(ROBOTS_AGENT, url):
+                        batch.append(url)
+                    if len(batch) >= BATCH_SIZE:
+                        await self._queue_urls(crawl_id, batch)
+                        batch = []
+                        if self.discovered >= self.max_pages:
+                            break
+            except Exception as e:
+                logger.warning(f"Could not read sitemap {sitemap}: {type(e).__name__}: {e}")
+            finally:
+                await entries.aclose()
+            self.sitemaps_read += 1
+        await self._queue_urls(crawl_id, batch)
+        if not self.discovered:
+            # No usable sitemap, the homepage is still worth a look
+            await self._queue_urls(crawl_id, [f"{self.origin}/"])
+
+    async def fetch_head(self, session, url: str) -> Dict[str, Any]:
+        """Fetch a page and parse it up to </head>, without downloading the rest"""
+        page = {"url": url, "state": "ok", "status": None, "final_url": None, "title": None, "description": None,
+                "canonical": None, "robots": None, "error": None, "fetched_at": time.time()}
+        try:
+            async with self.throttle.slot(canonicalize(url).host):
+                async with session.get(url, headers={"Accept": "text/html"}) as response:
+                    page["status"] = response.status
+                    page["final_url"] = str(response.url)
+                    if response.status != 200:
+                        page["state"] = "error"
+                        return page
+                    if "html" not in response.headers.get("Content-Type", "html"):
+                        page["state"] = "skipped"
+                        return page
+
+                    parser, read = HeadParser(), 0
+                    decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        parser.feed(decoder.decode(chunk))
+                        read += len(chunk)
+                        if parser.done or read >= HEAD_MAX_BYTES:
+                            break
+                    response.close()  # Drop the connection rather than drain the body
+        except Exception as e:
+            page.update(state="error", error=f"{type(e).__name__}: {e}")
+            return page
+        page.update(title=parser.title, description=parser.description, canonical=parser.canonical,
+                    robots=parser.robots)
+        return page
+
+    async def crawl(self, session, crawl_id: int):
+        """Fetch every pending page with `concurrency` workers, writing results in batches"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: List[Dict[str, Any]] = []
+
+        async def flush(final: bool = False):
+            nonlocal results
+            batch, results = results, []
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(_store_pages, crawl_id, batch, self.db_path)
+            except sqlite3.Error as e:
+                # Kept for the next flush; the pages stay pending in the database until stored
+                results = batch + results
+                if final:
+                    raise
+                logger.warning(f"Could not store {len(batch)} pages of crawl {crawl_id}, retrying: {e}")
+
+        async def worker():
+            while True:
+                url = await queue.get()
+                try:
+                    page = await self.fetch_head(session, url)
+                    CRAWLED_PAGES.inc(page["state"])
+                    results.append(page)
+                    if len(results) >= BATCH_SIZE:
+                        await flush()
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            after = 0
+            while True:
+                rows = await asyncio.to_thread(_pending, crawl_id, after, self.db_path)
+                if not rows:
+                    break
+                for rowid, url in rows:
+                    await queue.put(url)  # Waits while the workers are busy
+                after = rows[-1][0]
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await flush(final=True)
+
+    async def _send_heartbeats(self, crawl_id: int):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await asyncio.to_thread(_heartbeat, crawl_id, self.db_path)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not record heartbeat of crawl {crawl_id}: {e}")
+
+    async def run(self, crawl_id: Optional[int] = None) -> int:
+        """Crawl the site under a new crawl id, or continue crawl_id from its pending pages"""
+        import aiohttp  # Kept off the startup path, like the OAuth client
+
+        if crawl_id is None:
+            crawl_id = await asyncio.to_thread(create_crawl, self.target.site_host, self.db_path)
+        # A resumed crawl keeps the pages it already has; discovery only adds the missing ones
+        self.discovered = await asyncio.to_thread(_page_count, crawl_id, self.db_path)
+        heartbeat = asyncio.ensure_future(self._send_heartbeats(crawl_id))
+        try:
+            if not self.target.path:
+                try:
+                    self.origin = await asyncio.to_thread(resolve_canonical_url, self.target.site_host)
+                except ValueError:
+                    pass  # Fetch from the origin as given
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=CRAWL_PER_HOST)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=CRAWL_TIMEOUT, sock_read=CRAWL_TIMEOUT)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                             headers={"User-Agent": USER_AGENT}) as session:
+                sitemaps = await self._read_robots(session)
+                await self.discover(session, crawl_id, sitemaps)
+                logger.info(f"Crawling {self.discovered} pages of {self.target.site_host} "
+                            f"from {self.sitemaps_read} sitemaps")
+                await self.crawl(session, crawl_id)
+        except Exception as e:
+            logger.error(f"Crawl {crawl_id} of {self.target.site_host} failed: {type(e).__name__}: {e}")
+            await asyncio.to_thread(_finish_crawl, crawl_id, "failed", self.sitemaps_read, str(e), self.db_path)
+            raise
+        finally:
+            heartbeat.cancel()
+        await asyncio.to_thread(_finish_crawl, crawl_id, "done", self.sitemaps_read, None, self.db_path)
+        return crawl_id
+
+
+async def run_worker(db_path: str = CRAWL_DB):
+    """Run queued and interrupted crawls one at a time, until cancelled"""
+    logger.info(f"Crawl worker started on {db_path}")
+    while True:
+        claimed = await asyncio.to_thread(claim_crawl, db_path)
+        if claimed is None:
+            await asyncio.sleep(CRAWL_POLL_INTERVAL)
+            continue
+        crawl_id, site = claimed
+        logger.info(f"Running crawl {crawl_id} of {site}")
+        try:
+            await SiteCrawler(site, db_path).run(crawl_id)
+        except Exception:
+            pass  # Logged and recorded by run()
+
+
+async def _crawl_and_report(site: str) -> Dict[str, Any]:
+    crawl_id = await SiteCrawler(site).run()
+    return await asyncio.to_thread(crawl_report, crawl_id)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python -m app.crawler <site> | --worker")
+    if sys.argv[1] == "--worker":
+        try:
+            asyncio.run(run_worker())
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(json.dumps(asyncio.run(_crawl_and_report(sys.argv[1])), indent=2))
@@ -0,0 +1,288 @@
+# app/credentials.py
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import HTTPException
+
+from app.metrics import record_cache
+from app.oauth import TokenRejected, get_google_token, get_google_user_id, refresh_google_token
+
+CREDENTIAL_DB = os.getenv("CREDENTIAL_DB", "credentials.db")
+# The earlier JSON store, imported into CREDENTIAL_DB once and then renamed
+CREDENTIAL_STORE_PATH = os.getenv("CREDENTIAL_STORE_PATH", "credentials.json")
+TOKEN_ENCRYPTION_KEY = os.getenv("TOKEN_ENCRYPTION_KEY")
+REFRESH_MARGIN = 300  # Refresh access tokens this many seconds before they expire
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "900"))
+SESSION_MAX_AGE = 30 * 24 * 3600  # Refresh tokens outlive this, re-consent monthly
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS credentials (
+    user_id TEXT PRIMARY KEY,
+    refresh_token TEXT,
+    access_token TEXT,
+    expires_at REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class CredentialError(Exception):
+    """Raised when no usable credentials exist for a user"""
+    pass
+
+
+def _load_fernet() -> Fernet:
+    """
+    Build the cipher used for refresh tokens and session cookies.
+    Falls back to a key derived from the OAuth client secret, and to a
+    throwaway key if neither is configured. Every worker process needs the
+    same key, so gunicorn.conf.py refuses to start several workers without
+    TOKEN_ENCRYPTION_KEY.
+    """
+    if TOKEN_ENCRYPTION_KEY:
+        return Fernet(TOKEN_ENCRYPTION_KEY.encode())
+
+    client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
+    if client_secret:
+        logger.warning("TOKEN_ENCRYPTION_KEY not set, deriving key from GOOGLE_CLIENT_SECRET")
+        digest = hashlib.sha256(client_secret.encode()).digest()
+        return Fernet(base64.urlsafe_b64encode(digest))
+
+    logger.warning("No token encryption key configured, stored credentials will not survive a restart")
+    return Fernet(Fernet.generate_key())
+
+
+@dataclass
+class UserCredentials:
+    user_id: str
+    refresh_token: Optional[str] = None
+    access_token: Optional[str] = None
+    expires_at: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def needs_refresh(self) -> bool:
+        return not self.access_token or time.time() >= self.expires_at - REFRESH_MARGIN
+
+
+class CredentialManager:
+    """
+    Keeps per-user Google credentials alive across requests.
+
+    Tokens are persisted encrypted in SQLite, one row per user, so every
+    worker process sees users who signed in on another worker and a worker
+    only ever writes its own users' rows. Each worker keeps the credentials
+    it has used in memory, re-reads them on a miss, and refreshes access
+    tokens before they expire. A per-user lock makes concurrent requests
+    share one refresh and one load of each cached dataset.
+    """
+
+    def __init__(self, db_path: str = CREDENTIAL_DB, cache_ttl: int = DASHBOARD_CACHE_TTL,
+                 legacy_path: str = CREDENTIAL_STORE_PATH):
+        self.db_path = db_path
+        self.cache_ttl = cache_ttl
+        self._fernet = _load_fernet()
+        self._users: Dict[str, UserCredentials] = {}
+        self._data_cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._load_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._import_json_store(legacy_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _import_json_store(self, path: str):
+        """Move refresh tokens from the earlier JSON file into the database"""
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+            # Renamed right away so the first worker to get here is the only one to import it
+            os.replace(path, f"{path}.imported")
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read credential store {path}: {str(e)}")
+            return
+
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO credentials (user_id, refresh_token, updated_at) VALUES (?, ?, ?)",
+                [(user_id, encrypted_token, time.time()) for user_id, encrypted_token in stored.items()],
+            )
+        logger.info(f"Imported {len(stored)} users from {path}")
+
+    def _decrypt(self, value: Optional[str]) -> Optional[str]:
+        return self._fernet.decrypt(value.encode()).decode() if value else None
+
+    def _encrypt(self, value: Optional[str]) -> Optional[str]:
+        return self._fernet.encrypt(value.encode()).decode() if value else None
+
+    def _read_user(self, user_id: str) -> Optional[UserCredentials]:
+        """The user's stored credentials, or None if there are none or they can't be decrypted"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT refresh_token, access_token, expires_at FROM credentials WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            refresh_token, access_token = self._decrypt(row[0]), self._decrypt(row[1])
+        except InvalidToken:
+            logger.warning(f"Discarding unreadable credentials for user {user_id}")
+            return None
+        return UserCredentials(user_id=user_id, refresh_token=refresh_token, access_token=access_token,
+                               expires_at=row[2])
+
+    def _write_user(self, creds: UserCredentials):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO credentials (user_id, refresh_token, access_token, expires_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (creds.user_id, self._encrypt(creds.refresh_token), self._encrypt(creds.access_token),
+                 creds.expires_at, time.time()),
+            )
+
+    def _delete_user(self, user_id: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM credentials WHERE user_id = ?", (user_id,))
+
+    def _sync_from_store(self, creds: UserCredentials) -> UserCredentials:
+        """Take over tokens another worker stored since this one last read them"""
+        stored = self._read_user(creds.user_id)
+        if stored is not None and stored.expires_at > creds.expires_at:
+            creds.access_token, creds.expires_at = stored.access_token, stored.expires_at
+            creds.refresh_token = stored.refresh_token or creds.refresh_token
+        return creds
+
+    def _apply_token_response(self, creds: UserCredentials, token_response: dict):
+        creds.access_token = token_response["access_token"]
+        creds.expires_at = time.time() + int(token_response.get("expires_in", 3600))
+        # Google only returns a refresh token on consent, keep the old one otherwise
+        if token_response.get("refresh_token"):
+            creds.refresh_token = token_response["refresh_token"]
+
+    async def exchange_code(self, code: str) -> str:
+        """Complete the OAuth flow and return the user id the credentials are stored under"""
+        token_response = await get_google_token(code)
+        user_id = await get_google_user_id(token_response["access_token"])
+
+        creds = self._users.get(user_id) or UserCredentials(user_id=user_id)
+        self._apply_token_response(creds, token_response)
+        self._users[user_id] = creds
+        self.invalidate(user_id)
+        await asyncio.to_thread(self._write_user, creds)
+        logger.info(f"Stored credentials for user {user_id}")
+        return user_id
+
+    async def get_access_token(self, user_id: str) -> str:
+        """Return a valid access token, refreshing it first if it is about to expire"""
+        creds = self._users.get(user_id)
+        if creds is None:
+            stored = await asyncio.to_thread(self._read_user, user_id)
+            if stored is None:
+                raise CredentialError(f"No credentials stored for user {user_id}")
+            creds = self._users.setdefault(user_id, stored)
+
+        if not creds.needs_refresh():
+            return creds.access_token
+
+        async with creds.lock:
+            # Another request, or another worker, may have refreshed while we were waiting
+            if not creds.needs_refresh():
+                return creds.access_token
+            await asyncio.to_thread(self._sync_from_store, creds)
+            if not creds.needs_refresh():
+                return creds.access_token
+            if not creds.refresh_token:
+                raise CredentialError(f"No refresh token stored for user {user_id}")
+
+            try:
+                token_response = await refresh_google_token(creds.refresh_token)
+            except TokenRejected as e:
+                logger.warning(f"Refresh token rejected for user {user_id}: {e.detail}")
+                self._forget_cached(user_id)
+                await asyncio.to_thread(self._delete_user, user_id)
+                raise CredentialError(f"Refresh token rejected for user {user_id}")
+            except HTTPException as e:
+                # Google down or unreachable: keep the refresh token and let the next request try again
+                logger.warning(f"Refresh failed for user {user_id}: {e.detail}")
+                raise
+
+            self._apply_token_response(creds, token_response)
+            await asyncio.to_thread(self._write_user, creds)
+            logger.info(f"Refreshed access token for user {user_id}")
+            return creds.access_token
+
+    async def get_cached(self, user_id: str, key: str, loader: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Return cached per-user data, calling loader(access_token) on a miss.
+        Concurrent misses for the same user wait for the first load. Results
+        marked {"partial": True} are returned but not kept.
+        """
+        cached = self._data_cache.get((user_id, key))
+        hit = bool(cached and time.time() - cached[0] < self.cache_ttl)
+        record_cache(f"dashboard_{key}", hit)
+        if hit:
+            return cached[1]
+
+        token = await self.get_access_token(user_id)
+        load_lock = self._load_locks.setdefault((user_id, key), asyncio.Lock())
+        async with load_lock:
+            cached = self._data_cache.get((user_id, key))
+            if cached and time.time() - cached[0] < self.cache_ttl:
+                return cached[1]
+            value = await loader(token)
+            if not (isinstance(value, dict) and value.get("partial")):
+                self._data_cache[(user_id, key)] = (time.time(), value)
+            return value
+
+    def invalidate(self, user_id: str):
+        """Drop cached data for a user so the next request reloads it"""
+        for cache_key in [k for k in self._data_cache if k[0] == user_id]:
+            del self._data_cache[cache_key]
+
+    def _forget_cached(self, user_id: str):
+        self.invalidate(user_id)
+        self._users.pop(user_id, None)
+
+    def forget(self, user_id: str):
+        """Remove all credentials and cached data for a user"""
+        self._forget_cached(user_id)
+        self._delete_user(user_id)
+
+    def session_cookie(self, user_id: str) -> str:
+        """Encrypted cookie value identifying the user on later requests"""
+        return self._fernet.encrypt(user_id.encode()).decode()
+
+    async def user_from_cookie(self, cookie: Optional[str]) -> Optional[str]:
+        """Return the user id for a session cookie, or None if it is missing, forged, expired or unknown"""
+        if not cookie:
+            return None
+        try:
+            # The cookie's max_age only tells the browser when to drop it, the ttl enforces it
+            user_id = self._fernet.decrypt(cookie.encode(), ttl=SESSION_MAX_AGE).decode()
+        except InvalidToken:
+            return None
+        if user_id in self._users:
+            return user_id
+        stored = await asyncio.to_thread(self._read_user, user_id)
+        if stored is None:
+            return None
+        self._users.setdefault(user_id, stored)
+        return user_id
+
+
+credential_manager = CredentialManager()
@@ -1,27 +1,61 @@
-import string
 import requests
-from bs4 import BeautifulSoup
+from typing import Any, Dict, Optional, Union
+from app.homepage import Document, fetch_document
+from app.targets import Target, as_target
 
 # Function to get title and description
-def get_page_title_and_description(url: string):
+def get_page_title_and_description(url: Union[str, Target], document: Optional[Document] = None):
     try:
-        # Send a GET request to fetch the webpage
-        response = requests.get(url)
-        response.raise_for_status()  # Check for errors
-        
-        # Parse the HTML with BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
+        # Fetch the webpage unless the audit already has it
+        if document is None:
+            document = fetch_document(as_target(url).url)
+        soup = document.soup
+
         # Extract the title
         title = soup.title.string if soup.title else "No title found"
-        
+
         # Extract the meta description
         description = soup.find('meta', attrs={'name': 'description'})
         description_content = description['content'] if description else "No description found"
-        
+
         # Return the title and description
         return title, description_content
-        
+
     except requests.exceptions.RequestException as e:
         print(f"Error fetching the page: {e}")
         return None, None  # Return None if there was an error
+
+
+def describe_page(target: Target, document: Optional[Document]):
+    """Title and description from the audit's homepage document; (None, None) when it couldn't be fetched"""
+    if document is None:
+        return None, None
+    return get_page_title_and_description(target, document)
+
+
+def get_meta_tags(target: Target, document: Optional[Document]) -> Optional[Dict[str, Any]]:
+    """Indexing and sharing metadata of the audit's homepage document"""
+    if document is None:
+        return None
+    soup = document.soup
+    # Metadata lives in <head>, searching only there keeps this cheap on large pages
+    head = soup.head or soup
+    html = soup.find("html")
+    canonical = head.find("link", rel="canonical")
+    charset = head.find("meta", charset=True)
+    return {
+        "url": document.url,
+        "status": document.status,
+        "redirects": document.redirects,
+        "truncated": document.truncated,
+        "lang": html.get("lang") if html else None,
+        "charset": charset["charset"] if charset else None,
+        "canonical": canonical.get("href") if canonical else None,
+        "robots": document.meta("robots"),
+        "viewport": document.meta("viewport"),
+        "open_graph": {tag["property"]: tag.get("content") for tag in head.find_all("meta", property=True)
+                       if tag["property"].startswith("og:")},
+        "twitter": {tag["name"]: tag.get("content") for tag in head.find_all("meta", attrs={"name": True})
+                    if tag["name"].startswith("twitter:")},
+        "hreflang": {link["hreflang"]: link.get("href") for link in head.find_all("link", hreflang=True)},
+    }
@@ -1,11 +1,34 @@
 # app/domain_whois.py
+import socket
 import whois
+from typing import Union
+from app.resilience import guard
+from app.targets import Target, as_target
+from app.upstreams import WHOIS_SERVER
 
-def get_whois_data(domain_name: str) -> dict:
+def _query_whois_server(domain: str, server: str):
+    """Query one WHOIS server directly, for setups that pin the server (e.g. benchmarks)"""
+    host, _, port = server.partition(":")
+    with socket.create_connection((host, int(port or 43)), timeout=10) as sock:
+        sock.sendall(f"{domain}\r\n".encode())
+        chunks = []
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            chunks.append(data)
+    return whois.parser.WhoisEntry.load(domain, b"".join(chunks).decode("utf-8", "replace"))
+
+def get_whois_data(domain_name: Union[str, Target]) -> dict:
     """Fetch and return WHOIS information for a given domain."""
     try:
         # Fetch domain information
-        domain = whois.whois(domain_name)
+        registrable_domain = as_target(domain_name).registrable_domain
+        with guard("whois"):
+            if WHOIS_SERVER:
+                domain = _query_whois_server(registrable_domain, WHOIS_SERVER)
+            else:
+                domain = whois.whois(registrable_domain)
         
         # Organize the WHOIS data into a dictionary
         domain_info = {
@@ -0,0 +1,134 @@
+# app/executors.py
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from app.metrics import Counter, registry
+from app.runtime_monitor import MonitoredExecutor, runtime_monitor
+
+logger = logging.getLogger(__name__)
+
+POOL_REJECTIONS = registry.register(Counter(
+    "webly_pool_rejections_total", "Jobs refused because a pool's queue was full", ("pool",)))
+
+
+class PoolFullError(RuntimeError):
+    """Raised when a pool already holds as many jobs as it is allowed to queue"""
+
+
+@dataclass(frozen=True)
+class PoolSpec:
+    max_workers: int
+    queue_limit: int  # Jobs allowed to wait on top of the running ones
+    timeout: float  # Seconds a caller waits for a job, including time in the queue
+
+
+def _spec(name: str, max_workers: int, queue_limit: int, timeout: float) -> PoolSpec:
+    """Pool sizes can be tuned per deployment, e.g. POOL_SSL_LABS_WORKERS=8"""
+    prefix = f"POOL_{name.upper()}_"
+    return PoolSpec(
+        max_workers=int(os.getenv(prefix + "WORKERS", max_workers)),
+        queue_limit=int(os.getenv(prefix + "QUEUE", queue_limit)),
+        timeout=float(os.getenv(prefix + "TIMEOUT", timeout)),
+    )
+
+
+# One pool per upstream class, so a slow dependency only backs up its own queue
+POOL_SPECS: Dict[str, PoolSpec] = {
+    "psi": _spec("psi", 8, 32, 200),  # Up to 3 PageSpeed attempts of 60s each
+    "ssl_labs": _spec("ssl_labs", 4, 16, 360),  # Assessments poll for up to 5 minutes
+    "whois": _spec("whois", 4, 32, 30),
+    "scraping": _spec("scraping", 8, 64, 45),  # Homepage, Google search and News RSS fetches
+    "trends": _spec("trends", 1, 16, 120),  # The shared TrendReq session is not thread-safe
+    "google_api": _spec("google_api", 8, 32, 300),  # GA4 and Search Console for the dashboard
+}
+
+# Which pool each collector runs in
+COLLECTOR_POOLS = {
+    "news": "scraping",
+    "homepage": "scraping",
+    "socials": "scraping",
+    "whois": "whois",
+    "lighthouse": "psi",
+    "ssl": "ssl_labs",
+    "trends": "trends",
+    "analytics": "google_api",
+    "search_console": "google_api",
+}
+
+
+class BoundedPool:
+    """A dedicated thread pool with a cap on waiting jobs and a per-call timeout"""
+
+    def __init__(self, name: str, spec: PoolSpec):
+        self.name = name
+        self.spec = spec
+        self.executor = MonitoredExecutor(max_workers=spec.max_workers, name=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+        runtime_monitor.watch(self.executor)
+
+    @property
+    def pending(self) -> int:
+        """Jobs queued or running, including ones whose callers already timed out"""
+        return self._pending
+
+    async def run(self, func, *args) -> Any:
+        with self._lock:
+            if self._pending >= self.spec.max_workers + self.spec.queue_limit:
+                POOL_REJECTIONS.inc(self.name)
+                logger.warning(f"Rejected {getattr(func, '__name__', func)}: {self.name} pool is full")
+                raise PoolFullError(f"{self.name} pool is full ({self._pending} jobs pending)")
+            self._pending += 1
+
+        # Same as asyncio.to_thread: the job sees the caller's context vars
+        ctx = contextvars.copy_context()
+        try:
+            job = self.executor.submit(functools.partial(ctx.run, func, *args))
+        except RuntimeError:
+            self._release(None)
+            raise
+        # Released when the thread finishes, not when the caller stops waiting
+        job.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.spec.timeout)
+        except asyncio.TimeoutError:
+            # A job still in the queue is cancelled, one already running finishes in the background
+            raise TimeoutError(f"{self.name} call did not finish within {self.spec.timeout}s")
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        runtime_monitor.unwatch(self.executor)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: Dict[str, BoundedPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> BoundedPool:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = BoundedPool(name, POOL_SPECS[name])
+        return pool
+
+
+async def run_in_pool(name: str, func, *args) -> Any:
+    """Run a blocking call in the named pool"""
+    return await get_pool(name).run(func, *args)
+
+
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -0,0 +1,108 @@
+# app/fragment_cache.py
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from app.metrics import record_cache
+
+FRAGMENT_CACHE_BYTES = int(os.getenv("FRAGMENT_CACHE_BYTES", str(32 * 1024 * 1024)))  # Rendered HTML kept
+
+
+def content_hash(values: Any) -> str:
+    """
+    Digest of a fragment's input data. Pickle is several times faster than
+    JSON on large strings such as base64 screenshots; values it can't handle
+    fall back to JSON.
+    """
+    try:
+        encoded = pickle.dumps(values, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        encoded = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class FragmentCache:
+    """
+    Thread-safe LRU of rendered template fragments, bounded by their total
+    length rather than their count, since one card with a screenshot weighs
+    as much as thousands of small ones.
+    """
+
+    def __init__(self, max_bytes: int = FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Markup]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Markup]:
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+        record_cache("template_fragment", fragment is not None)
+        return fragment
+
+    def set(self, key: str, fragment: Markup):
+        if len(fragment) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = fragment
+            self.size += len(fragment)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache site %}...{% endcache %} renders the block once per distinct
+    value of its arguments and reuses the output afterwards. The block must
+    only depend on the values it's keyed by. Worth it for blocks that do real
+    work, such as a per-site card; hashing the input of a block that just
+    prints it costs about as much as rendering it.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        # Same data in two different blocks must not share an entry
+        location = nodes.Const(f"{parser.name}:{lineno}")
+        call = self.call_method("_render", [location, nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, location: str, values: List[Any], caller: Callable[[], str]) -> Markup:
+        cache: FragmentCache = self.environment.fragment_cache
+        key = f"{location}:{content_hash(values)}"
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = Markup(caller())
+            cache.set(key, fragment)
+        return fragment
@@ -0,0 +1,95 @@
+# app/homepage.py
+# The audited page, downloaded and parsed once per audit and shared by every
+# collector that reads its HTML (title and description, social links, meta tags).
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+from app.metrics import track_upstream
+
+HOMEPAGE_MAX_BYTES = int(os.getenv("HOMEPAGE_MAX_BYTES", str(2 * 1024 * 1024)))  # Decoded HTML kept per page
+HOMEPAGE_TIMEOUT = float(os.getenv("HOMEPAGE_TIMEOUT", "15"))  # For the whole download, redirects included
+MAX_REDIRECTS = 10
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+try:
+    import brotli  # noqa: F401  urllib3 decodes br responses when it's installed
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Document:
+    url: str  # Where the page was served from, after redirects
+    status: int
+    headers: Dict[str, str]
+    redirects: List[str]  # URLs that redirected, in order
+    size: int  # Bytes of decoded HTML read
+    truncated: bool  # The page was larger than HOMEPAGE_MAX_BYTES
+    soup: BeautifulSoup
+    _links: Optional[List[str]] = field(default=None, repr=False)
+
+    @property
+    def links(self) -> List[str]:
+        """Absolute URLs of every <a href> on the page"""
+        if self._links is None:
+            self._links = [urljoin(self.url, a["href"]) for a in self.soup.find_all("a", href=True)]
+        return self._links
+
+    def meta(self, name: str) -> Optional[str]:
+        """Content of a <meta name=...> or <meta property=...> tag"""
+        tag = self.soup.find("meta", attrs={"name": name}) or self.soup.find("meta", attrs={"property": name})
+        return tag.get("content") if tag else None
+
+
+def _read_capped(response: requests.Response, max_bytes: int, deadline: float) -> Tuple[bytes, bool]:
+    chunks, size = [], 0
+    for chunk in response.iter_content(CHUNK_SIZE):
+        # The request timeout only bounds each socket read, a page that trickles in would never hit it
+        if time.monotonic() > deadline:
+            raise requests.exceptions.ReadTimeout(f"{response.url} took longer than {HOMEPAGE_TIMEOUT}s to download")
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            return b"".join(chunks)[:max_bytes], True
+    return b"".join(chunks), False
+
+
+def fetch_document(url: str, max_bytes: int = HOMEPAGE_MAX_BYTES) -> Document:
+    """
+    Download a page, following redirects and accepting compressed responses,
+    keep at most max_bytes of it, and parse it once.
+    """
+    session = requests.Session()
+    session.max_redirects = MAX_REDIRECTS
+    deadline = time.monotonic() + HOMEPAGE_TIMEOUT
+    with session, track_upstream("homepage"):
+        response = session.get(url, headers={"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING},
+                               timeout=HOMEPAGE_TIMEOUT, stream=True)
+        with response:
+            response.raise_for_status()
+            body, truncated = _read_capped(response, max_bytes, deadline)
+    if truncated:
+        logger.warning(f"{response.url} is larger than {max_bytes} bytes, parsing the first {max_bytes}")
+
+    # A charset in the headers wins, otherwise BeautifulSoup reads <meta charset> or sniffs it
+    encoding = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else None
+    return Document(
+        url=response.url,
+        status=response.status_code,
+        headers=dict(response.headers),
+        redirects=[r.url for r in response.history],
+        size=len(body),
+        truncated=truncated,
+        soup=BeautifulSoup(body, "html.parser", from_encoding=encoding),
+    )
@@ -0,0 +1,258 @@
+# app/http_probe.py
+# Local HTTP performance probe. Times DNS, connect, TLS and time-to-first-byte
+# over a few samples in about a second, next to the PSI run that takes a minute.
+import asyncio
+import gzip
+import logging
+import os
+import socket
+import ssl
+import statistics
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit
+
+from app.targets import Target, as_target
+
+HTTP_PROBE_SAMPLES = int(os.getenv("HTTP_PROBE_SAMPLES", "3"))
+HTTP_PROBE_TIMEOUT = float(os.getenv("HTTP_PROBE_TIMEOUT", "5"))
+HTTP_PROBE_MAX_BYTES = int(os.getenv("HTTP_PROBE_MAX_BYTES", str(5 * 1024 * 1024)))  # Body bytes read per sample
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+CACHE_HEADERS = ("cache-control", "etag", "last-modified", "expires", "age", "vary")
+PHASES = ("dns", "connect", "tls", "ttfb", "download", "total")
+USER_AGENT = "Mozilla/5.0 (compatible; webly-http-probe)"
+
+try:
+    import brotli
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    brotli = None
+    ACCEPT_ENCODING = "gzip, deflate"
+
+logger = logging.getLogger(__name__)
+
+
+def _tls_context(alpn: List[str]) -> ssl.SSLContext:
+    # Timing only, trust is reported by the ssl section
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.set_alpn_protocols(alpn)
+    return context
+
+
+def _split(url: str) -> Tuple[str, str, int, str]:
+    parts = urlsplit(url)
+    scheme = parts.scheme or "https"
+    port = parts.port or (443 if scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return scheme, parts.hostname, port, path
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str], max_bytes: int) -> Tuple[bytes, int, bool]:
+    """Body as sent (still compressed), bytes read off the wire, and whether it was cut at max_bytes"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks, wire = [], 0
+        while wire < max_bytes:
+            size_line = await reader.readline()
+            wire += len(size_line)
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                break
+            chunk = await reader.readexactly(size + 2)  # The chunk and its CRLF
+            wire += len(chunk)
+            chunks.append(chunk[:-2])
+        return b"".join(chunks), wire, wire >= max_bytes
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        body = await reader.readexactly(min(length, max_bytes))
+        return body, len(body), length > max_bytes
+    body = await reader.read(max_bytes)
+    return body, len(body), not reader.at_eof()
+
+
+def _decode(body: bytes, encoding: str) -> Optional[bytes]:
+    try:
+        if encoding == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body)
+        if encoding == "deflate":
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)  # Raw deflate without the zlib header
+        if encoding == "br" and brotli is not None:
+            return brotli.decompress(body)
+        if not encoding or encoding == "identity":
+            return body
+    except Exception as e:
+        logger.debug(f"Could not decode {encoding} body: {e}")
+    return None
+
+
+async def _sample(url: str, timeout: float, max_bytes: int) -> Dict[str, Any]:
+    """One request on a fresh connection, timed phase by phase"""
+    scheme, host, port, path = _split(url)
+    loop = asyncio.get_running_loop()
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    infos = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout)
+    mark = time.perf_counter()
+    timings["dns"] = mark - start
+
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(infos[0][4][0], port), timeout)
+    timings["connect"] = time.perf_counter() - mark
+    mark = time.perf_counter()
+    try:
+        if scheme == "https":
+            await asyncio.wait_for(writer.start_tls(_tls_context(["http/1.1"]), server_hostname=host), timeout)
+            timings["tls"] = time.perf_counter() - mark
+            mark = time.perf_counter()
+
+        default_port = 443 if scheme == "https" else 80
+        host_header = host if port == default_port else f"{host}:{port}"
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: {USER_AGENT}\r\n"
+            f"Accept: text/html,*/*\r\nAccept-Encoding: {ACCEPT_ENCODING}\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        first_byte = await asyncio.wait_for(reader.read(1), timeout)
+        timings["ttfb"] = time.perf_counter() - mark
+        mark = time.perf_counter()
+        head = first_byte + await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+
+        status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+        version, status = status_line.split(" ", 2)[:2]
+        headers: Dict[str, str] = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                name = name.strip().lower()
+                headers[name] = f"{headers[name]}, {value.strip()}" if name in headers else value.strip()
+
+        status = int(status)
+        if status in REDIRECT_STATUSES or status in (204, 304):
+            body, wire, truncated = b"", 0, False
+        else:
+            body, wire, truncated = await asyncio.wait_for(_read_body(reader, headers, max_bytes), timeout)
+        timings["download"] = time.perf_counter() - mark
+    finally:
+        writer.close()
+    timings["total"] = time.perf_counter() - start
+
+    return {
+        "url": url,
+        "status": status,
+        "http_version": version,
+        "headers": headers,
+        "header_bytes": len(head),
+        "body_bytes": wire,
+        "body": body,
+        "truncated": truncated,
+        "timings": timings,
+    }
+
+
+async def _negotiates_h2(host: str, port: int, timeout: float) -> Optional[bool]:
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=_tls_context(["h2", "http/1.1"]), server_hostname=host), timeout)
+    except (OSError, ssl.SSLError, asyncio.TimeoutError):
+        return None
+    negotiated = writer.get_extra_info("ssl_object").selected_alpn_protocol()
+    writer.close()
+    return negotiated == "h2"
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "median": round(statistics.median(values) * 1000, 1),
+        "min": round(min(values) * 1000, 1),
+        "max": round(max(values) * 1000, 1),
+    }
+
+
+def _compression(final: Dict[str, Any]) -> Dict[str, Any]:
+    encoding = final["headers"].get("content-encoding", "").lower() or None
+    body = final["body"]
+    decoded = _decode(body, encoding or "")
+    result: Dict[str, Any] = {"encoding": encoding, "decoded_bytes": len(decoded) if decoded is not None else None}
+    if encoding and decoded:
+        result["savings_percent"] = round(100 * (1 - len(body) / len(decoded)), 1)
+    elif not encoding and len(body) > 1024:
+        # What gzip would have saved on an uncompressed response
+        result["gzip_potential_percent"] = round(100 * (1 - len(gzip.compress(body, 6)) / len(body)), 1)
+    return result
+
+
+async def _measure(url: str, samples: int, timeout: float, max_bytes: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """The redirect chain from url, then more samples of where it ends"""
+    chain = []
+    for _ in range(MAX_REDIRECTS + 1):
+        sample = await _sample(url, timeout, max_bytes)
+        location = sample["headers"].get("location")
+        if sample["status"] not in REDIRECT_STATUSES or not location:
+            break
+        chain.append({"url": url, "status": sample["status"], "location": location,
+                      "ms": round(sample["timings"]["total"] * 1000, 1),
+                      "bytes": sample["header_bytes"] + sample["body_bytes"]})
+        url = urljoin(url, location)
+    else:
+        raise ValueError(f"More than {MAX_REDIRECTS} redirects")
+
+    # Samples run one after another so they don't compete for the connection
+    measured = [sample]
+    for _ in range(samples - 1):
+        measured.append(await _sample(url, timeout, max_bytes))
+    return chain, measured
+
+
+async def probe_http(target: Union[str, Target], samples: int = HTTP_PROBE_SAMPLES,
+                     timeout: float = HTTP_PROBE_TIMEOUT, max_bytes: int = HTTP_PROBE_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Request a page `samples` times on fresh connections and report the
+    per-phase timings (median/min/max ms), redirect chain, HTTP version,
+    compression, caching headers and transfer size.
+    """
+    target = as_target(target)
+    start = time.perf_counter()
+    _, host, port, _ = _split(target.url)
+    try:
+        (chain, measured), h2 = await asyncio.gather(
+            _measure(target.url, max(1, samples), timeout, max_bytes),
+            _negotiates_h2(host, port, timeout) if target.scheme == "https" else asyncio.sleep(0),
+        )
+    except (OSError, ssl.SSLError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    final = measured[0]
+    headers = final["headers"]
+    timings = {
+        phase: _summary([sample["timings"][phase] for sample in measured])
+        for phase in PHASES if phase in final["timings"]
+    }
+    return {
+        "url": final["url"],
+        "status": final["status"],
+        "http_version": final["http_version"],
+        "h2": h2,
+        "alt_svc": headers.get("alt-svc"),
+        "redirects": chain,
+        "samples": len(measured),
+        "timings_ms": timings,
+        "compression": _compression(final),
+        "caching": {name: headers.get(name) for name in CACHE_HEADERS},
+        "transfer": {
+            "header_bytes": final["header_bytes"],
+            "body_bytes": final["body_bytes"],
+            # Redirect hops included
+            "total_bytes": final["header_bytes"] + final["body_bytes"] + sum(hop["bytes"] for hop in chain),
+            "truncated": final["truncated"],
+        },
+        "server": headers.get("server"),
+        "probe_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -0,0 +1,80 @@
+# app/lazy.py
+# Deferred imports for heavy collector modules (pandas via pytrends, bs4, whois, aiohttp),
+# so a worker can bind and serve before they're loaded.
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from app.metrics import Gauge, registry
+
+STARTUP_SECONDS = registry.register(Gauge(
+    "webly_startup_seconds", "Time spent in each startup phase", ("phase",)))
+
+logger = logging.getLogger(__name__)
+
+_registry: List["LazyCallable"] = []
+_prefetch: List[str] = []  # Modules that are imported lazily inside functions
+_import_lock = threading.Lock()
+import_times: Dict[str, float] = {}  # Module -> seconds its first import took
+
+
+class LazyCallable:
+    """Stands in for `module.name` and imports the module on its first call"""
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+        # Read by runtime_monitor when naming the calls that hold worker threads
+        self.__module__ = module
+        self.__qualname__ = name
+        self._target: Callable = None
+        _registry.append(self)
+
+    def resolve(self) -> Callable:
+        if self._target is None:
+            with _import_lock:
+                if self._target is None:
+                    start = time.perf_counter()
+                    target = getattr(importlib.import_module(self.module), self.name)
+                    import_times.setdefault(self.module, time.perf_counter() - start)
+                    self._target = target
+        return self._target
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._target is not None else "not loaded"
+        return f"<lazy {self.module}.{self.name} ({state})>"
+
+
+def lazy(module: str, name: str) -> LazyCallable:
+    return LazyCallable(module, name)
+
+
+def prefetch(module: str):
+    """Have warm_up() also import a module that code imports inside a function"""
+    if module not in _prefetch:
+        _prefetch.append(module)
+
+
+def warm_up():
+    """Import every lazily referenced module, e.g. in a thread once the server is up"""
+    start = time.perf_counter()
+    for func in _registry:
+        try:
+            func.resolve()
+        except Exception as e:
+            logger.warning(f"Warm-up import of {func.module} failed: {e}")
+    for module in _prefetch:
+        try:
+            module_start = time.perf_counter()
+            importlib.import_module(module)
+            import_times.setdefault(module, time.perf_counter() - module_start)
+        except Exception as e:
+            logger.warning(f"Warm-up import of {module} failed: {e}")
+    elapsed = time.perf_counter() - start
+    STARTUP_SECONDS.set("warm_up", value=elapsed)
+    logger.info(f"Collector modules warmed up in {elapsed * 1000:.0f} ms")
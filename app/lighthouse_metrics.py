@@ -1,32 +1,39 @@
 # app/lighthouse_metrics.py
 import requests
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 import time
+from app.metrics import UPSTREAM_RETRIES, observe_response
+from app.resilience import can_retry, guard
+from app.targets import Target, as_target
+from app.upstreams import PSI_API_URL
 from app.utils import validate_url, calculate_performance_score
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
 class LighthouseMetricsError(Exception):
     """Custom exception for Lighthouse metrics errors"""
     pass
 
-def get_lighthouse_metrics(url: str, api_key: str, retries: int = 3) -> Dict[str, Any]:
-    """Fetch Lighthouse metrics with enhanced error handling and logging"""
+def get_lighthouse_metrics(url: Union[str, Target], api_key: str, retries: int = 3,
+                           canonical_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fetch Lighthouse metrics with enhanced error handling and logging.
+    Pass canonical_url when the site's URL is already resolved, to skip resolving it again.
+    """
     if not api_key:
         raise ValueError("API key is required")
     
     try:
+        # Audit bare origins at their canonical location so redirects don't skew the run
+        target = as_target(url)
+        url = canonical_url or (target.url if target.path else target.site_host)
+
         # Validate and clean the URL
         clean_url = validate_url(url)
         logging.info(f"Fetching Lighthouse metrics for: {clean_url}")
         
         # Construct PSI API URL
         psi_api_url = (
-            "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+            f"{PSI_API_URL}"
             f"?url={clean_url}"
             f"&key={api_key}"
             f"&strategy=desktop"
@@ -40,9 +47,10 @@ def get_lighthouse_metrics(url: str, api_key: str, retries: int = 3) -> Dict[str
         for attempt in range(retries):
             try:
                 logging.info(f"Sending request to PageSpeed Insights API (Attempt {attempt + 1}/{retries})")
-                response = requests.get(psi_api_url, timeout=60)  # Increased timeout
-                
-                response.raise_for_status()
+                with guard("psi"):
+                    response = requests.get(psi_api_url, timeout=60)  # Increased timeout
+                    observe_response("psi", response)
+                    response.raise_for_status()
                 
                 data = response.json()
                 
@@ -77,8 +85,10 @@ def get_lighthouse_metrics(url: str, api_key: str, retries: int = 3) -> Dict[str
                 }
             except requests.exceptions.RequestException as e:
                 logging.error(f"Request attempt {attempt + 1} failed for {clean_url}: {str(e)}")
-                if attempt < retries - 1:
-                    time.sleep(2)
+                # Retries come out of the PSI budget, so an outage doesn't multiply the load
+                if attempt < retries - 1 and can_retry("psi"):
+                    UPSTREAM_RETRIES.inc("psi")
+                    time.sleep(2 ** (attempt + 1))
                 else:
                     logging.error(f"Failed to fetch Lighthouse metrics after {retries} attempts for {clean_url}: {str(e)}")
                     raise LighthouseMetricsError(f"Failed to fetch Lighthouse metrics after {retries} attempts: {str(e)}")
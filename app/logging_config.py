@@ -0,0 +1,117 @@
+# app/logging_config.py
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+from typing import Any, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Empty logs JSON lines to stderr instead; gunicorn.conf.py does that so workers don't rotate one file
+DEBUG_LOG_PATH = os.getenv("DEBUG_LOG_PATH", "debug.log")
+DEBUG_PAYLOAD_MAX_BYTES = int(os.getenv("DEBUG_PAYLOAD_MAX_BYTES", "2048"))
+DEBUG_PAYLOAD_SAMPLE_RATE = float(os.getenv("DEBUG_PAYLOAD_SAMPLE_RATE", "0.1"))
+
+correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar("correlation_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_request_id() -> str:
+    """Random id for correlating all log lines of one request"""
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> str:
+    return correlation_id.get()
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamp each record with the request id active where it was logged"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for the file log or stderr"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging():
+    """
+    Route all logging through a queue so request threads never touch disk.
+    A QueueListener thread writes JSON lines to the rotating debug log and
+    plain text to the console, or only JSON lines to stderr when
+    DEBUG_LOG_PATH is empty.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if DEBUG_LOG_PATH:
+        file_handler = logging.handlers.RotatingFileHandler(
+            DEBUG_LOG_PATH,
+            maxBytes=5*1024*1024,  # 5MB
+            backupCount=3
+        )
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.setLevel(logging.DEBUG)
+
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+        ))
+        console_handler.setLevel(logging.INFO)
+        handlers = [file_handler, console_handler]
+    else:
+        stderr_handler = logging.StreamHandler()
+        stderr_handler.setFormatter(JsonFormatter())
+        handlers = [stderr_handler]
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationIdFilter())
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.setLevel(LOG_LEVEL)
+    root_logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any,
+                max_bytes: int = DEBUG_PAYLOAD_MAX_BYTES,
+                sample_rate: float = DEBUG_PAYLOAD_SAMPLE_RATE):
+    """
+    Log a large payload at DEBUG, but only for a sample of calls and cut to
+    max_bytes, so debug mode stays cheap under load.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= sample_rate:
+        return
+    text = json.dumps(payload, default=str, separators=(",", ":"))
+    if len(text) > max_bytes:
+        text = f"{text[:max_bytes]}... [{len(text) - max_bytes} more bytes]"
+    logger.debug("%s: %s", message, text)
@@ -1,75 +1,108 @@
+import time
+_import_started = time.perf_counter()
+
 import logging
-from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import Cookie, FastAPI, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Dict, Any, List, Union
+from typing import Dict, Any, List, Optional, Union
 import os
 import asyncio
+import threading
 import requests
-from urllib.parse import urlparse
+from contextlib import asynccontextmanager
 
-import logging.handlers
 import json
-from datetime import datetime
-
-from app.analytics import get_user_analytics_data
-from app.description import get_page_title_and_description
-from app.domain_whois import get_whois_data
-from app.lighthouse_metrics import get_lighthouse_metrics
-from app.news_fetcher import fetch_google_rss_news
-from app.oauth import get_google_auth_url, get_google_token
-from app.search_console import get_user_search_console_data
-from app.socials import get_social_media_info
-from app.ssl_audit import check_ssl
-from app.trends import analyze_keyword, get_keyword_trend, get_rising_queries
+
+from app import cert_watch, crawler
+from app.audit import (MAX_BULK_URLS, audit_many, parse_include, parse_url_list, run_audit, run_collector,
+                       section_json, serialize_data, trend_json)
+from app.collectors import REGISTRY
+from app.credentials import SESSION_MAX_AGE, CredentialError, credential_manager
+from app.executors import run_in_pool, shutdown_pools
+from app.fragment_cache import FragmentCacheExtension
+from app.lazy import STARTUP_SECONDS, import_times, lazy, warm_up
+from app.logging_config import correlation_id, current_request_id, new_request_id, setup_logging
+from app.metrics import registry, request_timings, server_timing_header, start_metrics_writer, stop_metrics_writer
+from app.oauth import get_google_auth_url
+from app.resilience import snapshot as upstream_health
+from app.responses import conditional_json, select_fields
+from app.runtime_monitor import MonitoredExecutor, runtime_monitor
+from app.search_console_sync import query_window, window_totals
+from app.targets import canonicalize
 
 # Custom timeout and Google API key
 DEFAULT_TIMEOUT = 60  # Timeout in seconds for API requests
-PAGE_SPEED_API_KEY = os.getenv("GOOGLE_SEARCH_API_KEY")
+SESSION_COOKIE = "webly_session"
+# Threads available to blocking collectors per worker, 0 keeps asyncio's default of min(32, cpus + 4)
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Import the lazily loaded collector modules in the background once the server is up
+WARM_UP = os.getenv("WARM_UP", "on").lower() not in ("off", "0", "false")
+
+get_user_analytics_data = lazy("app.analytics", "get_user_analytics_data")
+get_user_search_console_data = lazy("app.search_console", "get_user_search_console_data")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = MonitoredExecutor(max_workers=THREAD_POOL_SIZE or None, name="collector")
+    await runtime_monitor.start(executor)
+    start_metrics_writer()
+    logger.info(f"app.main imported in {IMPORT_SECONDS * 1000:.0f} ms")
+    if WARM_UP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    try:
+        yield
+    finally:
+        await runtime_monitor.stop()
+        stop_metrics_writer()
+        shutdown_pools()
+        executor.shutdown(wait=False)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+# Per-section {% cache %} blocks, reused while a section's data is unchanged
+templates.env.add_extension(FragmentCacheExtension)
 
 
-# Utility to clean and validate URL
-def clean_url(target: str) -> str:
-    """
-    Ensure the URL is in the correct format with a scheme and no trailing slashes.
-    """
-    parsed_url = urlparse(target)
-    
-    # If no scheme (http/https) is provided, assume 'http://'
-    if not parsed_url.scheme:
-        target = f"http://{target}"
-        parsed_url = urlparse(target)  # Re-parse after adding scheme
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log line of a request with one id, reusing the caller's X-Request-ID if sent"""
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    token = correlation_id.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        correlation_id.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 
-    # Clean up any trailing slashes from the path
-    cleaned_url = parsed_url.scheme + "://" + parsed_url.netloc
-    return cleaned_url
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    """Collect a per-request timing breakdown and return it as a Server-Timing header"""
+    timings: Dict[str, float] = {}
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    timings["total"] = time.perf_counter() - start
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
 
 
-def serialize_data(data: Any) -> Any:
+# Utility to clean and validate URL
+def clean_url(target: str) -> str:
     """
-    Recursively serialize data to ensure JSON compatibility
+    Ensure the URL is in the correct format with a scheme and no trailing slashes.
     """
-    if data is None:
-        return None
-    elif isinstance(data, (str, int, float, bool)):
-        return data
-    elif isinstance(data, dict):
-        return {k: serialize_data(v) for k, v in data.items() if v is not None}
-    elif isinstance(data, (list, tuple)):
-        return [serialize_data(item) for item in data if item is not None]
-    else:
-        return str(data)
+    return canonicalize(target).origin
 
 
 def is_valid_url(url: str) -> bool:
@@ -78,30 +111,6 @@ def is_valid_url(url: str) -> bool:
     """
     return url.startswith("http://") or url.startswith("https://")
 
-# Enhanced logging configuration
-def setup_logging():
-    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
-    # File handler for debug logs
-    file_handler = logging.handlers.RotatingFileHandler(
-        'debug.log',
-        maxBytes=5*1024*1024,  # 5MB
-        backupCount=3
-    )
-    file_handler.setFormatter(log_formatter)
-    file_handler.setLevel(logging.DEBUG)
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(log_formatter)
-    console_handler.setLevel(logging.INFO)
-    
-    # Root logger configuration
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-
 setup_logging()
 logger = logging.getLogger(__name__)
 
@@ -169,117 +178,360 @@ logger = logging.getLogger(__name__)
 
 @app.get("/", response_class=HTMLResponse)
 async def get_homepage(request: Request):
-    return templates.TemplateResponse("homepage.html", {"request": request})
+    return templates.TemplateResponse(request, "homepage.html", {"request": request})
+
+# Collectors the results template lays out itself
+RESULT_SECTIONS = {"news", "whois", "lighthouse", "http", "description", "ssl", "socials", "trends"}
 
 @app.post("/process_url", response_class=HTMLResponse)
 async def process_url(request: Request, url: str = Form(...)):
-    clean_target = clean_url(url)
     try:
-        # Call synchronous functions within asyncio.to_thread for compatibility
-        news_data = await asyncio.to_thread(fetch_google_rss_news, clean_target)
-        whois_data = await asyncio.to_thread(get_whois_data, clean_target)
-        lighthouse_data = await asyncio.to_thread(get_lighthouse_metrics, clean_target, PAGE_SPEED_API_KEY)
-        page_title_and_description = await asyncio.to_thread(get_page_title_and_description, clean_target)
-        ssl_audit = await asyncio.to_thread(check_ssl, url)
-        social_links = await asyncio.to_thread(get_social_media_info, clean_target)
-        
-        # Use the new analyze_keyword function from trends.py
-        trend_data, rising_queries = await asyncio.to_thread(analyze_keyword, clean_target)
-        
-        # Process trend data if it exists
-        trend_data_json = None
-        if trend_data is not None:
-            trend_data_json = {
-                "dates": trend_data.index.strftime('%Y-%m-%d').tolist(),
-                "popularity": trend_data[clean_target].tolist()
-            }
-
+        target = canonicalize(url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        # Each collector runs in the pool of its upstream, so a slow one only delays its own section
+        results = await run_audit(target)
+        trend_data, rising_queries = results["trends"]
+        trend_data_json = trend_json(trend_data, target.site_host)
     except Exception as e:
         logger.error(f"Error processing URL {url}: {str(e)}")
         raise HTTPException(status_code=400, detail="Error fetching metrics.")
-    
+
     # Render result template with all data
-    return templates.TemplateResponse("results.html", {
+    return templates.TemplateResponse(request, "results.html", {
         "request": request,
-        "news_data": serialize_data(news_data),
-        "whois_data": serialize_data(whois_data),
-        "lighthouse_data": serialize_data(lighthouse_data),
-        "page_title_and_description": serialize_data(page_title_and_description),
-        "ssl_audit": serialize_data(ssl_audit),
-        "social_links": serialize_data(social_links),
+        "news_data": serialize_data(results["news"]),
+        "whois_data": serialize_data(results["whois"]),
+        "lighthouse_data": serialize_data(results["lighthouse"]),
+        "http_probe": serialize_data(results["http"]),
+        "page_title_and_description": serialize_data(results["description"]),
+        "ssl_audit": serialize_data(results["ssl"]),
+        "social_links": serialize_data(results["socials"]),
         "trend_data": serialize_data(trend_data_json) if trend_data_json else None,
-        "rising_queries": serialize_data(rising_queries) if rising_queries is not None else None
+        "rising_queries": serialize_data(rising_queries) if rising_queries is not None else None,
+        # Collectors registered without a section of their own in the template
+        "extra_sections": {name: section_json(name, result, target) for name, result in results.items()
+                           if name not in RESULT_SECTIONS},
+        "timings": {name: round(elapsed * 1000, 1) for name, elapsed in (request_timings.get() or {}).items()}
     })
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def require_admin(request: Request):
+    if ADMIN_TOKEN and request.headers.get("Authorization") != f"Bearer {ADMIN_TOKEN}":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/admin/runtime")
+async def admin_runtime(request: Request):
+    """Event-loop lag, executor saturation and the calls currently holding worker threads"""
+    require_admin(request)
+    return JSONResponse({
+        **runtime_monitor.snapshot(),
+        "upstreams": upstream_health(),
+        "startup": {
+            "import_ms": round(IMPORT_SECONDS * 1000, 1),
+            "lazy_imports_ms": {module: round(elapsed * 1000, 1) for module, elapsed in import_times.items()},
+        },
+    })
+
+
+@app.get("/admin/certs")
+async def admin_certs(request: Request):
+    """Watched certificates, soonest expiry first"""
+    require_admin(request)
+    return JSONResponse(await asyncio.to_thread(cert_watch.list_watched))
+
+
+@app.post("/admin/certs")
+async def admin_watch_certs(request: Request):
+    """Start watching the certificates of a list of domains, sent in any format the bulk audit accepts"""
+    require_admin(request)
+    try:
+        urls = await read_url_list(request)
+        hosts = [canonicalize(url).host for url in urls]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.to_thread(cert_watch.watch, hosts)
+    return JSONResponse({"watching": hosts})
+
+
+@app.post("/admin/crawls", status_code=202)
+async def admin_start_crawl(request: Request, url: str):
+    """Queue a crawl of a site's sitemap pages for the crawl worker; poll the returned id for the report"""
+    require_admin(request)
+    try:
+        crawl_id = await asyncio.to_thread(crawler.queue_crawl, url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({"id": crawl_id, "report": f"/admin/crawls/{crawl_id}"}, status_code=202)
+
+
+@app.get("/admin/crawls/{crawl_id}")
+async def admin_crawl_report(request: Request, crawl_id: int, limit: int = 50):
+    """Progress of a crawl with its duplicate and missing titles and descriptions"""
+    require_admin(request)
+    report = await asyncio.to_thread(crawler.crawl_report, crawl_id, limit)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Unknown crawl")
+    return JSONResponse(report)
+
+
 @app.get("/auth")
 async def google_login():
     auth_url = get_google_auth_url()
     return RedirectResponse(auth_url)
 
 
-@app.get("/callback", response_class=HTMLResponse)
-async def oauth_callback(request: Request, code: str):
-    request_id = datetime.now().strftime('%Y%m%d_%H%M%S')
-    logger.info(f"[{request_id}] Starting OAuth callback processing")
-    
-    try:
-        token = get_google_token(code)
-        logger.debug(f"[{request_id}] Successfully obtained OAuth token")
-        
-        analytics_data = {"success": False, "data": None, "error": None}
-        search_console_data = {"success": False, "data": None, "error": None}
-        # lighthouse_data = []
+DASHBOARD_SECTIONS = ("analytics", "search_console")
 
-        # Fetch and log analytics data
+
+async def build_dashboard_data(user_id: str, include: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Collect GA4 and Search Console data for a user, reusing cached results
+    and stored credentials where possible. `include` limits which of the
+    two are fetched.
+    """
+    include = include or list(DASHBOARD_SECTIONS)
+    analytics_data = {"success": False, "data": None, "error": None}
+    search_console_data = {"success": False, "data": None, "error": None}
+
+    # Fetch and log analytics data
+    if "analytics" in include:
         try:
-            raw_analytics = await asyncio.to_thread(get_user_analytics_data, token)
+            raw_analytics = await credential_manager.get_cached(
+                user_id, "analytics",
+                lambda token: run_collector("analytics", get_user_analytics_data, token)
+            )
             analytics_data = {"success": True, "data": serialize_data(raw_analytics), "error": None}
-            logger.debug(f"[{request_id}] Analytics data fetched successfully")
+            logger.debug("Analytics data fetched successfully")
+        except CredentialError:
+            raise
         except Exception as e:
-            logger.error(f"[{request_id}] Analytics error: {str(e)}")
+            logger.error(f"Analytics error: {str(e)}")
             analytics_data["error"] = str(e)
 
-        # Fetch and log search console data
-        try:
-            raw_search_console = await asyncio.to_thread(get_user_search_console_data, token)
-            search_console_data = {"success": True, "data": serialize_data(raw_search_console), "error": None}
-            logger.debug(f"[{request_id}] Search Console data fetched successfully")
-            
-            # Log the structure of search_console_data
-            logger.debug(f"[{request_id}] Search Console data structure: {json.dumps(search_console_data, indent=2)}")
-        except Exception as e:
-            logger.error(f"[{request_id}] Search Console error: {str(e)}")
-            search_console_data["error"] = str(e)
-
-        # Extract and validate site URLs
-        site_urls = []
-        if search_console_data.get("success") and search_console_data.get("data"):
-            # Handle both possible data structures
-            if isinstance(search_console_data["data"], dict):
-                if "success" in search_console_data["data"]:
-                    site_urls = list(search_console_data["data"]["success"].keys())
-                else:
-                    site_urls = list(search_console_data["data"].keys())
-            
-            logger.info(f"[{request_id}] Extracted site URLs: {site_urls}")
-        
-        if not site_urls:
-            logger.error(f"[{request_id}] No valid site URLs found in Search Console data")
-            raise ValueError("No valid sites found in Search Console data")
-
-        template_data = {
-            "request_id": request_id,
-            "analytics_data": analytics_data,
-            "search_console_data": search_console_data,
-            # "lighthouse_data": lighthouse_data,
-        }
-        
-        # Log template data structure before rendering
-        logger.debug(f"[{request_id}] Template data structure: {json.dumps(template_data, indent=2)}")
+    if "search_console" not in include:
+        return {"request_id": current_request_id(), "analytics_data": analytics_data}
 
-        return templates.TemplateResponse("dashboard.html", {"request": request, **template_data})
-    
+    # Fetch and log search console data
+    try:
+        raw_search_console = await credential_manager.get_cached(
+            user_id, "search_console",
+            lambda token: run_collector("search_console", get_user_search_console_data, token)
+        )
+        search_console_data = {"success": True, "data": serialize_data(raw_search_console), "error": None}
+        logger.debug("Search Console data fetched successfully")
+    except CredentialError:
+        raise
     except Exception as e:
-        logger.exception(f"[{request_id}] Unexpected error in callback")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.error(f"Search Console error: {str(e)}")
+        search_console_data["error"] = str(e)
+
+    # Extract and validate site URLs
+    site_urls = []
+    if search_console_data.get("success") and search_console_data.get("data"):
+        # Handle both possible data structures
+        if isinstance(search_console_data["data"], dict):
+            if "success" in search_console_data["data"]:
+                site_urls = list(search_console_data["data"]["success"].keys())
+            else:
+                site_urls = list(search_console_data["data"].keys())
+
+        logger.info(f"Extracted site URLs: {site_urls}")
+
+    if not site_urls:
+        logger.error("No valid site URLs found in Search Console data")
+        raise ValueError("No valid sites found in Search Console data")
+
+    return {
+        "request_id": current_request_id(),
+        "analytics_data": analytics_data,
+        "search_console_data": search_console_data,
+    }
+
+
+@app.get("/callback", response_class=HTMLResponse)
+async def oauth_callback(request: Request, code: str):
+    logger.info("Starting OAuth callback processing")
+
+    try:
+        user_id = await credential_manager.exchange_code(code)
+        logger.debug("Successfully obtained OAuth credentials")
+
+        template_data = await build_dashboard_data(user_id)
+        response = templates.TemplateResponse(request, "dashboard.html", {"request": request, **template_data})
+        response.set_cookie(
+            SESSION_COOKIE,
+            credential_manager.session_cookie(user_id),
+            max_age=SESSION_MAX_AGE,
+            httponly=True,
+            samesite="lax"
+        )
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error in callback")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/dashboard", response_class=HTMLResponse)
+async def dashboard(request: Request, webly_session: Optional[str] = Cookie(None)):
+    """Render the dashboard from stored credentials, falling back to the OAuth flow"""
+    user_id = await credential_manager.user_from_cookie(webly_session)
+    if user_id is None:
+        return RedirectResponse("/auth")
+
+    try:
+        template_data = await build_dashboard_data(user_id)
+    except CredentialError as e:
+        logger.info(f"Stored credentials unusable, restarting OAuth: {str(e)}")
+        return RedirectResponse("/auth")
+    except Exception as e:
+        logger.exception("Unexpected error in dashboard")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return templates.TemplateResponse(request, "dashboard.html", {"request": request, **template_data})
+
+
+@app.get("/search_console/window")
+async def search_console_window(
+    site: str,
+    days: int = 28,
+    dimension: str = "query",
+    limit: int = 50,
+    webly_session: Optional[str] = Cookie(None)
+):
+    """Query a rolling window of a site's Search Console data from the local store"""
+    user_id = await credential_manager.user_from_cookie(webly_session)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Not signed in")
+
+    try:
+        raw_search_console = await credential_manager.get_cached(
+            user_id, "search_console",
+            lambda token: run_in_pool("google_api", get_user_search_console_data, token)
+        )
+    except CredentialError:
+        raise HTTPException(status_code=401, detail="Stored credentials are no longer valid")
+
+    # Only serve sites the user can see in Search Console
+    if site not in raw_search_console.get("sites", {}):
+        raise HTTPException(status_code=404, detail=f"Unknown site: {site}")
+
+    try:
+        rows = await asyncio.to_thread(query_window, site, days, dimension, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    totals = await asyncio.to_thread(window_totals, site, days)
+    return JSONResponse({"site": site, "dimension": dimension, "totals": totals, "rows": rows})
+
+
+@app.get("/api/v1/audit")
+async def api_audit(request: Request, url: str, include: Optional[str] = None, fields: Optional[str] = None):
+    """
+    Audit results as JSON. ?include=lighthouse,ssl runs only those collectors,
+    ?fields=lighthouse.performance_score trims the response to those paths.
+    """
+    try:
+        target = canonicalize(url)
+        names = parse_include(include)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = await run_audit(target, names)
+    collectors = {name: section_json(name, result, target) for name, result in results.items()}
+    return conditional_json(request, {"url": target.url, "collectors": select_fields(collectors, fields)})
+
+
+@app.get("/api/v1/collectors")
+async def api_collectors():
+    """Registered collectors with their inputs, cost class and timeout; the non-internal ones can be included"""
+    return JSONResponse([spec.describe() for spec in REGISTRY.values()])
+
+
+async def read_url_list(request: Request) -> List[str]:
+    """
+    URLs of a bulk request: a JSON list or {"urls": [...]}, a multipart upload
+    in a `file` field, or a plain-text body with one URL per line.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            body = await request.json()
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        urls = body.get("urls") if isinstance(body, dict) else body
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            raise ValueError('Expected a list of URLs or {"urls": [...]}')
+        return [url.strip() for url in urls if url.strip()]
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise ValueError("Upload the URL list in a 'file' field")
+        return parse_url_list((await upload.read()).decode("utf-8", errors="replace"))
+    return parse_url_list((await request.body()).decode("utf-8", errors="replace"))
+
+
+@app.post("/api/v1/audit/bulk")
+async def api_audit_bulk(request: Request, include: Optional[str] = None):
+    """Audit many URLs, streaming one NDJSON line per site as it finishes"""
+    try:
+        names = parse_include(include)
+        urls = await read_url_list(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not urls:
+        raise HTTPException(status_code=400, detail="No URLs given")
+    if len(urls) > MAX_BULK_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_URLS} URLs per request")
+
+    async def lines():
+        async for result in audit_many(urls, names):
+            yield json.dumps(result, separators=(",", ":"), default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/api/v1/dashboard")
+async def api_dashboard(
+    request: Request,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    webly_session: Optional[str] = Cookie(None)
+):
+    """Dashboard data as JSON, ?include=analytics or search_console fetches only that source"""
+    user_id = await credential_manager.user_from_cookie(webly_session)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Not signed in")
+
+    names = [name.strip() for name in (include or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+
+    try:
+        data = await build_dashboard_data(user_id, names or None)
+    except CredentialError:
+        raise HTTPException(status_code=401, detail="Stored credentials are no longer valid")
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    sections = {
+        name: data[f"{name}_data"] for name in (names or DASHBOARD_SECTIONS) if f"{name}_data" in data
+    }
+    return conditional_json(request, select_fields(sections, fields))
+
+
+# Everything above, including the imports, counts as import time
+IMPORT_SECONDS = time.perf_counter() - _import_started
+STARTUP_SECONDS.set("import", value=IMPORT_SECONDS)
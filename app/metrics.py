@@ -0,0 +1,368 @@
+# app/metrics.py
+import bisect
+import contextvars
+import fcntl
+import glob
+import logging
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Each gunicorn worker only counts its own requests. With METRICS_DIR set, every worker writes its
+# values there and /metrics merges them, whichever worker answers the scrape.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+logger = logging.getLogger(__name__)
+
+# Per-request timing breakdown, populated by track_collector() while a request is handled.
+# asyncio.to_thread copies the context, so collectors running in threads write to the same dict.
+request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], Any]] = None,
+               label_names: Optional[Tuple[str, ...]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples(self.snapshot() if values is None else values, label_names or self.label_names))
+        return lines
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        raise NotImplementedError
+
+    def _samples(self, values: Dict[Tuple[str, ...], Any], label_names: Tuple[str, ...]) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict[Tuple[str, ...], float], values: Dict[Tuple[str, ...], float]):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def _samples(self, values: Dict[Tuple[str, ...], float], label_names: Tuple[str, ...]) -> List[str]:
+        return [f"{self.name}{_format_labels(label_names, key)} {value}" for key, value in values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, *labels: str, value: float):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict[Tuple[str, ...], List[float]], values: Dict[Tuple[str, ...], List[float]]):
+        for key, series in values.items():
+            if key in total:
+                total[key] = [a + b for a, b in zip(total[key], series)]
+            else:
+                total[key] = list(series)
+
+    def _samples(self, values: Dict[Tuple[str, ...], List[float]], label_names: Tuple[str, ...]) -> List[str]:
+        lines = []
+        for key, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(label_names, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(label_names, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        if METRICS_DIR:
+            return self._render_shared()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def write(self, directory: Optional[str] = None):
+        """Save this worker's values for the other workers' scrapes"""
+        path = os.path.join(directory or METRICS_DIR, f"{os.getpid()}.metrics")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.snapshot(), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _render_shared(self) -> str:
+        self.write()
+        with _directory_lock(METRICS_DIR):
+            _archive_dead_workers(METRICS_DIR)
+            snapshots = {path: _read_snapshot(path) for path in glob.glob(os.path.join(METRICS_DIR, "*.metrics"))}
+
+        lines = []
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Gauge):
+                # Gauges of several workers don't add up, so each live worker's value is its own series
+                values = {}
+                for path, snapshot in snapshots.items():
+                    pid = _worker_pid(path)
+                    if pid is not None:
+                        values.update({key + (str(pid),): value for key, value in snapshot.get(name, {}).items()})
+                lines.extend(metric.render(values, metric.label_names + ("pid",)))
+            else:
+                values = {}
+                for snapshot in snapshots.values():
+                    metric.merge(values, snapshot.get(name, {}))
+                lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+_writer_stop = threading.Event()
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _read_snapshot(path: str) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        logger.warning(f"Could not read metrics from {path}: {e}")
+        return {}
+
+
+def _worker_pid(path: str) -> Optional[int]:
+    """The pid a snapshot file belongs to, None for the archive"""
+    name = os.path.basename(path).split(".", 1)[0]
+    return int(name) if name.isdigit() else None
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _archive_dead_workers(directory: str):
+    """
+    Fold the counters and histograms of exited workers into archive.metrics, so
+    totals don't drop when gunicorn recycles a worker. Their gauges are dropped.
+    """
+    archive_path = os.path.join(directory, "archive.metrics")
+    dead = [path for path in glob.glob(os.path.join(directory, "*.metrics"))
+            if _worker_pid(path) is not None and not _is_alive(_worker_pid(path))]
+    if not dead:
+        return
+    archive = _read_snapshot(archive_path) if os.path.exists(archive_path) else {}
+    for path in dead:
+        for name, values in _read_snapshot(path).items():
+            metric = registry._metrics.get(name)
+            if metric is not None and not isinstance(metric, Gauge):
+                metric.merge(archive.setdefault(name, {}), values)
+    tmp_path = f"{archive_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(archive, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, archive_path)
+    for path in dead:
+        os.remove(path)
+
+
+def _write_periodically():
+    while not _writer_stop.wait(METRICS_FLUSH_INTERVAL):
+        try:
+            registry.write()
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {METRICS_DIR}: {e}")
+
+
+def start_metrics_writer():
+    """Share this worker's metrics through METRICS_DIR, if set, until stop_metrics_writer()"""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _writer_stop.clear()
+    registry.write()
+    threading.Thread(target=_write_periodically, name="metrics-writer", daemon=True).start()
+
+
+def stop_metrics_writer():
+    if not METRICS_DIR:
+        return
+    _writer_stop.set()
+    # The last values go into the archive once the worker has exited
+    registry.write()
+
+COLLECTOR_DURATION = registry.register(Histogram(
+    "webly_collector_duration_seconds", "Time spent in each audit collector", ("collector",)))
+COLLECTOR_ERRORS = registry.register(Counter(
+    "webly_collector_errors_total", "Collector calls that raised", ("collector",)))
+COLLECTOR_TIMEOUTS = registry.register(Counter(
+    "webly_collector_timeouts_total", "Collector calls that timed out", ("collector",)))
+UPSTREAM_DURATION = registry.register(Histogram(
+    "webly_upstream_duration_seconds", "Latency of calls to upstream services", ("upstream",)))
+UPSTREAM_ERRORS = registry.register(Counter(
+    "webly_upstream_errors_total", "Failed upstream calls by reason", ("upstream", "reason")))
+UPSTREAM_RETRIES = registry.register(Counter(
+    "webly_upstream_retries_total", "Retries issued against upstream services", ("upstream",)))
+UPSTREAM_QUOTA_REMAINING = registry.register(Gauge(
+    "webly_upstream_quota_remaining", "Remaining quota reported by the upstream", ("upstream",)))
+CACHE_REQUESTS = registry.register(Counter(
+    "webly_cache_requests_total", "Cache lookups by result", ("cache", "result")))
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, (TimeoutError, requests.exceptions.Timeout))
+
+
+@contextmanager
+def track_collector(name: str):
+    """Time one collector run and add it to the current request's breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if _is_timeout(e):
+            COLLECTOR_TIMEOUTS.inc(name)
+        else:
+            COLLECTOR_ERRORS.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        COLLECTOR_DURATION.observe(name, value=elapsed)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + elapsed
+
+
+@contextmanager
+def track_upstream(name: str):
+    """Time one call to an upstream service, counting failures and timeouts"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if _is_timeout(e):
+            UPSTREAM_ERRORS.inc(name, "timeout")
+        elif isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+            UPSTREAM_ERRORS.inc(name, str(e.response.status_code))
+        else:
+            UPSTREAM_ERRORS.inc(name, type(e).__name__)
+        raise
+    finally:
+        UPSTREAM_DURATION.observe(name, value=time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def observe_response(upstream: str, response: requests.Response):
+    """Record retries done by urllib3 and any quota the upstream reports"""
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    if retries is not None and retries.history:
+        UPSTREAM_RETRIES.inc(upstream, amount=len(retries.history))
+
+    headers = response.headers
+    if "X-RateLimit-Remaining" in headers:
+        UPSTREAM_QUOTA_REMAINING.set(upstream, value=float(headers["X-RateLimit-Remaining"]))
+    elif "X-Max-Assessments" in headers and "X-Current-Assessments" in headers:
+        # SSL Labs reports concurrent assessment slots instead of a rate limit
+        remaining = int(headers["X-Max-Assessments"]) - int(headers["X-Current-Assessments"])
+        UPSTREAM_QUOTA_REMAINING.set(upstream, value=remaining)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Format a timing breakdown as a Server-Timing header value (milliseconds)"""
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings.items())
@@ -1,84 +1,114 @@
 import xml.etree.ElementTree as ET
 import requests
 import logging
-from urllib.parse import quote
+import os
+import re
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from urllib.parse import quote, urlsplit
 from requests.exceptions import RequestException
+from typing import Dict, List, Optional, Tuple, Union
+from app.cache import COLLECTOR_TTLS, lookup, store
+from app.resilience import guard
+from app.targets import Target, as_target
+from app.upstreams import GOOGLE_NEWS_RSS_URL
 
-def fetch_google_rss_news(url: str):
+NEWS_BATCH_SIZE = int(os.getenv("NEWS_BATCH_SIZE", "10"))  # Domains combined into one OR query
+NEWS_BATCH_WINDOW = float(os.getenv("NEWS_BATCH_WINDOW", "0.05"))  # Seconds concurrent audits wait to share a query
+# Seconds an audit waits for its batch before querying alone, well inside the scraping pool's 45s timeout
+NEWS_BATCH_TIMEOUT = float(os.getenv("NEWS_BATCH_TIMEOUT", "10"))
+NEWS_MIN_ITEMS = int(os.getenv("NEWS_MIN_ITEMS", "3"))  # Domains a batch finds fewer items for are queried alone
+MAX_QUERY_URL_LENGTH = 2000
+
+def parse_google_rss(content: bytes):
     """
-    Fetch news articles for a given domain using Google News RSS feed
+    Parse a Google News RSS document into news item dictionaries.
+    Raises ET.ParseError on malformed XML.
+    """
+    root = ET.fromstring(content)
     
-    Args:
-        domain (str): The domain to search for news
+    # Find the channel element
+    channel = root.find('channel')
     
-    Returns:
-        list: A list of dictionaries containing news article details
-    """
-    try:
-        # Encode the domain to handle special characters
-        encoded_domain = quote(url)
-        
-        # Construct the Google News RSS URL
-        rss_url = f"https://news.google.com/rss/search?q={encoded_domain}"
-        
-        # Send GET request to fetch RSS feed
-        response = requests.get(rss_url)
-        response.raise_for_status()
-        
-        # Parse the XML response
-        root = ET.fromstring(response.content)
+    # List to store news items
+    news_items = []
+    
+    # Iterate through items in the RSS feed
+    for item in channel.findall('item'):
+        # Extract title
+        title = item.find('title').text if item.find('title') is not None else 'N/A'
         
-        # Find the channel element
-        channel = root.find('channel')
+        # Extract link
+        link = item.find('link').text if item.find('link') is not None else 'N/A'
         
-        # List to store news items
-        news_items = []
+        # Extract description and source
+        description_elem = item.find('description')
+        description = 'N/A'
+        source = 'N/A'
         
-        # Iterate through items in the RSS feed
-        for item in channel.findall('item'):
-            # Extract title
-            title = item.find('title').text if item.find('title') is not None else 'N/A'
-            
-            # Extract link
-            link = item.find('link').text if item.find('link') is not None else 'N/A'
+        if description_elem is not None:
+            # The description contains an HTML-like structure
+            desc_text = description_elem.text
             
-            # Extract description and source
-            description_elem = item.find('description')
-            description = 'N/A'
-            source = 'N/A'
+            # Try to extract source from the description
+            source_start = desc_text.find('<font color="#6f6f6f">') 
+            if source_start != -1:
+                source_end = desc_text.find('</font>', source_start)
+                if source_end != -1:
+                    source = desc_text[source_start + len('<font color="#6f6f6f">'): source_end]
             
-            if description_elem is not None:
-                # The description contains an HTML-like structure
-                desc_text = description_elem.text
-                
-                # Try to extract source from the description
-                source_start = desc_text.find('<font color="#6f6f6f">') 
-                if source_start != -1:
-                    source_end = desc_text.find('</font>', source_start)
-                    if source_end != -1:
-                        source = desc_text[source_start + len('<font color="#6f6f6f">'): source_end]
-                
-                # Extract the link text
-                link_start = desc_text.find('">') 
-                link_end = desc_text.find('</a>', link_start)
-                if link_start != -1 and link_end != -1:
-                    description = desc_text[link_start + 2: link_end]
-            
-            # Extract publication date
-            pub_date = item.find('pubDate').text if item.find('pubDate') is not None else 'N/A'
-            
-            # Create news item dictionary
-            news_item = {
-                'title': title,
-                'link': link,
-                'description': description,
-                'source': source,
-                'pub_date': pub_date
-            }
-            
-            news_items.append(news_item)
+            # Extract the link text
+            link_start = desc_text.find('">') 
+            link_end = desc_text.find('</a>', link_start)
+            if link_start != -1 and link_end != -1:
+                description = desc_text[link_start + 2: link_end]
+        
+        # Extract publication date
+        pub_date = item.find('pubDate').text if item.find('pubDate') is not None else 'N/A'
+
+        # The publisher's site, used to tell apart the domains of a batched query
+        source_elem = item.find('source')
+        source_url = source_elem.get('url') if source_elem is not None else None
+        
+        # Create news item dictionary
+        news_item = {
+            'title': title,
+            'link': link,
+            'description': description,
+            'source': source,
+            'source_url': source_url,
+            'pub_date': pub_date
+        }
         
-        return news_items
+        news_items.append(news_item)
+    
+    return news_items
+
+
+def _query_url(query: str) -> str:
+    return f"{GOOGLE_NEWS_RSS_URL}?q={quote(query)}"
+
+
+def _request_rss(query: str):
+    """Items of one Google News RSS search; raises on request and parse errors"""
+    with guard("google_news"):
+        response = requests.get(_query_url(query), timeout=30)
+        response.raise_for_status()
+    return parse_google_rss(response.content)
+
+
+def fetch_google_rss_news(url: Union[str, Target]):
+    """
+    Fetch news articles for a given domain using Google News RSS feed
+    
+    Args:
+        url (str | Target): The site to search for news
+    
+    Returns:
+        list: A list of dictionaries containing news article details
+    """
+    try:
+        return _request_rss(as_target(url).site_host)
     
     except RequestException as e:
         logging.error(f"Request failed: {e}")
@@ -89,3 +119,173 @@ def fetch_google_rss_news(url: str):
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return []
+
+
+def batch_query(hosts: List[str]) -> str:
+    return " OR ".join(f'"{host}"' for host in hosts)
+
+
+def plan_batches(hosts: List[str], size: int = NEWS_BATCH_SIZE) -> List[List[str]]:
+    """Group domains into OR queries of at most `size` domains and MAX_QUERY_URL_LENGTH characters"""
+    batches: List[List[str]] = []
+    for host in hosts:
+        if batches and len(batches[-1]) < size and len(_query_url(batch_query(batches[-1] + [host]))) <= MAX_QUERY_URL_LENGTH:
+            batches[-1].append(host)
+        else:
+            batches.append([host])
+    return batches
+
+
+def _patterns(targets: List[Target]) -> Dict[str, re.Pattern]:
+    """
+    The full domain as it would be written in a title or description. Bare
+    names (today for today.com) are left out, they match ordinary words.
+    """
+    return {
+        target.site_host: re.compile(rf"(?<![\w-]){re.escape(target.site_host)}(?![\w-])", re.IGNORECASE)
+        for target in targets
+    }
+
+
+def _publisher_host(item) -> str:
+    # The item link always points at news.google.com, only the <source> url names the publisher
+    host = urlsplit(item.get('source_url') or "").hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def demultiplex(items, targets: List[Target]) -> Dict[str, list]:
+    """
+    Split the items of a batched query back to its domains. An item belongs to
+    the domain that published it, otherwise to the domain its title,
+    description or source names in full. Items naming several domains of the
+    batch, or none, are dropped; domains left short get their own query.
+    """
+    patterns = _patterns(targets)
+    by_host: Dict[str, list] = {target.site_host: [] for target in targets}
+    for item in items:
+        publisher = _publisher_host(item)
+        matches = [site for site in by_host if publisher == site or publisher.endswith(f".{site}")]
+        if not matches:
+            text = " ".join(str(item.get(field) or "") for field in ('title', 'description', 'source'))
+            matches = [site for site in by_host if patterns[site].search(text)]
+        if len(matches) == 1:
+            by_host[matches[0]].append(item)
+    return by_host
+
+
+def fetch_news_batch(targets: List[Union[str, Target]], cache: bool = True) -> Dict[str, list]:
+    """
+    News for many domains with few requests: domains are combined into OR
+    queries and the items split back per domain. Domains a batch finds fewer
+    than NEWS_MIN_ITEMS items for get a query of their own. Keyed by site_host.
+    With cache, results are read from and written to the shared news cache.
+    """
+    unique: Dict[str, Target] = {}
+    for target in map(as_target, targets):
+        unique.setdefault(target.site_host, target)
+
+    results: Dict[str, list] = {}
+    if cache:
+        for host, target in unique.items():
+            cached = lookup("news", target)
+            if cached is not None:
+                results[host] = cached
+    remaining = [host for host in unique if host not in results]
+
+    underserved: List[str] = []
+    for hosts in plan_batches(remaining):
+        if len(hosts) == 1:
+            underserved.extend(hosts)
+            continue
+        batch = [unique[host] for host in hosts]
+        try:
+            items = _request_rss(batch_query(hosts))
+        except Exception as e:
+            logging.warning(f"Batched news query for {len(hosts)} domains failed: {e}")
+            underserved.extend(hosts)
+            continue
+        for host, found in demultiplex(items, batch).items():
+            if len(found) >= NEWS_MIN_ITEMS:
+                results[host] = found
+            else:
+                underserved.append(host)
+
+    for host in underserved:
+        results[host] = fetch_google_rss_news(unique[host])
+
+    if cache:
+        for host in remaining:
+            store("news", unique[host], results[host], COLLECTOR_TTLS["news"])
+    logging.info(f"News for {len(unique)} domains: {len(remaining) - len(underserved)} from batched queries, "
+                 f"{len(underserved)} queried alone")
+    return results
+
+
+class NewsBatcher:
+    """
+    Collects the news lookups of concurrent audits for NEWS_BATCH_WINDOW
+    seconds, or until NEWS_BATCH_SIZE domains are waiting, and answers them
+    all from one fetch_news_batch call.
+    """
+
+    def __init__(self, window: float = NEWS_BATCH_WINDOW, size: int = NEWS_BATCH_SIZE,
+                 timeout: float = NEWS_BATCH_TIMEOUT):
+        self.window = window
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, Tuple[Target, List[Future]]] = {}
+        self._timer: Optional[threading.Timer] = None
+
+    def fetch(self, target: Union[str, Target]) -> list:
+        target = as_target(target)
+        if self.window <= 0:
+            return fetch_google_rss_news(target)
+        future: Future = Future()
+        with self._lock:
+            self._waiting.setdefault(target.site_host, (target, []))[1].append(future)
+            batch = self._take() if len(self._waiting) >= self.size else None
+            if batch is None and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._send(batch)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The batch keeps going for the other callers, this one stops waiting for it
+            logging.warning(f"Batched news for {target.site_host} took over {self.timeout}s, querying it alone")
+            return fetch_google_rss_news(target)
+
+    def _take(self) -> Dict[str, Tuple[Target, List[Future]]]:
+        batch, self._waiting = self._waiting, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch: Dict[str, Tuple[Target, List[Future]]]):
+        # Callers cache their own results through the collector path
+        try:
+            results = fetch_news_batch([target for target, _ in batch.values()], cache=False)
+        except Exception as e:
+            logging.error(f"Batched news fetch failed: {e}")
+            results = {}
+        for host, (_, futures) in batch.items():
+            for future in futures:
+                future.set_result(results.get(host, []))
+
+
+_batcher = NewsBatcher()
+
+
+def fetch_news(url: Union[str, Target]):
+    """News for one domain, sharing a batched query with the audits running at the same time"""
+    return _batcher.fetch(url)
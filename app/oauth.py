@@ -1,6 +1,9 @@
+import asyncio
 import os
-import requests
 from fastapi import HTTPException
+from app.lazy import prefetch
+from app.metrics import track_upstream
+from app.upstreams import GOOGLE_OAUTH_TOKEN_URL, GOOGLE_USERINFO_URL
 
 # Environment variables for Google API credentials
 CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -13,6 +16,12 @@ SCOPE = (
     "https://www.googleapis.com/auth/userinfo.profile"
     # "https://www.googleapis.com/auth/cse"
 )
+TOKEN_URL = GOOGLE_OAUTH_TOKEN_URL
+USERINFO_URL = GOOGLE_USERINFO_URL
+TOKEN_TIMEOUT = 30  # Seconds
+
+# aiohttp is imported on the first sign-in, or on warm-up
+prefetch("aiohttp")
 
 # Step 1: Get Google Auth URL (User signs in with Google)
 def get_google_auth_url():
@@ -27,21 +36,64 @@ def get_google_auth_url():
     )
     return auth_url
 
-# Step 2: Exchange authorization code for access token
-def get_google_token(code: str):
-    token_url = "https://oauth2.googleapis.com/token"
-    data = {
+class TokenRejected(HTTPException):
+    """Google refused the grant itself (invalid_grant): the token is revoked or expired, retrying won't help"""
+    pass
+
+async def _post_token_request(data: dict) -> dict:
+    import aiohttp  # Only needed at sign-in, kept off the startup path
+
+    try:
+        with track_upstream("google_oauth"):
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TOKEN_TIMEOUT)) as session:
+                async with session.post(TOKEN_URL, data=data) as response:
+                    if response.status != 200:
+                        text = await response.text()
+                        if response.status in (400, 401) and '"invalid_grant"' in text:
+                            raise TokenRejected(status_code=400, detail=f"Error fetching token: {text}")
+                        # Google errors are worth retrying later, request errors are the caller's
+                        status_code = 502 if response.status >= 500 else 400
+                        raise HTTPException(status_code=status_code, detail=f"Error fetching token: {text}")
+                    return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=f"Error fetching token: {str(e) or type(e).__name__}")
+
+# Step 2: Exchange authorization code for tokens
+async def get_google_token(code: str) -> dict:
+    """
+    Exchange the authorization code for the full token response.
+    Contains access_token, expires_in and (with access_type=offline) refresh_token.
+    """
+    return await _post_token_request({
         "code": code,
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
         "redirect_uri": REDIRECT_URI,
         "grant_type": "authorization_code"
-    }
+    })
+
+# Step 3: Get a fresh access token without sending the user through consent again
+async def refresh_google_token(refresh_token: str) -> dict:
+    """Exchange a stored refresh token for a new access token"""
+    return await _post_token_request({
+        "refresh_token": refresh_token,
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "grant_type": "refresh_token"
+    })
+
+async def get_google_user_id(access_token: str) -> str:
+    """Return the stable Google account id for the token owner"""
+    import aiohttp
+
+    headers = {"Authorization": f"Bearer {access_token}"}
     try:
-        r = requests.post(token_url, data=data)
-        r.raise_for_status()  # Raise exception if the token request fails
-        token_response = r.json()
-        return token_response["access_token"]
-    
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=400, detail=f"Error fetching token: {str(e)}")
\ No newline at end of file
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TOKEN_TIMEOUT)) as session:
+            async with session.get(USERINFO_URL, headers=headers) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    raise HTTPException(status_code=400, detail=f"Error fetching user info: {text}")
+                user_info = await response.json()
+    except aiohttp.ClientError as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching user info: {str(e)}")
+    return user_info["id"]
@@ -0,0 +1,308 @@
+# app/resilience.py
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import requests
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from app.metrics import Counter, Gauge, registry, track_upstream
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+THROTTLE_STATUSES = {429, 529}  # 529 is SSL Labs' "service overloaded"
+ACQUIRE_TIMEOUT = float(os.getenv("UPSTREAM_ACQUIRE_TIMEOUT", "10"))  # Max wait for a concurrency slot
+
+CIRCUIT_STATE = registry.register(Gauge(
+    "webly_circuit_state", "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)", ("upstream",)))
+CIRCUIT_REJECTIONS = registry.register(Counter(
+    "webly_circuit_rejections_total", "Calls refused without reaching the upstream", ("upstream", "reason")))
+CONCURRENCY_LIMIT = registry.register(Gauge(
+    "webly_upstream_concurrency_limit", "Current adaptive concurrency limit per upstream", ("upstream",)))
+RETRY_BUDGET_EXHAUSTED = registry.register(Counter(
+    "webly_retry_budget_exhausted_total", "Retries skipped because the upstream's budget was spent", ("upstream",)))
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open or whose concurrency limit is reached"""
+
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and refuses calls
+    for `recovery_timeout` seconds. Then lets a single probe through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(name, value=0)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit for {self.name} {self.state} -> {state}")
+        self.state = state
+        CIRCUIT_STATE.set(self.name, value={CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[state])
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls would be refused, without claiming the half-open probe"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def release_probe(self):
+        """The call neither proved nor disproved the upstream's health"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by one slot per limit's worth of fast
+    successes and halves on throttling, timeouts or calls slower than
+    `latency_target`.
+    """
+
+    DECREASE_INTERVAL = 1.0  # Halve at most once a second, a burst of failures is one signal
+
+    def __init__(self, name: str, initial: int, minimum: int = 1, maximum: Optional[int] = None,
+                 latency_target: float = 10):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum or initial * 4
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        CONCURRENCY_LIMIT.set(name, value=initial)
+
+    def acquire(self, timeout: float = ACQUIRE_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float], congested: bool):
+        with self._cond:
+            self.in_flight -= 1
+            if congested or (latency is not None and latency > self.latency_target):
+                now = time.monotonic()
+                if now - self._last_decrease >= self.DECREASE_INTERVAL:
+                    self._last_decrease = now
+                    self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            CONCURRENCY_LIMIT.set(self.name, value=int(self.limit))
+            self._cond.notify_all()
+
+
+class RetryBudget:
+    """
+    Retries are paid from a token bucket that every first attempt tops up by
+    `ratio`, so retries can add at most that share of extra load. `reserve`
+    tokens cover quiet periods.
+    """
+
+    def __init__(self, name: str, ratio: float = 0.2, reserve: float = 5):
+        self.name = name
+        self.ratio = ratio
+        self.capacity = max(reserve, 10.0)
+        self.tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+        RETRY_BUDGET_EXHAUSTED.inc(self.name)
+        return False
+
+
+@dataclass
+class Upstream:
+    name: str
+    breaker: CircuitBreaker
+    limiter: AdaptiveLimiter
+    budget: RetryBudget
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "retry_tokens": round(self.budget.tokens, 2),
+        }
+
+
+def _upstream(name: str, concurrency: int, latency_target: float,
+              failure_threshold: int = 5, recovery_timeout: float = 30) -> Upstream:
+    return Upstream(
+        name,
+        CircuitBreaker(name, failure_threshold, recovery_timeout),
+        AdaptiveLimiter(name, concurrency, latency_target=latency_target),
+        RetryBudget(name),
+    )
+
+
+UPSTREAMS: Dict[str, Upstream] = {
+    "psi": _upstream("psi", 8, latency_target=45, recovery_timeout=60),
+    "ssllabs": _upstream("ssllabs", 4, latency_target=15, recovery_timeout=120),
+    "google_trends": _upstream("google_trends", 2, latency_target=10, failure_threshold=3, recovery_timeout=300),
+    "whois": _upstream("whois", 8, latency_target=10),
+    "google_news": _upstream("google_news", 8, latency_target=5),
+}
+
+# Upstream behind each collector, to skip collectors whose upstream is known to be down
+COLLECTOR_UPSTREAMS = {
+    "lighthouse": "psi",
+    "ssl": "ssllabs",
+    "trends": "google_trends",
+    "whois": "whois",
+    "news": "google_news",
+}
+
+
+def get_upstream(name: str) -> Upstream:
+    return UPSTREAMS[name]
+
+
+def is_available(name: str) -> bool:
+    upstream = UPSTREAMS.get(name)
+    return upstream is None or not upstream.breaker.is_open()
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _classify(exc: BaseException) -> str:
+    """'throttled', 'failure' (upstream unhealthy) or 'neutral' (the call itself was bad)"""
+    status = _status_code(exc)
+    if status in THROTTLE_STATUSES or "429" in str(exc):
+        return "throttled"
+    if status is not None:
+        return "failure" if status >= 500 else "neutral"
+    if isinstance(exc, (TimeoutError, OSError, requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout, requests.exceptions.RetryError)):
+        return "failure"
+    return "neutral"
+
+
+@contextmanager
+def guard(name: str):
+    """
+    Call an upstream through its circuit breaker and adaptive concurrency
+    limit, also recording it like track_upstream. Raises UpstreamUnavailable
+    without calling out when the circuit is open or no slot frees up in time.
+    """
+    upstream = UPSTREAMS[name]
+    if not upstream.breaker.allow():
+        CIRCUIT_REJECTIONS.inc(name, "circuit_open")
+        raise UpstreamUnavailable(name, "circuit open")
+    if not upstream.limiter.acquire():
+        upstream.breaker.release_probe()
+        CIRCUIT_REJECTIONS.inc(name, "concurrency_limit")
+        raise UpstreamUnavailable(name, "concurrency limit reached")
+
+    upstream.budget.deposit()
+    start = time.monotonic()
+    latency, congested = None, False
+    try:
+        with track_upstream(name):
+            yield upstream
+    except Exception as e:
+        outcome = _classify(e)
+        if outcome == "neutral":
+            upstream.breaker.release_probe()
+        else:
+            congested = True
+            upstream.breaker.record_failure()
+        raise
+    else:
+        latency = time.monotonic() - start
+        upstream.breaker.record_success()
+    finally:
+        upstream.limiter.release(latency, congested)
+
+
+def can_retry(name: str) -> bool:
+    """Spend one retry from the upstream's budget, if the circuit still allows calls"""
+    upstream = UPSTREAMS[name]
+    return not upstream.breaker.is_open() and upstream.budget.withdraw()
+
+
+class BudgetedRetry(Retry):
+    """urllib3 Retry that also stops once the upstream's retry budget is spent"""
+
+    def __init__(self, *args, upstream: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upstream = upstream
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.upstream = self.upstream
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if self.upstream and not can_retry(self.upstream):
+            raise MaxRetryError(_pool, url, error or ResponseError(f"{self.upstream} retry budget exhausted"))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def snapshot() -> Dict[str, Any]:
+    return {name: upstream.snapshot() for name, upstream in UPSTREAMS.items()}
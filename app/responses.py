@@ -0,0 +1,105 @@
+# app/responses.py
+# JSON responses for the API: field selection, ETags and compression.
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is used without it
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024  # Smaller bodies aren't worth the CPU or the extra header bytes
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Timings and clock-derived values that differ on every run of an unchanged audit. They are
+# left out of the (weak) ETag, so a client holding the same results still gets a 304.
+VOLATILE_FIELDS = frozenset({"probe_ms", "timings_ms", "timings", "ms", "days_remaining", "fetched_at", "age"})
+
+
+def select_fields(data: Dict[str, Any], fields: Optional[str]) -> Dict[str, Any]:
+    """
+    Keep only the comma-separated dotted paths in `fields`, e.g.
+    "lighthouse.performance_score,ssl". Paths that don't exist are skipped.
+    """
+    if not fields:
+        return data
+    selected: Dict[str, Any] = {}
+    for path in filter(None, (field.strip() for field in fields.split(","))):
+        value, found = data, True
+        keys = path.split(".")
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                found = False
+                break
+            value = value[key]
+        if not found:
+            continue
+        node = selected
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return selected
+
+
+def _accepted_encodings(header: str) -> List[str]:
+    """Encodings from Accept-Encoding, skipping any sent with q=0"""
+    encodings = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            encodings.append(name.strip().lower())
+    return encodings
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, the ETag doesn't change with the content encoding
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def _without_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _without_volatile(item) for key, item in value.items() if key not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_without_volatile(item) for item in value]
+    return value
+
+
+def _etag(payload: Any) -> str:
+    stable = json.dumps(_without_volatile(payload), separators=(",", ":"), sort_keys=True, default=str)
+    return f'W/"{hashlib.sha256(stable.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def conditional_json(request: Request, payload: Any, status_code: int = 200) -> Response:
+    """
+    Serialize `payload` once and answer with 304 when the client already holds
+    it (If-None-Match). The ETag ignores VOLATILE_FIELDS. Larger bodies are
+    compressed with brotli when the client and the server support it, gzip
+    otherwise.
+    """
+    etag = _etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("If-None-Match")
+    if status_code == 200 and if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,270 @@
+# app/runtime_monitor.py
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.logging_config import current_request_id
+from app.metrics import Counter, Gauge, Histogram, registry
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))  # Seconds between loop lag samples
+LOOP_LAG_WARN = float(os.getenv("LOOP_LAG_WARN", "0.5"))  # Loop blocked this long is logged
+BLOCKING_CALL_WARN = float(os.getenv("BLOCKING_CALL_WARN", "30"))  # Worker-thread call running this long is logged
+WARNING_INTERVAL = 60  # Repeat saturation warnings at most once a minute
+STACK_DEPTH = 12  # Innermost frames included in stack samples
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = registry.register(Histogram(
+    "webly_event_loop_lag_seconds", "How late the event loop ran a scheduled wakeup",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)))
+EXECUTOR_QUEUE_DEPTH = registry.register(Gauge(
+    "webly_executor_queue_depth", "Jobs waiting for a free worker thread", ("executor",)))
+EXECUTOR_ACTIVE_THREADS = registry.register(Gauge(
+    "webly_executor_active_threads", "Worker threads currently running a job", ("executor",)))
+EXECUTOR_QUEUE_WAIT = registry.register(Histogram(
+    "webly_executor_queue_wait_seconds", "Time jobs waited for a free worker thread", ("executor",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+LONG_BLOCKING_CALLS = registry.register(Counter(
+    "webly_long_blocking_calls_total", "Worker-thread calls that ran past BLOCKING_CALL_WARN", ("executor",)))
+
+
+def _describe(fn) -> str:
+    """Name the function behind asyncio.to_thread's partial(context.run, func, ...) wrapper"""
+    while isinstance(fn, functools.partial):
+        if isinstance(getattr(fn.func, "__self__", None), contextvars.Context) and fn.args:
+            fn = fn.args[0]
+        else:
+            fn = fn.func
+    module = getattr(fn, "__module__", None) or ""
+    name = getattr(fn, "__qualname__", None) or repr(fn)
+    return f"{module}.{name}" if module else name
+
+
+def _stack_sample(thread_id: Optional[int]) -> str:
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return "  <no frame>"
+    return "".join(traceback.format_stack(frame)[-STACK_DEPTH:]).rstrip()
+
+
+@dataclass
+class _Job:
+    call: str
+    request_id: str
+    submitted: float
+    started: Optional[float] = None
+    thread_id: Optional[int] = None
+    reported: bool = False
+
+
+class MonitoredExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that knows what is queued and what each worker thread is running"""
+
+    def __init__(self, max_workers: Optional[int] = None, name: str = "default"):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self.name = name
+        self._jobs_lock = threading.Lock()
+        self._queued = 0
+        self._running: Dict[int, _Job] = {}
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def submit(self, fn, /, *args, **kwargs):
+        job = _Job(_describe(fn), current_request_id(), time.monotonic())
+        with self._jobs_lock:
+            self._queued += 1
+
+        def run():
+            job.started = time.monotonic()
+            job.thread_id = threading.get_ident()
+            with self._jobs_lock:
+                self._queued -= 1
+                self._running[job.thread_id] = job
+            EXECUTOR_QUEUE_WAIT.observe(self.name, value=job.started - job.submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._jobs_lock:
+                    self._running.pop(job.thread_id, None)
+
+        try:
+            future = super().submit(run)
+        except BaseException:
+            with self._jobs_lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(self._forget_cancelled)
+        return future
+
+    def _forget_cancelled(self, future):
+        # A job cancelled while queued (caller timed out, shutdown) never gets to run() to leave the queue
+        if future.cancelled():
+            with self._jobs_lock:
+                self._queued -= 1
+
+    def running_jobs(self) -> List[_Job]:
+        with self._jobs_lock:
+            return list(self._running.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._jobs_lock:
+            queued, running = self._queued, list(self._running.values())
+        return {
+            "name": self.name,
+            "max_workers": self._max_workers,
+            "threads": len(self._threads),
+            "active": len(running),
+            "queued": queued,
+            "running": sorted(
+                ({"call": job.call, "request_id": job.request_id, "running_for": round(now - job.started, 3)}
+                 for job in running),
+                key=lambda job: job["running_for"], reverse=True
+            ),
+        }
+
+
+class RuntimeMonitor:
+    """
+    Samples event-loop lag from inside the loop and watches the loop and the
+    executor from a separate thread, so a blocked loop is still reported.
+    Crossing a threshold logs a warning with a stack sample of the thread
+    that is stuck.
+    """
+
+    def __init__(self, lag_interval: float = LOOP_LAG_INTERVAL, lag_warn: float = LOOP_LAG_WARN,
+                 blocking_warn: float = BLOCKING_CALL_WARN):
+        self.lag_interval = lag_interval
+        self.lag_warn = lag_warn
+        self.blocking_warn = blocking_warn
+        self.executors: List[MonitoredExecutor] = []
+        self._lags: deque = deque(maxlen=600)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stall_reported = False
+        self._last_saturation_warning: Dict[str, float] = {}
+        self.warnings = {"loop_lag": 0, "executor_saturated": 0, "long_blocking_call": 0}
+
+    async def start(self, executor: MonitoredExecutor):
+        """Install the executor as the loop's default and begin monitoring"""
+        self.watch(executor)
+        asyncio.get_running_loop().set_default_executor(executor)
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._lag_task = asyncio.create_task(self._sample_lag())
+        self._watchdog = threading.Thread(target=self._watch, name="runtime-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def watch(self, executor: MonitoredExecutor):
+        """Include another executor in saturation and blocking-call checks"""
+        if executor not in self.executors:
+            self.executors.append(executor)
+
+    def unwatch(self, executor: MonitoredExecutor):
+        if executor in self.executors:
+            self.executors.remove(executor)
+
+    async def stop(self):
+        self._stop.set()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.lag_interval * 2)
+
+    async def _sample_lag(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.lag_interval)
+            self._lags.append(lag)
+            LOOP_LAG.observe(value=lag)
+            self._heartbeat = now
+
+    def _watch(self):
+        while not self._stop.wait(self.lag_interval):
+            self._check_loop()
+            for executor in list(self.executors):
+                self._check_executor(executor)
+
+    def _check_loop(self):
+        stalled = time.monotonic() - self._heartbeat - self.lag_interval
+        if stalled < self.lag_warn:
+            self._stall_reported = False
+            return
+        if self._stall_reported:
+            return
+        # Report each stall once, with what the loop thread is doing right now
+        self._stall_reported = True
+        self.warnings["loop_lag"] += 1
+        logger.warning(
+            f"Event loop blocked for {stalled:.2f}s, loop thread stack:\n{_stack_sample(self._loop_thread_id)}"
+        )
+
+    def _check_executor(self, executor: MonitoredExecutor):
+        snapshot = executor.snapshot()
+        EXECUTOR_QUEUE_DEPTH.set(executor.name, value=snapshot["queued"])
+        EXECUTOR_ACTIVE_THREADS.set(executor.name, value=snapshot["active"])
+
+        now = time.monotonic()
+        if snapshot["queued"] and snapshot["active"] >= executor.max_workers:
+            if now - self._last_saturation_warning.get(executor.name, 0.0) >= WARNING_INTERVAL:
+                self._last_saturation_warning[executor.name] = now
+                self.warnings["executor_saturated"] += 1
+                busiest = ", ".join(f"{job['call']} ({job['running_for']:.1f}s)" for job in snapshot["running"][:5])
+                logger.warning(
+                    f"Executor {executor.name} saturated: {snapshot['active']}/{executor.max_workers} threads busy, "
+                    f"{snapshot['queued']} jobs queued. Longest running: {busiest}"
+                )
+
+        for job in executor.running_jobs():
+            if job.reported or job.started is None or now - job.started < self.blocking_warn:
+                continue
+            job.reported = True
+            self.warnings["long_blocking_call"] += 1
+            LONG_BLOCKING_CALLS.inc(executor.name)
+            logger.warning(
+                f"[{job.request_id}] {job.call} has been running for {now - job.started:.1f}s "
+                f"in {executor.name}, stack:\n{_stack_sample(job.thread_id)}"
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = sorted(self._lags)
+        return {
+            "event_loop": {
+                "lag_ms": round(self._lags[-1] * 1000, 2) if lags else 0,
+                "p99_lag_ms": round(lags[max(0, int(len(lags) * 0.99) - 1)] * 1000, 2) if lags else 0,
+                "max_lag_ms": round(lags[-1] * 1000, 2) if lags else 0,
+                "since_heartbeat_ms": round((time.monotonic() - self._heartbeat) * 1000, 2),
+                "samples": len(lags),
+            },
+            "executors": [executor.snapshot() for executor in self.executors],
+            "thresholds": {
+                "loop_lag_warn_s": self.lag_warn,
+                "blocking_call_warn_s": self.blocking_warn,
+            },
+            "warnings": dict(self.warnings),
+        }
+
+
+runtime_monitor = RuntimeMonitor()
@@ -2,30 +2,31 @@ from http.client import HTTPException
 import os
 import requests
 import logging
-from urllib.parse import quote, urlparse
-from app.utils import validate_url, map_sc_domain_to_canonical_url
 from app.lighthouse_metrics import get_lighthouse_metrics
-from app.news_fetcher import fetch_google_rss_news
+from app.news_fetcher import fetch_news_batch
+from app.metrics import track_upstream
+from app.targets import canonicalize
+from app.upstreams import SEARCH_CONSOLE_API_URL
+from app.search_console_sync import (WINDOWS, get_last_synced_date, query_window, start_backfill, sync_site,
+                                     window_totals)
 
 # Environment variable for API Key
 PAGE_SPEED_API_KEY = os.getenv("GOOGLE_SEARCH_API_KEY")
 
 def extract_domain(url: str) -> str:
     """Extract the main domain from a URL or sc-domain: format"""
-    if url.startswith('sc-domain:'):
-        return url.replace('sc-domain:', '')
     try:
-        parsed = urlparse(url)
-        return parsed.netloc or parsed.path
-    except Exception:
+        return canonicalize(url).host
+    except ValueError:
         return url
 
 def get_user_search_console_data(token: str):
     headers = {"Authorization": f"Bearer {token}"}
     
     # Get the list of sites for this user
-    site_list_url = "https://www.googleapis.com/webmasters/v3/sites"
-    response = requests.get(site_list_url, headers=headers)
+    site_list_url = f"{SEARCH_CONSOLE_API_URL}/sites"
+    with track_upstream("search_console"):
+        response = requests.get(site_list_url, headers=headers)
     
     if response.status_code != 200:
         try:
@@ -46,54 +47,59 @@ def get_user_search_console_data(token: str):
     # Initialize dictionaries to store the data
     all_sites_data = {}
     failed_sites = []
+    syncing_sites = []
+
+    # Reuse one connection for all sync requests
+    session = requests.Session()
+    session.headers.update(headers)
+
+    # Skip invalid URLs
+    site_urls = [
+        site['siteUrl'].rstrip('/') for site in sites_data['siteEntry']
+        if site['siteUrl'].startswith(("sc-domain:", "http://", "https://"))
+    ]
+
+    # Sites that don't parse are reported as failed, the others share the batched news queries
+    targets = {}
+    for site_url in site_urls:
+        try:
+            targets[site_url] = canonicalize(site_url)
+        except ValueError as e:
+            logging.error(f"Skipping invalid site URL {site_url}: {str(e)}")
+            failed_sites.append({"site": site_url, "error": f"Invalid site URL: {str(e)}"})
+
+    # News for every site up front, a few batched queries instead of one per site
+    news_by_host = fetch_news_batch(list(targets.values()))
 
     # Iterate over each site
-    for site in sites_data['siteEntry']:
-        site_url = site['siteUrl'].rstrip('/')
+    for site_url, target in targets.items():
         
-        # Skip invalid URLs
-        if not (site_url.startswith("sc-domain:") or 
-                site_url.startswith("http://") or 
-                site_url.startswith("https://")):
-            continue
-        
-        # Extract the domain for news fetching
+        # Extract the domain for reporting
         domain = extract_domain(site_url)
         
-        # Prepare the Search Console URL
-        if site_url.startswith("sc-domain:"):
-            search_console_data_url = f"https://www.googleapis.com/webmasters/v3/sites/{site_url}/searchAnalytics/query"
-        else:
-            encoded_site_url = quote(site_url, safe='')
-            search_console_data_url = f"https://www.googleapis.com/webmasters/v3/sites/{encoded_site_url}/searchAnalytics/query"
-        
-        data = {
-            "startDate": "2024-01-01",
-            "endDate": "2024-09-30",
-            "dimensions": ["query"],
-            "rowLimit": 10
-        }
-
         try:
-            # Fetch Search Console data
-            search_console_response = requests.post(
-                search_console_data_url, 
-                headers=headers, 
-                json=data
-            )
-            search_console_response.raise_for_status()
-            search_console_data = search_console_response.json()
-            
-            # Fetch news data using the extracted domain
-            news_data = fetch_google_rss_news(domain)
-            lighthouse_data = get_lighthouse_metrics(domain, os.getenv("GOOGLE_SEARCH_API_KEY"))
+            # Bring the local store up to date, then read the rolling windows from it. A new site's
+            # first sync fetches HISTORY_DAYS of rows, too slow for the sign-in request, so it runs in the background.
+            if get_last_synced_date(site_url) is None:
+                start_backfill(headers, site_url)
+                syncing_sites.append(site_url)
+            else:
+                sync_site(session, site_url)
+            search_console_rows = query_window(site_url, days=28)
+            search_console_windows = {f"{days}d": window_totals(site_url, days) for days in WINDOWS}
+
+            news_data = news_by_host.get(target.site_host, [])
+            # Resolves the canonical URL through the shared resolver cache
+            lighthouse_data = get_lighthouse_metrics(target, os.getenv("GOOGLE_SEARCH_API_KEY"))
             
             # Store both sets of data
             all_sites_data[site_url] = {
-                "search_console_data": search_console_data.get("rows", []),
+                "search_console_data": search_console_rows,
+                "search_console_windows": search_console_windows,
                 "news_data": news_data if news_data else [],
                 "lighthouse_data": lighthouse_data if lighthouse_data else [],
-                "domain": domain
+                "domain": domain,
+                "syncing": site_url in syncing_sites
             }
             
             # Log successful fetch
@@ -123,5 +129,7 @@ def get_user_search_console_data(token: str):
         "sites": all_sites_data,
         "failed_sites": failed_sites,
         "total_sites": len(all_sites_data),
-        "failed_count": len(failed_sites)
+        "failed_count": len(failed_sites),
+        # Not cached per user, so the next load shows the synced data
+        "partial": bool(syncing_sites)
     }
\ No newline at end of file
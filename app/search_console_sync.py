@@ -0,0 +1,233 @@
+# app/search_console_sync.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import quote
+
+import requests
+
+from app.metrics import track_upstream
+from app.upstreams import SEARCH_CONSOLE_API_URL
+
+SEARCH_CONSOLE_DB = os.getenv("SEARCH_CONSOLE_DB", "search_console.db")
+DIMENSIONS = ["date", "query", "page", "country", "device"]
+ROW_LIMIT = 25000  # Maximum rows the API returns per request
+HISTORY_DAYS = 90  # How far back the first sync for a site goes
+DATA_DELAY_DAYS = 3  # Search Console data for the most recent days is still incomplete
+WINDOWS = (7, 28, 90)
+# Days of rows kept per site, counted back from the last synced day. Never less than the longest window.
+RETENTION_DAYS = max(int(os.getenv("SEARCH_CONSOLE_RETENTION_DAYS", "480")), max(WINDOWS))
+REQUEST_TIMEOUT = 60
+
+logger = logging.getLogger(__name__)
+
+# First syncs of new sites, which fetch HISTORY_DAYS of rows, run here instead of in the request
+_backfill_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sc-backfill")
+_backfilling: Set[str] = set()
+_backfill_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sc_rows (
+    site TEXT NOT NULL,
+    date TEXT NOT NULL,
+    query TEXT NOT NULL,
+    page TEXT NOT NULL,
+    country TEXT NOT NULL,
+    device TEXT NOT NULL,
+    clicks REAL NOT NULL,
+    impressions REAL NOT NULL,
+    position REAL NOT NULL,
+    PRIMARY KEY (site, date, query, page, country, device)
+);
+CREATE INDEX IF NOT EXISTS sc_rows_site_date ON sc_rows (site, date);
+CREATE TABLE IF NOT EXISTS sc_sync_state (
+    site TEXT PRIMARY KEY,
+    last_date TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def _connect(db_path: str = SEARCH_CONSOLE_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _query_url(site_url: str) -> str:
+    if site_url.startswith("sc-domain:"):
+        return f"{SEARCH_CONSOLE_API_URL}/sites/{site_url}/searchAnalytics/query"
+    return f"{SEARCH_CONSOLE_API_URL}/sites/{quote(site_url, safe='')}/searchAnalytics/query"
+
+
+def get_last_synced_date(site_url: str, db_path: str = SEARCH_CONSOLE_DB) -> Optional[date]:
+    with closing(_connect(db_path)) as conn:
+        row = conn.execute("SELECT last_date FROM sc_sync_state WHERE site = ?", (site_url,)).fetchone()
+    return date.fromisoformat(row[0]) if row else None
+
+
+def fetch_rows(session: requests.Session, site_url: str, start_date: date, end_date: date):
+    """
+    Yield every searchAnalytics row between two dates, paging with startRow
+    until the API returns a short page.
+    """
+    url = _query_url(site_url)
+    start_row = 0
+    while True:
+        body = {
+            "startDate": start_date.isoformat(),
+            "endDate": end_date.isoformat(),
+            "dimensions": DIMENSIONS,
+            "rowLimit": ROW_LIMIT,
+            "startRow": start_row,
+            "dataState": "final"
+        }
+        with track_upstream("search_console"):
+            response = session.post(url, json=body, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        rows = response.json().get("rows", [])
+        yield from rows
+
+        if len(rows) < ROW_LIMIT:
+            return
+        start_row += ROW_LIMIT
+
+
+def sync_site(session: requests.Session, site_url: str, db_path: str = SEARCH_CONSOLE_DB) -> int:
+    """
+    Fetch the days missing from the local store for a site.
+    Returns the number of rows written.
+    """
+    end_date = date.today() - timedelta(days=DATA_DELAY_DAYS)
+    last_date = get_last_synced_date(site_url, db_path)
+    start_date = last_date + timedelta(days=1) if last_date else end_date - timedelta(days=HISTORY_DAYS - 1)
+
+    if start_date > end_date:
+        logger.debug(f"Search Console store for {site_url} is up to date ({last_date})")
+        return 0
+
+    logger.info(f"Syncing Search Console rows for {site_url} from {start_date} to {end_date}")
+    written = 0
+    with closing(_connect(db_path)) as conn:
+        batch = []
+        for row in fetch_rows(session, site_url, start_date, end_date):
+            batch.append((site_url, *row["keys"], row.get("clicks", 0),
+                          row.get("impressions", 0), row.get("position", 0)))
+            if len(batch) >= ROW_LIMIT:
+                written += _write_rows(conn, batch)
+                batch = []
+        written += _write_rows(conn, batch)
+
+        # Only advance the watermark once every page has been stored
+        conn.execute(
+            "INSERT OR REPLACE INTO sc_sync_state (site, last_date, synced_at) VALUES (?, ?, ?)",
+            (site_url, end_date.isoformat(), time.time())
+        )
+        pruned = conn.execute(
+            "DELETE FROM sc_rows WHERE site = ? AND date < ?",
+            (site_url, (end_date - timedelta(days=RETENTION_DAYS - 1)).isoformat())
+        ).rowcount
+        conn.commit()
+
+    logger.info(f"Stored {written} Search Console rows for {site_url}, pruned {pruned} past retention")
+    return written
+
+
+def start_backfill(headers: Dict[str, str], site_url: str, db_path: str = SEARCH_CONSOLE_DB) -> bool:
+    """
+    Run a site's first sync in the background, with its own session.
+    Returns False when one is already running in this process.
+    """
+    with _backfill_lock:
+        if site_url in _backfilling:
+            return False
+        _backfilling.add(site_url)
+    _backfill_executor.submit(_backfill, dict(headers), site_url, db_path)
+    return True
+
+
+def _backfill(headers: Dict[str, str], site_url: str, db_path: str):
+    try:
+        with requests.Session() as session:
+            session.headers.update(headers)
+            sync_site(session, site_url, db_path)
+    except Exception as e:
+        # The site stays unsynced, so the next dashboard load queues it again
+        logger.error(f"Initial Search Console sync for {site_url} failed: {str(e)}")
+    finally:
+        with _backfill_lock:
+            _backfilling.discard(site_url)
+
+
+def _write_rows(conn: sqlite3.Connection, batch: List[tuple]) -> int:
+    if batch:
+        conn.executemany("INSERT OR REPLACE INTO sc_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    return len(batch)
+
+
+def query_window(site_url: str, days: int = 28, dimension: str = "query", limit: int = 10,
+                 db_path: str = SEARCH_CONSOLE_DB) -> List[Dict[str, Any]]:
+    """
+    Aggregate the stored rows for the last `days` synced days, grouped by one
+    dimension. Rows have the same shape as searchAnalytics/query rows.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown Search Console dimension: {dimension}")
+
+    last_date = get_last_synced_date(site_url, db_path)
+    if last_date is None:
+        return []
+    start_date = last_date - timedelta(days=days - 1)
+
+    # Average position is weighted by impressions, the same way Search Console reports it
+    sql = (
+        f"SELECT {dimension}, SUM(clicks), SUM(impressions), SUM(position * impressions) "
+        f"FROM sc_rows WHERE site = ? AND date >= ? AND date <= ? "
+        f"GROUP BY {dimension} ORDER BY SUM(clicks) DESC, SUM(impressions) DESC LIMIT ?"
+    )
+    with closing(_connect(db_path)) as conn:
+        result = conn.execute(sql, (site_url, start_date.isoformat(), last_date.isoformat(), limit)).fetchall()
+
+    return [
+        {
+            "keys": [key],
+            "clicks": clicks,
+            "impressions": impressions,
+            "ctr": clicks / impressions if impressions else 0,
+            "position": weighted_position / impressions if impressions else 0
+        }
+        for key, clicks, impressions, weighted_position in result
+    ]
+
+
+def window_totals(site_url: str, days: int, db_path: str = SEARCH_CONSOLE_DB) -> Dict[str, Any]:
+    """Total clicks, impressions, CTR and position for the last `days` synced days"""
+    last_date = get_last_synced_date(site_url, db_path)
+    if last_date is None:
+        return {"days": days, "clicks": 0, "impressions": 0, "ctr": 0, "position": 0}
+    start_date = last_date - timedelta(days=days - 1)
+
+    with closing(_connect(db_path)) as conn:
+        clicks, impressions, weighted_position = conn.execute(
+            "SELECT COALESCE(SUM(clicks), 0), COALESCE(SUM(impressions), 0), "
+            "COALESCE(SUM(position * impressions), 0) "
+            "FROM sc_rows WHERE site = ? AND date >= ? AND date <= ?",
+            (site_url, start_date.isoformat(), last_date.isoformat())
+        ).fetchone()
+
+    return {
+        "days": days,
+        "start_date": start_date.isoformat(),
+        "end_date": last_date.isoformat(),
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": clicks / impressions if impressions else 0,
+        "position": weighted_position / impressions if impressions else 0
+    }
@@ -0,0 +1,45 @@
+# app/singleflight.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+COALESCED_CALLS = registry.register(Counter(
+    "webly_singleflight_coalesced_total", "Calls that joined an identical call already in flight", ("group",)))
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution. The
+    first caller starts the work as a task; everyone arriving before it
+    finishes awaits that same task. The task is shielded, so a caller that
+    disconnects doesn't cancel the work for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is not None:
+            COALESCED_CALLS.inc(self.name)
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieve the exception so it isn't reported as unhandled when every caller went away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"{self.name} call for {key} failed: {task.exception()}")
@@ -1,7 +1,17 @@
 import requests
-from bs4 import BeautifulSoup
 import re
 import json
+import logging
+from typing import Optional, Union
+from urllib.parse import urlsplit
+from app.homepage import Document
+from app.metrics import track_upstream
+from app.targets import Target, as_target
+from app.upstreams import GOOGLE_SEARCH_URL, SOCIAL_PROFILE_BASE_URL
+
+REQUEST_TIMEOUT = 10  # Seconds per search or profile request
+
+logger = logging.getLogger(__name__)
 
 def clean_url(url):
     """Clean extracted URL by removing unwanted parameters and HTML encoding."""
@@ -9,12 +19,38 @@ def clean_url(url):
     url = re.sub(r'(&amp;|")', '', url)  # Remove HTML encoding
     return url
 
-def get_social_media_info(domain: str):
+SOCIAL_PATTERNS = {
+    'linkedin': r'linkedin\.com/company/[^/\s]+',
+    'twitter': r'twitter\.com/[^/\s]+',
+    'instagram': r'instagram\.com/[^/\s]+',
+    'facebook': r'facebook\.com/[^/\s]+',
+    'youtube': r'youtube\.com/(?:channel|user|c)/[^/\s]+'
+}
+
+def find_social_links(text):
+    """First profile link of each platform found in text."""
+    links = {}
+    for platform, pattern in SOCIAL_PATTERNS.items():
+        matches = re.findall(pattern, text)
+        if matches:
+            links[platform] = f'https://{clean_url(matches[0])}'
+    return links
+
+def profile_url(url):
+    """Where to fetch a profile from, the stub server when SOCIAL_PROFILE_BASE_URL is set"""
+    if not SOCIAL_PROFILE_BASE_URL:
+        return url
+    parts = urlsplit(url)
+    return f"{SOCIAL_PROFILE_BASE_URL}/{parts.netloc}{parts.path}"
+
+def get_social_media_info(domain: Union[str, Target], document: Optional[Document] = None):
     """
     Scrape social media links and follower counts for a given domain.
     
     Args:
-        domain (str): Domain to search for (e.g., 'example.com').
+        domain (str | Target): Domain to search for (e.g., 'example.com').
+        document (Document): The site's homepage. Profiles it links to are used
+            without searching Google.
         
     Returns:
         dict: Dictionary containing social media links and follower counts.
@@ -23,36 +59,29 @@ def get_social_media_info(domain: str):
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
     }
     
-    social_patterns = {
-        'linkedin': r'linkedin\.com/company/[^/\s]+',
-        'twitter': r'twitter\.com/[^/\s]+',
-        'instagram': r'instagram\.com/[^/\s]+',
-        'facebook': r'facebook\.com/[^/\s]+',
-        'youtube': r'youtube\.com/(?:channel|user|c)/[^/\s]+'
-    }
-    
     results = {
         'links': {},
         'followers': {}
     }
     
     try:
-        # Perform search
-        search_url = f'https://www.google.com/search?q={domain}+social+media'
-        response = requests.get(search_url, headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract social media links
-        for platform, pattern in social_patterns.items():
-            matches = re.findall(pattern, response.text)
-            if matches:
-                results['links'][platform] = f'https://{clean_url(matches[0])}'
+        # Profiles the homepage links to, searched for only if it links to none
+        if document is not None:
+            results['links'] = find_social_links(' '.join(document.links))
+
+        if not results['links']:
+            # Perform search
+            search_url = f'{GOOGLE_SEARCH_URL}?q={as_target(domain).site_host}+social+media'
+            with track_upstream("google_search"):
+                response = requests.get(search_url, headers=headers, timeout=REQUEST_TIMEOUT)
+            results['links'] = find_social_links(response.text)
                 
         # Extract follower counts for supported platforms
         for platform, url in results['links'].items():
             if platform in ['twitter', 'instagram', 'youtube', 'facebook']:
                 try:
-                    resp = requests.get(url, headers=headers)
+                    with track_upstream("social_profiles"):
+                        resp = requests.get(profile_url(url), headers=headers, timeout=REQUEST_TIMEOUT)
                     if platform == 'youtube':
                         subscriber_count = re.search(r'"subscriberCountText":\s*"([^"]+)"', resp.text)
                         if subscriber_count:
@@ -62,10 +91,10 @@ def get_social_media_info(domain: str):
                         if followers:
                             results['followers'][platform] = followers.group(1)
                 except Exception as e:
-                    print(f"Error scraping {platform}: {e}")
+                    logger.warning(f"Error scraping {platform}: {e}")
                     
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.error(f"Error: {str(e)}")
         
     return results
 
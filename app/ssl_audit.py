@@ -1,67 +1,236 @@
 import requests
+import os
+import threading
 import time
-from typing import Dict, Any
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Union
 import logging
 from requests.adapters import HTTPAdapter
-from urllib3 import Retry
+from app.logging_config import log_payload
+from app.metrics import observe_response
+from app.resilience import BudgetedRetry, guard
+from app.targets import Target, as_target
+from app.upstreams import SSL_LABS_API_URL
 
+# Reuse a public SSL Labs assessment up to this many hours old instead of starting a new scan
+SSL_LABS_MAX_AGE = int(os.getenv("SSL_LABS_MAX_AGE", "24"))
+INFO_TTL = 3600  # /info only changes with the engine version and the assessment limits
+HEADERS = {
+    'User-Agent': 'SSLChecker/1.0',
+    'Accept': 'application/json'
+}
+# SSL Labs protocol ids are the TLS wire versions
+PROTOCOL_NAMES = {512: "SSL 2.0", 768: "SSL 3.0", 769: "TLS 1.0", 770: "TLS 1.1", 771: "TLS 1.2", 772: "TLS 1.3"}
+GRADE_ORDER = ["A+", "A", "A-", "B", "C", "D", "E", "F", "T", "M"]
+
+logger = logging.getLogger(__name__)
+
+_info_lock = threading.Lock()
+_info_cache: Dict[str, Any] = {"fetched_at": 0.0, "data": None}
 
 def create_session():
-    """Create a session with retry strategy"""
-    retry_strategy = Retry(
-        total=5,
+    """Create a session with retry strategy, bounded by the SSL Labs retry budget"""
+    retry_strategy = BudgetedRetry(
+        total=3,
         backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
+        status_forcelist=[429, 500, 502, 503, 504, 529],
+        upstream="ssllabs",
     )
     adapter = HTTPAdapter(max_retries=retry_strategy)
     session = requests.Session()
     session.mount("https://", adapter)
+    session.mount("http://", adapter)
     return session
 
-def check_ssl(domain: str, timeout: int = 60, max_wait_time: int = 300) -> Dict[str, Any]:
+def _ssllabs_get(session: requests.Session, url: str, **kwargs) -> requests.Response:
+    """GET against SSL Labs through its circuit breaker, recording latency, retries and remaining assessment slots"""
+    with guard("ssllabs"):
+        response = session.get(url, **kwargs)
+        observe_response("ssllabs", response)
+        response.raise_for_status()
+    return response
+
+def get_info(session: requests.Session, timeout: int = 60) -> Dict[str, Any]:
+    """SSL Labs /info, fetched at most once per INFO_TTL"""
+    with _info_lock:
+        if _info_cache["data"] is not None and time.time() - _info_cache["fetched_at"] < INFO_TTL:
+            return _info_cache["data"]
+    data = _ssllabs_get(session, f"{SSL_LABS_API_URL}/info", headers=HEADERS, timeout=timeout).json()
+    log_payload(logger, "API Info response", data)
+    with _info_lock:
+        _info_cache.update(fetched_at=time.time(), data=data)
+    return data
+
+@dataclass
+class Endpoint:
+    """One IP address of an assessed host"""
+    ip_address: str
+    ip_version: int
+    server_name: Optional[str]
+    status_message: Optional[str]
+    grade: Optional[str]
+    has_warnings: bool
+    protocols: List[str] = field(default_factory=list)
+    suites: Dict[str, List[str]] = field(default_factory=dict)  # Protocol name -> cipher suites
+    suite_preference: Optional[bool] = None
+    forward_secrecy: int = 0
+    ocsp_stapling: bool = False
+    chains: int = 0
+    trust_paths: List[str] = field(default_factory=list)
+    leaf_cert_id: Optional[str] = None
+    secure_renegotiation: int = 0
+    session_resumption: int = 0
+    session_tickets: int = 0
+    npn_protocols: str = ''
+    alpn_protocols: str = ''
+
+@dataclass
+class Assessment:
+    host: str
+    status: str
+    status_message: Optional[str]
+    endpoints: List[Endpoint]
+    certs: Dict[str, Dict[str, Any]]  # Certificate id -> certificate
+
+    @property
+    def ready_endpoints(self) -> List[Endpoint]:
+        return [endpoint for endpoint in self.endpoints if endpoint.grade]
+
+    @property
+    def grade(self) -> Optional[str]:
+        """The host's grade is its worst endpoint's"""
+        grades = [endpoint.grade for endpoint in self.ready_endpoints if endpoint.grade in GRADE_ORDER]
+        return max(grades, key=GRADE_ORDER.index) if grades else None
+
+def _parse_endpoint(raw: Dict[str, Any]) -> Endpoint:
+    details = raw.get('details') or {}
+    ip_address = raw.get('ipAddress', '')
+    endpoint = Endpoint(
+        ip_address=ip_address,
+        ip_version=6 if ':' in ip_address else 4,
+        server_name=raw.get('serverName'),
+        status_message=raw.get('statusMessage'),
+        grade=raw.get('grade'),
+        has_warnings=raw.get('hasWarnings', False),
+        forward_secrecy=details.get('forwardSecrecy', 0),
+        ocsp_stapling=details.get('ocspStapling', False),
+        secure_renegotiation=details.get('renegSupport', 0),
+        session_resumption=details.get('sessionResumption', 0),
+        session_tickets=details.get('sessionTickets', 0),
+        npn_protocols=details.get('npnProtocols', ''),
+        alpn_protocols=details.get('alpnProtocols', ''),
+    )
+    for protocol in details.get('protocols', []):
+        endpoint.protocols.append(PROTOCOL_NAMES.get(protocol.get('id'), f"{protocol.get('name')} {protocol.get('version')}"))
+    for suite_group in details.get('suites', []):
+        name = PROTOCOL_NAMES.get(suite_group.get('protocol'), str(suite_group.get('protocol')))
+        endpoint.suites[name] = [suite['name'] for suite in suite_group.get('list', [])]
+        if suite_group.get('protocol') != 772:  # TLS 1.3 suite order is always the client's
+            endpoint.suite_preference = suite_group.get('preference', endpoint.suite_preference)
+    chains = details.get('certChains', [])
+    endpoint.chains = len(chains)
+    for chain in chains:
+        if endpoint.leaf_cert_id is None and chain.get('certIds'):
+            endpoint.leaf_cert_id = chain['certIds'][0]
+        for path in chain.get('trustPaths', []):
+            endpoint.trust_paths.extend(
+                f"{trust['rootStore']}: {'Trusted' if trust['isTrusted'] else 'Untrusted'}"
+                for trust in path.get('trust', [])
+            )
+    return endpoint
+
+def parse_assessment(data: Dict[str, Any]) -> Assessment:
+    """Every endpoint of an /analyze response, IPv4 and IPv6, in one pass"""
+    return Assessment(
+        host=data.get('host'),
+        status=data.get('status'),
+        status_message=data.get('statusMessage'),
+        endpoints=[_parse_endpoint(raw) for raw in data.get('endpoints', [])],
+        certs={cert['id']: cert for cert in data.get('certs', []) if 'id' in cert},
+    )
+
+def _union(lists) -> List[str]:
+    return list(dict.fromkeys(item for values in lists for item in values))
+
+def to_result(assessment: Assessment) -> Dict[str, Any]:
+    """The collector's result: host-wide summary plus a compact entry per endpoint"""
+    endpoints = assessment.ready_endpoints or assessment.endpoints
+    primary = endpoints[0]
+    results = {
+        'basic_info': {
+            'host': assessment.host,
+            'ip_address': primary.ip_address,
+            'grade': assessment.grade,
+            'has_warnings': any(endpoint.has_warnings for endpoint in endpoints),
+            'status': assessment.status,
+        },
+        'protocols': {
+            'supported': _union(endpoint.protocols for endpoint in endpoints),
+            'preference': primary.suite_preference or False
+        },
+        'certificates': {
+            'chains': primary.chains,
+            'trust_paths': _union(endpoint.trust_paths for endpoint in endpoints),
+            'ocsp_stapling': all(endpoint.ocsp_stapling for endpoint in endpoints)
+        },
+        'cipher_suites': {
+            'tls12': _union(endpoint.suites.get("TLS 1.2", []) for endpoint in endpoints),
+            'tls13': _union(endpoint.suites.get("TLS 1.3", []) for endpoint in endpoints),
+            'forward_secrecy': min(endpoint.forward_secrecy for endpoint in endpoints)
+        },
+        'security_features': {
+            'secure_renegotiation': primary.secure_renegotiation,
+            'session_resumption': primary.session_resumption,
+            'npn_protocols': primary.npn_protocols,
+            'alpn_protocols': primary.alpn_protocols,
+            'session_tickets': primary.session_tickets
+        },
+        'endpoints': [
+            {k: v for k, v in asdict(endpoint).items() if k not in ('trust_paths', 'leaf_cert_id')}
+            for endpoint in assessment.endpoints
+        ],
+    }
+
+    # Leaf certificate validity, for the certificate expiry watch
+    leaf = assessment.certs.get(primary.leaf_cert_id) or next(iter(assessment.certs.values()), None)
+    if leaf and leaf.get('notAfter'):
+        results['certificates']['not_after'] = datetime.fromtimestamp(leaf['notAfter'] / 1000, timezone.utc).isoformat()
+        results['certificates']['issuer'] = leaf.get('issuerSubject')
+    return results
+
+def check_ssl(domain: Union[str, Target], timeout: int = 60, max_wait_time: int = 300) -> Dict[str, Any]:
     """
     Check SSL configuration of a domain using SSL Labs API.
+    Every request accepts a cached public assessment up to SSL_LABS_MAX_AGE
+    hours old, so repeat lookups usually return without polling.
     Returns DNS resolution results if full SSL check fails.
     """
-    base_url = "https://api.ssllabs.com/api/v3"
-    headers = {
-        'User-Agent': 'SSLChecker/1.0',
-        'Accept': 'application/json'
-    }
+    domain = as_target(domain).hostname
+    analyze_url = f"{SSL_LABS_API_URL}/analyze"
     session = create_session()
     initial_dns_data = None
-    
+
+    # Main scan parameters, sent on every poll so a cached assessment is picked up as soon as one exists
+    params = {
+        "host": domain,
+        "publish": "off",
+        "all": "done",
+        "fromCache": "on",
+        "maxAge": SSL_LABS_MAX_AGE,
+        "ignoreMismatch": "on"
+    }
+
     try:
         # Check API availability
-        info_response = session.get(
-            f"{base_url}/info", 
-            headers=headers, 
-            timeout=timeout
-        )
-        info_response.raise_for_status()
-        logging.debug("API Info response: %s", info_response.json())
-        
-        # Main scan parameters
-        params = {
-            "host": domain,
-            "publish": "off",
-            "all": "done",
-            "fromCache": "on",
-            "ignoreMismatch": "on"
-        }
-        
+        get_info(session, timeout)
+
         # Initial scan request
-        response = session.get(
-            f"{base_url}/analyze", 
-            params=params, 
-            headers=headers, 
-            timeout=timeout
-        )
-        response.raise_for_status()
+        response = _ssllabs_get(session, analyze_url, params=params, headers=HEADERS, timeout=timeout)
         data = response.json()
-        
+
         logging.debug("Initial scan response status: %s", response.status_code)
-        logging.debug("Response data: %s", data)
+        log_payload(logger, "Response data", data)
 
         # Store DNS resolution data when we first get it
         if data.get("status") == "DNS":
@@ -86,17 +255,11 @@ def check_ssl(domain: str, timeout: int = 60, max_wait_time: int = 300) -> Dict[
                 if initial_dns_data:
                     return initial_dns_data
                 return {"error": f"Scan timed out after {max_wait_time} seconds"}
-            
+
             logging.debug(f"Scan in progress: {data.get('status')}. Waiting...")
             time.sleep(min(30, max(10, int((time.time() - start_time) / 10))))  # Dynamic sleep time
-            
-            response = session.get(
-                f"{base_url}/analyze", 
-                params={"host": domain, "all": "done"}, 
-                headers=headers,
-                timeout=timeout
-            )
-            response.raise_for_status()
+
+            response = _ssllabs_get(session, analyze_url, params=params, headers=HEADERS, timeout=timeout)
             data = response.json()
 
         if data.get("status") != "READY":
@@ -107,54 +270,13 @@ def check_ssl(domain: str, timeout: int = 60, max_wait_time: int = 300) -> Dict[
                 "status_message": data.get("statusMessage", "No status message provided")
             }
 
-        endpoints = data.get("endpoints", [{}])
-        if not endpoints:
+        assessment = parse_assessment(data)
+        if not assessment.endpoints:
             if initial_dns_data:
                 return initial_dns_data
             return {"error": "No endpoints found in scan results"}
 
-        primary_endpoint = endpoints[0]
-        
-        results = {
-            'basic_info': {
-                'host': data.get('host'),
-                'ip_address': data['endpoints'][0].get('ipAddress'),
-                'grade': data['endpoints'][0].get('grade'),
-                'has_warnings': data['endpoints'][0].get('hasWarnings', False),
-                'status': data.get('status'),
-            },
-            'protocols': {
-                'supported': [f"{p['name']} {p['version']}" for p in data['endpoints'][0]['details'].get('protocols', [])],
-                'preference': data['endpoints'][0]['details']['suites'][0].get('preference', False)
-            },
-            'certificates': {
-                'chains': len(data['endpoints'][0]['details']['certChains']),
-                'trust_paths': [],
-                'ocsp_stapling': data['endpoints'][0]['details'].get('ocspStapling', False)
-            },
-            'cipher_suites': {
-                'tls12': [suite['name'] for suite in data['endpoints'][0]['details']['suites'][0]['list']],
-                'tls13': [suite['name'] for suite in data['endpoints'][0]['details']['suites'][1]['list']] if len(data['endpoints'][0]['details']['suites']) > 1 else [],
-                'forward_secrecy': data['endpoints'][0]['details'].get('forwardSecrecy', 0)
-            },
-            'security_features': {
-                'secure_renegotiation': data['endpoints'][0]['details'].get('renegSupport', 0),
-                'session_resumption': data['endpoints'][0]['details'].get('sessionResumption', 0),
-                'npn_protocols': data['endpoints'][0]['details'].get('npnProtocols', ''),
-                'alpn_protocols': data['endpoints'][0]['details'].get('alpnProtocols', ''),
-                'session_tickets': data['endpoints'][0]['details'].get('sessionTickets', 0)
-            }
-        }
-        
-        # Add trust information
-        for chain in data['endpoints'][0]['details']['certChains']:
-            for path in chain['trustPaths']:
-                results['certificates']['trust_paths'].extend([
-                    f"{trust['rootStore']}: {'Trusted' if trust['isTrusted'] else 'Untrusted'}"
-                    for trust in path['trust']
-                ])
-        
-        return results
+        return to_result(assessment)
 
     except requests.exceptions.RequestException as e:
         logging.error(f"Request failed: {str(e)}")
@@ -173,9 +295,3 @@ def check_ssl(domain: str, timeout: int = 60, max_wait_time: int = 300) -> Dict[
             return initial_dns_data
         return {"error": f"Unexpected error: {str(e)}"}
 
-# Configure logging only if not already configured
-if not logging.getLogger().handlers:
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
\ No newline at end of file
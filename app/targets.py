@@ -0,0 +1,115 @@
+# app/targets.py
+import re
+from functools import lru_cache
+from typing import NamedTuple, Union
+from urllib.parse import urlsplit
+
+import tldextract
+
+DEFAULT_SCHEME = "https"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+SCHEME_PREFIX = re.compile(r"^[a-z][a-z0-9+.-]*://", re.I)
+
+# Use the public suffix snapshot bundled with tldextract, never fetch it at runtime
+_extract = tldextract.TLDExtract(suffix_list_urls=())
+
+
+class Target(NamedTuple):
+    """A normalized audit target. Hashable, so it can key caches directly."""
+    scheme: str
+    host: str
+    registrable_domain: str
+    path: str = ""
+
+    @property
+    def site_host(self) -> str:
+        """Host without a leading www., the name a site is usually known by"""
+        return self.host[4:] if self.host.startswith("www.") else self.host
+
+    @property
+    def hostname(self) -> str:
+        """Host without any port or IPv6 brackets, for DNS and TLS lookups"""
+        if self.host.startswith("["):
+            return self.host[1:self.host.index("]")]
+        return self.host.split(":", 1)[0]
+
+    @property
+    def port(self) -> int:
+        """Port the site is served on, the scheme's default unless one was given"""
+        if self.host.endswith("]") or ":" not in self.host:
+            return DEFAULT_PORTS[self.scheme]
+        return int(self.host.rsplit(":", 1)[1])
+
+    @property
+    def origin(self) -> str:
+        return f"{self.scheme}://{self.host}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.origin}{self.path}"
+
+    @property
+    def key(self) -> str:
+        """Cache key shared by every spelling of the same site and path"""
+        return f"{self.site_host}{self.path}"
+
+    def __str__(self) -> str:
+        return self.url
+
+
+@lru_cache(maxsize=4096)
+def canonicalize(raw: str) -> Target:
+    """
+    Normalize a URL, bare domain or sc-domain: property into a Target.
+    Lowercases and IDNA-encodes the host, drops default ports, query strings,
+    fragments and trailing slashes.
+    """
+    if not raw or not raw.strip():
+        raise ValueError("URL cannot be empty")
+
+    value = raw.strip()
+    if value.startswith("sc-domain:"):
+        value = value[len("sc-domain:"):]
+    if not has_scheme(value):
+        value = f"{DEFAULT_SCHEME}://{value}"
+
+    parts = urlsplit(value)
+    scheme = parts.scheme.lower() if parts.scheme in ("http", "https") else DEFAULT_SCHEME
+    hostname = (parts.hostname or "").rstrip(".")
+    if not hostname:
+        raise ValueError(f"No host in URL: {raw}")
+    if ":" in hostname:
+        # IPv6 literal, bracketed again below so a port can follow it
+        host = registrable_domain = hostname.lower()
+    else:
+        try:
+            host = hostname.encode("idna").decode("ascii").lower()
+        except UnicodeError:
+            host = hostname.lower()
+        extracted = _extract(host)
+        if extracted.domain and extracted.suffix:
+            registrable_domain = f"{extracted.domain}.{extracted.suffix}"
+        else:
+            registrable_domain = host
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if ":" in host:
+        host = f"[{host}]"
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    path = parts.path.rstrip("/")
+    return Target(scheme=scheme, host=host, registrable_domain=registrable_domain, path=path)
+
+
+def has_scheme(value: str) -> bool:
+    """Whether a string starts with a scheme, as opposed to merely containing "://" in its query"""
+    return SCHEME_PREFIX.match(value) is not None
+
+
+def as_target(value: Union[str, Target]) -> Target:
+    """Accept either a Target or anything canonicalize() understands"""
+    return value if isinstance(value, Target) else canonicalize(value)
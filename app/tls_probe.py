@@ -0,0 +1,305 @@
+# app/tls_probe.py
+# Local TLS handshake prober. Gives the certificate, protocol and cipher picture
+# in well under a second, while the SSL Labs assessment (minutes) runs behind it.
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from cryptography import x509
+from cryptography.x509.oid import AuthorityInformationAccessOID, ExtensionOID, NameOID
+
+from app.targets import Target, as_target
+
+HANDSHAKE_TIMEOUT = float(os.getenv("TLS_PROBE_TIMEOUT", "3"))
+MAX_ADDRESSES = 4  # Resolved IPs probed per host
+EXPIRY_WARNING_DAYS = 14
+ALPN_PROTOCOLS = ["h2", "http/1.1"]
+
+PROTOCOL_VERSIONS = {
+    "TLS 1.0": ssl.TLSVersion.TLSv1,
+    "TLS 1.1": ssl.TLSVersion.TLSv1_1,
+    "TLS 1.2": ssl.TLSVersion.TLSv1_2,
+    "TLS 1.3": ssl.TLSVersion.TLSv1_3,
+}
+LEGACY_VERSIONS = {"TLS 1.0", "TLS 1.1"}
+# TLS 1.2 key exchange / authentication families, enumerated concurrently
+CIPHER_GROUPS = {
+    "ECDHE-ECDSA": "ECDHE+aECDSA",
+    "ECDHE-RSA": "ECDHE+aRSA",
+    "DHE-RSA": "DHE+aRSA",
+    "RSA": "kRSA",
+}
+# Handshakes per group: each one excludes the suites already accepted, until the server refuses
+MAX_SUITES_PER_GROUP = 16
+
+logger = logging.getLogger(__name__)
+
+
+def _probe_context(version: ssl.TLSVersion, ciphers: Optional[str] = None) -> ssl.SSLContext:
+    """Context pinned to one protocol version that accepts any certificate, to see what the server offers"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.minimum_version = version
+    context.maximum_version = version
+    # Security level 0 so OpenSSL still offers the legacy protocols and ciphers we're probing for
+    context.set_ciphers(f"{ciphers or 'ALL'}:@SECLEVEL=0")
+    return context
+
+
+def _verifying_context(cafile: Optional[str]) -> ssl.SSLContext:
+    context = ssl.create_default_context(cafile=cafile)
+    context.set_alpn_protocols(ALPN_PROTOCOLS)
+    return context
+
+
+def _private_unverified_chain(ssl_object: ssl.SSLObject) -> Optional[List[bytes]]:
+    """Before Python 3.13 the chain is only on the private _sslobj, as _ssl.Certificate objects"""
+    get_chain = getattr(getattr(ssl_object, "_sslobj", None), "get_unverified_chain", None)
+    if get_chain is None:
+        return None
+    import _ssl
+    return [cert.public_bytes(_ssl.ENCODING_DER) for cert in get_chain() or []]
+
+
+def _presented_chain(ssl_object: ssl.SSLObject) -> List[bytes]:
+    """DER certificates the server sent, leaf first, in the order it sent them"""
+    get_chain = getattr(ssl_object, "get_unverified_chain", None)  # Public from Python 3.13
+    chain = get_chain() if get_chain else _private_unverified_chain(ssl_object)
+    if not chain:
+        # Without the chain API only the leaf is available
+        leaf = ssl_object.getpeercert(binary_form=True)
+        return [leaf] if leaf else []
+    return chain
+
+
+async def _handshake(ip: str, port: int, server_name: str, context: ssl.SSLContext,
+                     timeout: float) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """One TLS handshake; returns what was negotiated, or the reason it failed"""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port, ssl=context, server_hostname=server_name,
+                                    ssl_handshake_timeout=timeout),
+            timeout,
+        )
+    except ssl.SSLCertVerificationError as e:
+        return None, e.verify_message or str(e)
+    except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+        return None, f"{type(e).__name__}: {e}"
+
+    ssl_object = writer.get_extra_info("ssl_object")
+    negotiated = {
+        "version": ssl_object.version(),
+        "cipher": ssl_object.cipher()[0],
+        "alpn": ssl_object.selected_alpn_protocol(),
+        "chain": _presented_chain(ssl_object),
+    }
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ssl.SSLError):
+        pass
+    return negotiated, None
+
+
+async def _enumerate_suites(ip: str, port: int, server_name: str, ciphers: str, timeout: float) -> List[str]:
+    """
+    Every TLS 1.2 suite of a group the server accepts: handshake, drop the
+    suite it picked from the offer, and repeat until the handshake fails.
+    """
+    accepted: List[str] = []
+    while len(accepted) < MAX_SUITES_PER_GROUP:
+        try:
+            context = _probe_context(ssl.TLSVersion.TLSv1_2, ":".join([ciphers] + [f"!{c}" for c in accepted]))
+        except ssl.SSLError:
+            break  # This OpenSSL build has no further cipher of the group
+        negotiated, _ = await _handshake(ip, port, server_name, context, timeout)
+        if negotiated is None or negotiated["cipher"] in accepted:
+            break
+        accepted.append(negotiated["cipher"])
+    return accepted
+
+
+async def _resolve(host: str, port: int) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos))[:MAX_ADDRESSES]
+
+
+async def _probe_address(ip: str, port: int, server_name: str, cafile: Optional[str],
+                         timeout: float) -> Dict[str, Any]:
+    """Every handshake against one IP, run concurrently"""
+    contexts = {"verify": _verifying_context(cafile)}
+    for name, version in PROTOCOL_VERSIONS.items():
+        contexts[name] = _probe_context(version)
+
+    outcomes, suites = await asyncio.gather(
+        asyncio.gather(*(_handshake(ip, port, server_name, context, timeout) for context in contexts.values())),
+        asyncio.gather(*(_enumerate_suites(ip, port, server_name, ciphers, timeout)
+                         for ciphers in CIPHER_GROUPS.values())),
+    )
+    results = dict(zip(contexts, outcomes))
+
+    verified, verify_error = results.pop("verify")
+    fallback = next((negotiated for negotiated, _ in results.values() if negotiated), None)
+    main = verified or fallback
+    return {
+        "ip_address": ip,
+        "reachable": main is not None,
+        "trusted": verified is not None,
+        "verification_error": verify_error if verified is None else None,
+        "protocols": [name for name in PROTOCOL_VERSIONS if results[name][0]],
+        "tls12_ciphers": sorted({cipher for group in suites for cipher in group}),
+        "tls13_cipher": results["TLS 1.3"][0]["cipher"] if results["TLS 1.3"][0] else None,
+        "negotiated_protocol": main["version"] if main else None,
+        "negotiated_cipher": main["cipher"] if main else None,
+        "alpn": verified["alpn"] if verified else None,
+        "chain": main["chain"] if main else [],
+    }
+
+
+def _name(name: x509.Name) -> Optional[str]:
+    common_names = name.get_attributes_for_oid(NameOID.COMMON_NAME)
+    return common_names[0].value if common_names else name.rfc4514_string()
+
+
+def describe_certificate(der: bytes) -> Dict[str, Any]:
+    """Subject, issuer, validity, SANs and OCSP responders of a DER certificate"""
+    cert = x509.load_der_x509_certificate(der)
+    not_after = cert.not_valid_after_utc
+    try:
+        sans = cert.extensions.get_extension_for_oid(ExtensionOID.SUBJECT_ALTERNATIVE_NAME).value
+        alt_names = sans.get_values_for_type(x509.DNSName) + [str(ip) for ip in sans.get_values_for_type(x509.IPAddress)]
+    except x509.ExtensionNotFound:
+        alt_names = []
+    try:
+        access = cert.extensions.get_extension_for_oid(ExtensionOID.AUTHORITY_INFORMATION_ACCESS).value
+        ocsp_urls = [d.access_location.value for d in access if d.access_method == AuthorityInformationAccessOID.OCSP]
+    except x509.ExtensionNotFound:
+        ocsp_urls = []
+    return {
+        "subject": _name(cert.subject),
+        "issuer": _name(cert.issuer),
+        "serial_number": format(cert.serial_number, "x"),
+        "not_before": cert.not_valid_before_utc.isoformat(),
+        "not_after": not_after.isoformat(),
+        "days_remaining": (not_after - datetime.now(timezone.utc)).days,
+        "sans": alt_names,
+        "ocsp_urls": ocsp_urls,
+        "self_signed": cert.issuer == cert.subject,
+    }
+
+
+def describe_chain(chain: List[bytes]) -> Dict[str, Any]:
+    """
+    The certificates a server presented, and what's wrong with how they're
+    sent: certificates out of issuing order, a trust anchor that clients
+    don't need, or an expired intermediate.
+    """
+    certs = [x509.load_der_x509_certificate(der) for der in chain]
+    now = datetime.now(timezone.utc)
+    issues = []
+    if any(cert.issuer != issued_by.subject for cert, issued_by in zip(certs, certs[1:])):
+        issues.append("Certificates out of order")
+    if len(certs) > 1 and certs[-1].issuer == certs[-1].subject:
+        issues.append("Contains anchor")
+    if any(cert.not_valid_after_utc < now for cert in certs[1:]):
+        issues.append("Expired intermediate")
+    return {
+        "chain": [
+            {"subject": _name(cert.subject), "issuer": _name(cert.issuer),
+             "not_after": cert.not_valid_after_utc.isoformat(), "self_signed": cert.issuer == cert.subject}
+            for cert in certs
+        ],
+        "chain_issues": issues,
+    }
+
+
+async def probe_tls(domain: Union[str, Target], port: Optional[int] = None, cafile: Optional[str] = None,
+                    timeout: float = HANDSHAKE_TIMEOUT, addresses: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Probe a host's TLS setup with concurrent handshakes per protocol version
+    and cipher group against each resolved IP, or the given addresses.
+    Returns the same shape as ssl_audit.check_ssl, with no grade and a
+    "local_probe" source.
+    """
+    target = as_target(domain)
+    host = target.hostname
+    if port is None:
+        # An explicit port only says where TLS listens on https targets
+        port = target.port if target.scheme == "https" else 443
+
+    start = time.perf_counter()
+    if addresses:
+        addresses = addresses[:MAX_ADDRESSES]
+    else:
+        try:
+            addresses = await _resolve(host, port)
+        except OSError as e:
+            return {"error": f"DNS resolution failed: {e}"}
+    endpoints = await asyncio.gather(*(_probe_address(ip, port, host, cafile, timeout) for ip in addresses))
+
+    reachable = [endpoint for endpoint in endpoints if endpoint["reachable"]]
+    if not reachable:
+        return {"error": f"No TLS handshake succeeded on {host}:{port}"}
+    primary = reachable[0]
+
+    certificate = describe_certificate(primary["chain"][0])
+    # Distinct chains over all endpoints, e.g. RSA and ECDSA certificates behind different IPs
+    chains = len({tuple(endpoint["chain"]) for endpoint in reachable})
+    protocols = sorted({p for endpoint in reachable for p in endpoint["protocols"]}, key=list(PROTOCOL_VERSIONS).index)
+    tls12 = sorted({cipher for endpoint in reachable for cipher in endpoint["tls12_ciphers"]})
+    tls13 = sorted({endpoint["tls13_cipher"] for endpoint in reachable if endpoint["tls13_cipher"]})
+    forward_secrecy = bool(tls13) or any(cipher.startswith(("ECDHE", "DHE")) for cipher in tls12)
+    trusted = all(endpoint["trusted"] for endpoint in reachable)
+
+    has_warnings = (
+        not trusted
+        or certificate["days_remaining"] < EXPIRY_WARNING_DAYS
+        or bool(LEGACY_VERSIONS.intersection(protocols))
+        or any(not cipher.startswith(("ECDHE", "DHE")) for cipher in tls12)
+    )
+
+    return {
+        "basic_info": {
+            "host": host,
+            "ip_address": primary["ip_address"],
+            "grade": None,  # Only SSL Labs grades
+            "has_warnings": has_warnings,
+            "status": "READY",
+            "source": "local_probe",
+        },
+        "protocols": {
+            "supported": protocols,
+            "preference": None,
+            "negotiated": primary["negotiated_protocol"],
+        },
+        "certificates": {
+            "chains": chains,
+            **describe_chain(primary["chain"]),
+            "trust_paths": [f"System: {'Trusted' if trusted else 'Untrusted'}"],
+            # The ssl module can't request a stapled OCSP response, SSL Labs fills this in
+            "ocsp_stapling": None,
+            "verification_error": next((e["verification_error"] for e in reachable if e["verification_error"]), None),
+            **certificate,
+        },
+        "cipher_suites": {
+            "tls12": tls12,
+            "tls13": tls13,
+            "forward_secrecy": forward_secrecy,
+            "negotiated": primary["negotiated_cipher"],
+        },
+        "security_features": {
+            "secure_renegotiation": None,
+            "session_resumption": None,
+            "npn_protocols": "",
+            "alpn_protocols": primary["alpn"] or "",
+            "session_tickets": None,
+        },
+        "endpoints": [{k: v for k, v in endpoint.items() if k != "chain"} for endpoint in endpoints],
+        "probe_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -1,15 +1,14 @@
 # tracker.py
 
-from pytrends.request import TrendReq
 import json
 
-# Initialize pytrends
-pytrends = TrendReq(hl="en-US", tz=360)
+from app.trends import get_client
 
 
 # Function to fetch trend data for given keywords
 def fetch_trend_data(keywords: str):
     try:
+        pytrends = get_client()
         # Build payload for keywords
         pytrends.build_payload(keywords, timeframe="today 12-m")
 
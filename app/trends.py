@@ -1,8 +1,54 @@
+import threading
 import time
-from pytrends.request import TrendReq
+from app.lazy import prefetch
+from app.metrics import UPSTREAM_RETRIES
+from app.resilience import can_retry, guard
+from app.upstreams import GOOGLE_TRENDS_URL
 
-# Connect to Google
-pytrends = TrendReq(hl='en-US', tz=360, timeout=(5, 30))
+PYTRENDS_DEFAULT_URL = "https://trends.google.com"
+MAX_RETRIES = 2  # Retries after a 429, each also paid from the Trends retry budget
+RETRY_DELAY = 15  # Seconds, doubled for every further retry
+
+def _point_pytrends_at(base_url: str):
+    """Rewrite pytrends' hard-coded endpoints to another host"""
+    import pytrends.request as pytrends_request
+    from pytrends.request import TrendReq
+
+    pytrends_request.BASE_TRENDS_URL = pytrends_request.BASE_TRENDS_URL.replace(PYTRENDS_DEFAULT_URL, base_url)
+    for name in dir(TrendReq):
+        value = getattr(TrendReq, name)
+        if name.endswith("_URL") and isinstance(value, str):
+            setattr(TrendReq, name, value.replace(PYTRENDS_DEFAULT_URL, base_url))
+
+# pytrends pulls in pandas, only load it once trends are needed (or on warm-up)
+prefetch("pytrends.request")
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    The shared TrendReq, created on first use. Creating it fetches cookies
+    from Google, which must not happen at import time.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from pytrends.request import TrendReq
+
+            if GOOGLE_TRENDS_URL != PYTRENDS_DEFAULT_URL:
+                _point_pytrends_at(GOOGLE_TRENDS_URL)
+            with guard("google_trends"):
+                _client = TrendReq(hl='en-US', tz=360, timeout=(5, 30))
+        return _client
+
+def _should_retry(error: Exception, attempt: int) -> bool:
+    """Back off and retry a rate-limited call while attempts and budget remain"""
+    if "429" not in str(error) or attempt >= MAX_RETRIES or not can_retry("google_trends"):
+        return False
+    UPSTREAM_RETRIES.inc("google_trends")
+    time.sleep(RETRY_DELAY * 2 ** attempt)
+    return True
 
 def get_keyword_trend(keyword: str, timeframe='today 5-y'):
     """
@@ -10,20 +56,23 @@ def get_keyword_trend(keyword: str, timeframe='today 5-y'):
     Returns:
         pandas.DataFrame or None: DataFrame containing trend data if successful, None if failed
     """
-    try:
-        pytrends.build_payload([keyword], cat=0, timeframe=timeframe, geo='')
-        interest_over_time_df = pytrends.interest_over_time()
-        
-        if interest_over_time_df.empty:
-            return None
-            
-        return interest_over_time_df.drop('isPartial', axis=1, errors='ignore')
-        
-    except Exception as e:
-        if "429" in str(e):
-            time.sleep(30)
-            return get_keyword_trend(keyword, timeframe)
-        return None
+    attempt = 0
+    while True:
+        try:
+            pytrends = get_client()
+            with guard("google_trends"):
+                pytrends.build_payload([keyword], cat=0, timeframe=timeframe, geo='')
+                interest_over_time_df = pytrends.interest_over_time()
+
+            if interest_over_time_df.empty:
+                return None
+
+            return interest_over_time_df.drop('isPartial', axis=1, errors='ignore')
+
+        except Exception as e:
+            if not _should_retry(e, attempt):
+                return None
+            attempt += 1
 
 def get_rising_queries(keyword: str):
     """
@@ -31,21 +80,24 @@ def get_rising_queries(keyword: str):
     Returns:
         pandas.DataFrame or None: DataFrame containing rising queries if successful, None if failed
     """
-    try:
-        pytrends.build_payload([keyword], timeframe='today 5-y')
-        queries = pytrends.related_queries()
-        rising_queries = queries[keyword]['rising']
-        
-        if rising_queries is None or rising_queries.empty:
-            return None
-            
-        return rising_queries
-        
-    except Exception as e:
-        if "429" in str(e):
-            time.sleep(30)
-            return get_rising_queries(keyword)
-        return None
+    attempt = 0
+    while True:
+        try:
+            pytrends = get_client()
+            with guard("google_trends"):
+                pytrends.build_payload([keyword], timeframe='today 5-y')
+                queries = pytrends.related_queries()
+            rising_queries = queries[keyword]['rising']
+
+            if rising_queries is None or rising_queries.empty:
+                return None
+
+            return rising_queries
+
+        except Exception as e:
+            if not _should_retry(e, attempt):
+                return None
+            attempt += 1
 
 def analyze_keyword(keyword: str):
     """
@@ -0,0 +1,19 @@
+# app/upstreams.py
+# Base URLs of every upstream service. Each can be overridden from the
+# environment, e.g. to point the app at the benchmark stub server.
+import os
+
+PSI_API_URL = os.getenv("PSI_API_URL", "https://www.googleapis.com/pagespeedonline/v5/runPagespeed")
+SSL_LABS_API_URL = os.getenv("SSL_LABS_API_URL", "https://api.ssllabs.com/api/v3")
+GOOGLE_NEWS_RSS_URL = os.getenv("GOOGLE_NEWS_RSS_URL", "https://news.google.com/rss/search")
+GOOGLE_TRENDS_URL = os.getenv("GOOGLE_TRENDS_URL", "https://trends.google.com")
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.google.com/search")
+GOOGLE_OAUTH_TOKEN_URL = os.getenv("GOOGLE_OAUTH_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+GA4_DATA_API_URL = os.getenv("GA4_DATA_API_URL", "https://analyticsdata.googleapis.com/v1beta")
+GA4_ADMIN_API_URL = os.getenv("GA4_ADMIN_API_URL", "https://analyticsadmin.googleapis.com/v1beta")
+SEARCH_CONSOLE_API_URL = os.getenv("SEARCH_CONSOLE_API_URL", "https://www.googleapis.com/webmasters/v3")
+# Social profiles are fetched as {SOCIAL_PROFILE_BASE_URL}/{host}/{path} when set, instead of from the networks
+SOCIAL_PROFILE_BASE_URL = os.getenv("SOCIAL_PROFILE_BASE_URL")
+# "host:port" of a WHOIS server to query directly instead of the registry lookup chain
+WHOIS_SERVER = os.getenv("WHOIS_SERVER")
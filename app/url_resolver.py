@@ -0,0 +1,96 @@
+# app/url_resolver.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+import requests
+
+from app import cache
+from app.metrics import track_upstream
+from app.targets import canonicalize
+
+RESOLVER_TTL = int(os.getenv("RESOLVER_TTL", "86400"))  # Canonical URLs rarely change
+RESOLVER_NEGATIVE_TTL = 300  # Retry unreachable hosts sooner
+PROBE_TIMEOUT = 5
+UNREACHABLE = ""  # Cached in place of a URL, None would read back as a miss
+
+logger = logging.getLogger(__name__)
+
+_probe_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="url-probe")
+# Striped so concurrent callers for one host share a probe round without a lock per host ever seen
+_host_locks = [threading.Lock() for _ in range(64)]
+
+
+def candidate_urls(host: str) -> List[str]:
+    """Every scheme/www variant a site may be served from, most preferred first"""
+    return [
+        f"https://www.{host}",
+        f"https://{host}",
+        f"http://www.{host}",
+        f"http://{host}",
+    ]
+
+
+def _store(host: str, url: Optional[str]):
+    if url is None:
+        cache.store("canonical_url", host, UNREACHABLE, RESOLVER_NEGATIVE_TTL)
+    else:
+        cache.store("canonical_url", host, url, RESOLVER_TTL)
+
+
+def _probe(url: str) -> str:
+    with track_upstream("site_probe"):
+        return _probe_once(url)
+
+
+def _probe_once(url: str) -> str:
+    response = requests.head(url, allow_redirects=True, timeout=PROBE_TIMEOUT)
+    # Some servers reject HEAD outright, fall back to a streamed GET
+    if response.status_code in (403, 405, 501):
+        response = requests.get(url, allow_redirects=True, timeout=PROBE_TIMEOUT, stream=True)
+        response.close()
+    if response.status_code != 200:
+        raise requests.RequestException(f"{url} returned {response.status_code}")
+    return response.url.rstrip("/")
+
+
+def resolve_canonical_url(domain_or_url: str) -> str:
+    """
+    Resolve a domain, sc-domain: property or URL to the URL the site is
+    actually served from. All variants are probed concurrently and the first
+    one that answers 200 wins. Results are kept in the shared cache, so every
+    worker reuses them.
+    """
+    host = canonicalize(domain_or_url).site_host
+
+    url = cache.lookup("canonical_url", host)
+    if url is None:
+        # Concurrent callers for the same host wait for one probe round
+        with _host_locks[hash(host) % len(_host_locks)]:
+            url = cache.lookup("canonical_url", host)
+            if url is None:
+                url = _probe_all(host)
+                _store(host, url)
+
+    if not url:
+        raise ValueError(f"Could not resolve {domain_or_url} to a valid URL")
+    return url
+
+
+def _probe_all(host: str) -> Optional[str]:
+    logger.info(f"Probing canonical URL for {host}")
+    futures = {_probe_executor.submit(_probe, url): url for url in candidate_urls(host)}
+    for future in as_completed(futures):
+        try:
+            resolved = future.result()
+        except requests.RequestException as e:
+            logger.debug(f"Failed to resolve {futures[future]}: {str(e)}")
+            continue
+        logger.info(f"Resolved {host} to {resolved}")
+        for other in futures:
+            other.cancel()
+        return resolved
+    logger.warning(f"No reachable variant for {host}")
+    return None
@@ -3,49 +3,30 @@ from typing import Dict
 import urllib.parse
 import logging
 
-import requests
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from app.targets import canonicalize, has_scheme
+from app.url_resolver import resolve_canonical_url
 
 def validate_url(url: str) -> str:
     """Validate and clean URL input"""
-    if not url:
-        raise ValueError("URL cannot be empty")
-    
-    # Handle sc-domain: format
-    if url.startswith("sc-domain:"):
-        domain = url.replace("sc-domain:", "").strip()
-        return f"https://www.{domain}"
+    target = canonicalize(url)
     
-    # Ensure URL has a scheme
-    if not url.startswith(('http://', 'https://')):
-        url = f"https://{url}"
-    
-    logging.info(f"Validated and cleaned URL: {url}")
-    return urllib.parse.quote(url, safe=':/?=')
+    # Resolve sc-domain: properties and bare domains to the URL the site is served from
+    if not has_scheme(url.strip()):
+        is_sc_domain = url.strip().startswith("sc-domain:")
+        try:
+            origin = resolve_canonical_url(url)
+        except ValueError:
+            origin = f"{target.scheme}://www.{target.site_host}" if is_sc_domain else target.origin
+            logging.warning(f"Could not resolve {target.host}, assuming {origin}")
+        target = canonicalize(f"{origin}{target.path}")
+    
+    logging.info(f"Validated and cleaned URL: {target.url}")
+    return urllib.parse.quote(target.url, safe=':/?=[]')
 
 def map_sc_domain_to_canonical_url(sc_domain_url: str) -> str:
     """Map sc-domain to canonical URL with better error handling"""
     logging.info(f"Attempting to map sc-domain: {sc_domain_url}")
-    
-    domain = sc_domain_url.replace("sc-domain:", "").strip()
-    canonical_urls = [f"https://www.{domain}", f"https://{domain}"]
-    
-    for url in canonical_urls:
-        try:
-            logging.info(f"Trying URL: {url}")
-            response = requests.head(url, allow_redirects=True, timeout=5)
-            if response.status_code == 200:
-                logging.info(f"Successfully resolved to: {url}")
-                return url
-        except requests.RequestException as e:
-            logging.warning(f"Failed to resolve {url}: {str(e)}")
-            continue
-    
-    raise ValueError(f"Could not resolve {sc_domain_url} to a valid URL")
+    return resolve_canonical_url(sc_domain_url)
 
 def calculate_performance_score(metrics: Dict[str, float]) -> float:
     """Calculate the weighted performance score based on Lighthouse metrics"""
@@ -0,0 +1,377 @@
+# benchmarks/loadtest.py
+"""
+Load test for /process_url against the stub upstreams. Ramps the number of
+concurrent clients and reports where throughput stops growing, together with
+how long jobs wait in each thread pool, how deep each pool's queue gets and
+how far the event loop falls behind.
+
+    python -m benchmarks.loadtest                              # in-process, default pools
+    python -m benchmarks.loadtest --levels 1,4,16,64 --duration 5 --latency 100
+    python -m benchmarks.loadtest --thread-pool 8,32,64 --collectors thread,inline
+    python -m benchmarks.loadtest --pool scraping=4,16 --pool psi=8
+    python -m benchmarks.loadtest --mode localhost --workers 1,2,4
+
+In-process mode drives the ASGI app directly on this process's event loop,
+so pool queueing and loop lag are measured inside the app, per pool as seen
+by runtime_monitor. Localhost mode starts uvicorn with each worker count and
+can only observe the client side of the requests.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.run import configure_environment, percentile
+from benchmarks.stub_server import StubServer
+
+SATURATION_GAIN = 0.10  # A level that adds less than 10% throughput counts as saturated
+
+
+class PoolMonitor:
+    """Sample the queue depth of every pool runtime_monitor watches"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.depths: Dict[str, List[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        from app.runtime_monitor import runtime_monitor
+
+        while True:
+            for executor in list(runtime_monitor.executors):
+                self.depths.setdefault(executor.name, []).append(executor.snapshot()["queued"])
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class LoopLagMonitor:
+    """Sleep for a fixed interval and record how late the event loop wakes up"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def drive(client: httpx.AsyncClient, url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """Keep `concurrency` requests in flight for `duration` seconds"""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/process_url", data={"url": url})
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else 0,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else 0,
+    }
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50_ms": 0, "p99_ms": 0, "max_ms": 0}
+    return {
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def queue_waits() -> Dict[str, List[float]]:
+    """Per-pool queue-wait histogram series, as recorded by runtime_monitor"""
+    from app.runtime_monitor import EXECUTOR_QUEUE_WAIT
+
+    return {key[0]: series for key, series in EXECUTOR_QUEUE_WAIT.snapshot().items()}
+
+
+def summarize_waits(before: List[float], after: List[float]) -> Dict[str, float]:
+    """
+    Queue waits observed between two histogram snapshots. Percentiles are the
+    upper bound of the bucket they fall in.
+    """
+    from app.runtime_monitor import EXECUTOR_QUEUE_WAIT
+
+    counts = [a - b for a, b in zip(after, before or [0] * len(after))]
+    jobs = sum(counts[:-1])
+    if not jobs:
+        return {"jobs": 0, "mean_ms": 0, "p50_ms": 0, "p99_ms": 0}
+
+    def bucket_bound(share: float) -> float:
+        cumulative = 0
+        for bound, count in zip(EXECUTOR_QUEUE_WAIT.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= jobs * share:
+                return bound * 1000
+        return float("inf")
+
+    return {"jobs": jobs, "mean_ms": counts[-1] / jobs * 1000,
+            "p50_ms": bucket_bound(0.5), "p99_ms": bucket_bound(0.99)}
+
+
+def pool_report(waits_before: Dict[str, List[float]], depths: Dict[str, List[int]]) -> Dict[str, Dict[str, Any]]:
+    waits_after = queue_waits()
+    report = {}
+    for name in sorted(set(waits_after) | set(depths)):
+        samples = depths.get(name) or [0]
+        report[name] = {
+            "wait": summarize_waits(waits_before.get(name, []), waits_after.get(name, [])),
+            "depth": {"mean": sum(samples) / len(samples), "max": max(samples)},
+        }
+    return report
+
+
+def saturation_point(levels: List[Dict[str, Any]]) -> Optional[int]:
+    """First concurrency level whose throughput barely improves on the previous one"""
+    for previous, current in zip(levels, levels[1:]):
+        if current["rps"] < previous["rps"] * (1 + SATURATION_GAIN):
+            return previous["concurrency"]
+    return None
+
+
+def use_inline_collectors(enabled: bool):
+    """Run collectors directly on the event loop instead of in worker threads"""
+    import app.audit
+    from app.metrics import track_collector
+
+    async def run_inline(name: str, func, *args):
+        with track_collector(name):
+            return func(*args)
+
+    if not hasattr(app.audit, "_threaded_run_collector"):
+        app.audit._threaded_run_collector = app.audit.run_collector
+    app.audit.run_collector = run_inline if enabled else app.audit._threaded_run_collector
+
+
+def use_pool_sizes(pool_sizes: Dict[str, int]):
+    """Resize the named pools, on top of the sizes POOL_SPECS starts with"""
+    from app import executors
+
+    if not hasattr(executors, "_configured_specs"):
+        executors._configured_specs = dict(executors.POOL_SPECS)
+    executors.shutdown_pools()
+    executors.POOL_SPECS.update(executors._configured_specs)
+    for name, workers in pool_sizes.items():
+        executors.POOL_SPECS[name] = dataclasses.replace(executors.POOL_SPECS[name], max_workers=workers)
+
+
+async def ramp_in_process(server: StubServer, levels: List[int], duration: float,
+                          pool_size: int, collectors: str, pool_sizes: Dict[str, int]) -> List[Dict[str, Any]]:
+    from app.main import app
+    from app.runtime_monitor import MonitoredExecutor, runtime_monitor
+
+    # The default executor still serves asyncio.to_thread calls outside the named pools
+    executor = MonitoredExecutor(max_workers=pool_size or min(32, (os.cpu_count() or 1) + 4), name="default")
+    asyncio.get_running_loop().set_default_executor(executor)
+    runtime_monitor.watch(executor)
+    use_inline_collectors(collectors == "inline")
+    use_pool_sizes(pool_sizes)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=300) as client:
+        await client.post("/process_url", data={"url": server.base_url})  # warm caches and imports
+        for concurrency in levels:
+            waits_before = queue_waits()
+            monitor, pools = LoopLagMonitor(), PoolMonitor()
+            monitor.start()
+            pools.start()
+            level = await drive(client, server.base_url, concurrency, duration)
+            await monitor.stop()
+            await pools.stop()
+            level["pools"] = pool_report(waits_before, pools.depths)
+            level["loop_lag"] = summarize(monitor.lags)
+            results.append(level)
+            print_level(level)
+    runtime_monitor.unwatch(executor)
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def ramp_localhost(server: StubServer, levels: List[int], duration: float,
+                         pool_size: int, workers: int, pool_sizes: Dict[str, int]) -> List[Dict[str, Any]]:
+    port = free_port()
+    env = dict(os.environ, THREAD_POOL_SIZE=str(pool_size))
+    env.update({f"POOL_{name.upper()}_WORKERS": str(size) for name, size in pool_sizes.items()})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+    results = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.2)
+            await asyncio.gather(*(client.post("/process_url", data={"url": server.base_url})
+                                   for _ in range(workers)))
+            for concurrency in levels:
+                level = await drive(client, server.base_url, concurrency, duration)
+                results.append(level)
+                print_level(level)
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def print_level(level: Dict[str, Any]):
+    line = (f"  c={level['concurrency']:<4} rps={level['rps']:>8.1f} p50={level['p50_ms']:>8.1f}ms "
+            f"p99={level['p99_ms']:>8.1f}ms errors={level['errors']}")
+    if "loop_lag" in level:
+        line += f" loop-lag p99={level['loop_lag']['p99_ms']:.1f}ms"
+    print(line, flush=True)
+    for name, pool in level.get("pools", {}).items():
+        if pool["wait"]["jobs"] or pool["depth"]["max"]:
+            print(f"      {name:<11} jobs={pool['wait']['jobs']:<6} wait mean={pool['wait']['mean_ms']:.1f}ms "
+                  f"p99<={pool['wait']['p99_ms']:.0f}ms depth mean={pool['depth']['mean']:.1f} "
+                  f"max={pool['depth']['max']}", flush=True)
+
+
+def parse_list(value: str, cast=int) -> List[Any]:
+    return [cast(v) for v in value.split(",") if v]
+
+
+def parse_pool_sizes(values: List[str]) -> List[Dict[str, int]]:
+    """["scraping=4,16", "psi=8"] -> every combination of the listed sizes"""
+    from app.executors import POOL_SPECS
+
+    choices: List[Tuple[str, List[int]]] = []
+    for value in values:
+        name, _, sizes = value.partition("=")
+        if name not in POOL_SPECS or not sizes:
+            raise SystemExit(f"--pool expects NAME=SIZE[,SIZE...] with NAME one of {', '.join(POOL_SPECS)}")
+        choices.append((name, parse_list(sizes)))
+    return [dict(zip((name for name, _ in choices), combination))
+            for combination in product(*(sizes for _, sizes in choices))]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ramp concurrent /process_url load against stub upstreams")
+    parser.add_argument("--mode", choices=("in-process", "localhost"), default="in-process")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Concurrency levels to ramp through")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds spent at each level")
+    parser.add_argument("--thread-pool", default="0",
+                        help="Default executor sizes to compare, 0 = asyncio default")
+    parser.add_argument("--pool", action="append", default=[], metavar="NAME=SIZES",
+                        help="Worker counts to compare for one named pool, e.g. scraping=4,16 (repeatable)")
+    parser.add_argument("--collectors", default="thread",
+                        help="Collector modes to compare: thread (to_thread) and/or inline (on the loop)")
+    parser.add_argument("--workers", default="1", help="uvicorn worker counts to compare (localhost mode)")
+    parser.add_argument("--latency", type=float, default=50, help="Stub upstream latency in ms")
+    parser.add_argument("--jitter", type=float, default=10, help="Stub upstream latency jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of stub responses that fail")
+    parser.add_argument("--json", dest="json_path", help="Write all results to this file")
+    args = parser.parse_args(argv)
+
+    levels = parse_list(args.levels)
+    server = StubServer(latency_ms=args.latency, jitter_ms=args.jitter,
+                        error_rate=args.error_rate, seed=0).start()
+    report = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="webly-load-") as workdir:
+            configure_environment(server, workdir)
+            pool_configs = parse_pool_sizes(args.pool)
+            if args.mode == "in-process":
+                configs = product(parse_list(args.thread_pool), parse_list(args.collectors, str), [1], pool_configs)
+            else:
+                configs = product(parse_list(args.thread_pool), ["thread"], parse_list(args.workers), pool_configs)
+
+            for pool_size, collectors, workers, pool_sizes in configs:
+                config = {"mode": args.mode, "thread_pool": pool_size or "default",
+                          "collectors": collectors, "workers": workers, "pools": pool_sizes}
+                print(f"{config}", flush=True)
+                if args.mode == "in-process":
+                    # Each configuration gets a fresh loop so executors and patches don't leak
+                    results = asyncio.run(ramp_in_process(server, levels, args.duration, pool_size, collectors,
+                                                          pool_sizes))
+                else:
+                    results = asyncio.run(ramp_localhost(server, levels, args.duration, pool_size, workers,
+                                                         pool_sizes))
+                report.append({
+                    "config": config,
+                    "levels": results,
+                    "peak_rps": max(r["rps"] for r in results),
+                    "saturation_concurrency": saturation_point(results),
+                })
+    finally:
+        server.stop()
+
+    print("\nconfiguration                                        peak rps  saturates at")
+    for entry in report:
+        c = entry["config"]
+        label = f"pool={c['thread_pool']} collectors={c['collectors']} workers={c['workers']}"
+        label += "".join(f" {name}={size}" for name, size in c["pools"].items())
+        saturation = entry["saturation_concurrency"] or f">{levels[-1]}"
+        print(f"{label:<52}{entry['peak_rps']:>9.1f}  {saturation}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
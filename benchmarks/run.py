@@ -0,0 +1,247 @@
+# benchmarks/run.py
+"""
+Benchmark scenarios for the audit pipeline, run against the local stub
+server so no live Google, SSL Labs or WHOIS service is touched.
+
+    python -m benchmarks.run                          # all scenarios
+    python -m benchmarks.run -k rss --rounds 200      # only matching scenarios
+    python -m benchmarks.run --latency 80 --error-rate 0.05
+    python -m benchmarks.run --json results.json
+    python -m benchmarks.run --baseline results.json --max-regression 0.2
+
+Each scenario reports throughput, p50/p99 latency and peak traced memory.
+With --baseline the run exits non-zero when a scenario's p50 is more than
+--max-regression slower than the baseline.
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.stub_server import FIXTURES_DIR, StubServer
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {}
+
+
+def scenario(name: str, rounds: int = 50, warmup: int = 2):
+    """
+    Register a benchmark. The decorated function receives the running stub
+    server and returns the callable to time, so setup stays out of the loop.
+    """
+    def decorator(factory: Callable[[StubServer], Callable[[], Any]]):
+        SCENARIOS[name] = {"factory": factory, "rounds": rounds, "warmup": warmup}
+        return factory
+    return decorator
+
+
+def configure_environment(server: StubServer, workdir: str):
+    """
+    Point every upstream and on-disk store at the stub server and a scratch
+    directory. Must run before any app module is imported, since they read
+    their configuration at import time.
+    """
+    os.environ.update(server.env())
+    os.environ.update({
+        "CREDENTIAL_STORE_PATH": os.path.join(workdir, "credentials.json"),
+        "CREDENTIAL_DB": os.path.join(workdir, "credentials.db"),
+        "SEARCH_CONSOLE_DB": os.path.join(workdir, "search_console.db"),
+        "DEBUG_LOG_PATH": os.path.join(workdir, "debug.log"),
+        "CACHE_PATH": os.path.join(workdir, "cache.db"),
+        "CERT_WATCH_DB": os.path.join(workdir, "cert_watch.db"),
+        "CRAWL_DB": os.path.join(workdir, "crawl.db"),
+        # Measure the collectors themselves unless a run asks for the shared cache
+        "CACHE_BACKEND": os.environ.get("CACHE_BACKEND", "none"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "GOOGLE_CLIENT_ID": "benchmark-client",
+        "GOOGLE_CLIENT_SECRET": "benchmark-secret",
+        "GOOGLE_SEARCH_API_KEY": "benchmark-key",
+        "REDIRECT_URI": "http://testserver/callback",
+    })
+
+
+# --- scenarios -----------------------------------------------------------
+
+@scenario("process_url", rounds=10, warmup=1)
+def bench_process_url(server: StubServer):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+
+    def run():
+        response = client.post("/process_url", data={"url": server.base_url})
+        response.raise_for_status()
+    return run
+
+
+@scenario("oauth_callback", rounds=10, warmup=1)
+def bench_oauth_callback(server: StubServer):
+    from fastapi.testclient import TestClient
+    from app.credentials import credential_manager
+    from app.main import app
+
+    client = TestClient(app)
+    user_id = json.loads(open(os.path.join(FIXTURES_DIR, "userinfo.json")).read())["id"]
+
+    def run():
+        # Drop cached dashboard data so each round measures a full fetch
+        credential_manager.invalidate(user_id)
+        response = client.get("/callback", params={"code": "benchmark-code"})
+        response.raise_for_status()
+    return run
+
+
+@scenario("cold_import", rounds=5, warmup=1)
+def bench_cold_import(server: StubServer):
+    """A fresh interpreter importing app.main, as each worker does on start"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-c", "import app.main"]
+
+    def run():
+        subprocess.run(command, cwd=root, env=os.environ.copy(), check=True, capture_output=True)
+    return run
+
+
+@scenario("serialize_data", rounds=200)
+def bench_serialize_data(server: StubServer):
+    from app.main import serialize_data
+    from app.news_fetcher import parse_google_rss
+
+    with open(os.path.join(FIXTURES_DIR, "news_rss.xml"), "rb") as f:
+        news = parse_google_rss(f.read())
+    with open(os.path.join(FIXTURES_DIR, "ssllabs_analyze.json")) as f:
+        ssl = json.load(f)
+    with open(os.path.join(FIXTURES_DIR, "psi.json")) as f:
+        psi = json.load(f)
+    payload = {"news": news, "ssl": ssl, "lighthouse": psi, "nested": [{"values": list(range(50))}] * 20}
+
+    return lambda: serialize_data(payload)
+
+
+@scenario("rss_parser", rounds=200)
+def bench_rss_parser(server: StubServer):
+    from app.news_fetcher import parse_google_rss
+
+    with open(os.path.join(FIXTURES_DIR, "news_rss.xml"), "rb") as f:
+        content = f.read()
+    return lambda: parse_google_rss(content)
+
+
+@scenario("performance_score", rounds=5000)
+def bench_performance_score(server: StubServer):
+    from app.utils import calculate_performance_score
+
+    metrics = {"FCP": 0.92, "SpeedIndex": 0.81, "LCP": 0.74, "TBT": 0.66, "CLS": 0.98}
+    return lambda: calculate_performance_score(metrics)
+
+
+# --- runner --------------------------------------------------------------
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(name: str, server: StubServer, rounds: Optional[int] = None) -> Dict[str, Any]:
+    spec = SCENARIOS[name]
+    func = spec["factory"](server)
+    rounds = rounds or spec["rounds"]
+
+    for _ in range(spec["warmup"]):
+        func()
+
+    samples = []
+    gc.collect()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    # Memory is traced in a separate pass, tracemalloc would skew the timings
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rounds": rounds,
+        "ops_per_sec": rounds / elapsed if elapsed else 0,
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            max_regression: float) -> List[str]:
+    """Names of scenarios whose p50 regressed beyond the allowed ratio"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result["p50_ms"] > previous["p50_ms"] * (1 + max_regression):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']:.2f}ms vs baseline {previous['p50_ms']:.2f}ms"
+            )
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]]):
+    header = f"{'scenario':<20}{'rounds':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<20}{r['rounds']:>8}{r['ops_per_sec']:>12.1f}{r['p50_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['peak_memory_kb']:>12.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the webly benchmark suite")
+    parser.add_argument("-k", dest="pattern", help="Only run scenarios whose name contains this")
+    parser.add_argument("--rounds", type=int, help="Override the number of timed rounds")
+    parser.add_argument("--latency", type=float, default=0, help="Stub upstream latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Stub upstream latency jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of stub responses that fail")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    parser.add_argument("--baseline", help="Results file from a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed p50 slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    names = [name for name in SCENARIOS if not args.pattern or args.pattern in name]
+    server = StubServer(latency_ms=args.latency, jitter_ms=args.jitter,
+                        error_rate=args.error_rate, seed=0).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="webly-bench-") as workdir:
+            configure_environment(server, workdir)
+            results = {name: run_scenario(name, server, args.rounds) for name in names}
+    finally:
+        server.stop()
+
+    print_table(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+# benchmarks/stub_server.py
+"""
+Local stand-in for every upstream the collectors call. Replays the recorded
+responses in benchmarks/fixtures with configurable latency and error
+injection, so the pipeline can be measured without touching live services.
+
+    python -m benchmarks.stub_server --port 8765 --latency 50 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import ssl
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+SC_TOTAL_ROWS_PER_DAY = 200
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+class StubServer:
+    """
+    Serves recorded PSI, SSL Labs, News RSS, Trends, GA4, Search Console,
+    OAuth, Google search, social profile, homepage and WHOIS responses. The same routes are
+    also served over TLS on tls_port, with a self-signed certificate for
+    localhost and the host address (cert_path, to trust it).
+
+    latency_ms/jitter_ms delay every response; error_rate is the share of
+    requests answered with a 503. route_latency_ms overrides the latency of
+    single routes (keys are route names such as "psi" or "ssllabs").
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, whois_port: int = 0, tls_port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 route_latency_ms: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.whois_port = whois_port
+        self.tls_port = tls_port
+        self.cert_path: Optional[str] = None
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.route_latency_ms = route_latency_ms or {}
+        self.request_counts: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._fixtures = {name: load_fixture(name) for name in os.listdir(FIXTURES_DIR)}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._whois_server: Optional[asyncio.AbstractServer] = None
+        self._ready = threading.Event()
+
+    # --- lifecycle -------------------------------------------------------
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def tls_url(self) -> str:
+        return f"https://localhost:{self.tls_port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point app.upstreams at this server"""
+        return {
+            "PSI_API_URL": f"{self.base_url}/pagespeedonline/v5/runPagespeed",
+            "SSL_LABS_API_URL": f"{self.base_url}/ssllabs/api/v3",
+            "GOOGLE_NEWS_RSS_URL": f"{self.base_url}/news/rss/search",
+            "GOOGLE_TRENDS_URL": f"{self.base_url}/trends-stub",
+            "GOOGLE_SEARCH_URL": f"{self.base_url}/search",
+            "SOCIAL_PROFILE_BASE_URL": f"{self.base_url}/social",
+            "GOOGLE_OAUTH_TOKEN_URL": f"{self.base_url}/oauth/token",
+            "GOOGLE_USERINFO_URL": f"{self.base_url}/oauth/userinfo",
+            "GA4_DATA_API_URL": f"{self.base_url}/ga4data/v1beta",
+            "GA4_ADMIN_API_URL": f"{self.base_url}/ga4admin/v1beta",
+            "SEARCH_CONSOLE_API_URL": f"{self.base_url}/webmasters/v3",
+            "WHOIS_SERVER": f"{self.host}:{self.whois_port}",
+        }
+
+    def start(self) -> "StubServer":
+        """Run the server on a background event loop thread"""
+        self._thread = threading.Thread(target=self._run, name="stub-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._startup())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _startup(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        self._whois_server = await asyncio.start_server(self._handle_whois, self.host, self.whois_port)
+        self.whois_port = self._whois_server.sockets[0].getsockname()[1]
+
+        tls_site = web.TCPSite(self._runner, self.host, self.tls_port, ssl_context=self._tls_context())
+        await tls_site.start()
+        self.tls_port = tls_site._server.sockets[0].getsockname()[1]
+
+    def _tls_context(self) -> ssl.SSLContext:
+        """Self-signed certificate for localhost and the host address, written to a scratch directory"""
+        import ipaddress
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.x509.oid import NameOID
+
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+        now = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=90))
+            .add_extension(x509.SubjectAlternativeName([
+                x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address(self.host)),
+            ]), critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(key, hashes.SHA256())
+        )
+        workdir = tempfile.mkdtemp(prefix="webly-stub-tls-")
+        self.cert_path = os.path.join(workdir, "cert.pem")
+        key_path = os.path.join(workdir, "key.pem")
+        with open(self.cert_path, "wb") as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, "wb") as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.cert_path, key_path)
+        context.set_alpn_protocols(["http/1.1"])
+        return context
+
+    async def _shutdown(self):
+        self._whois_server.close()
+        await self._whois_server.wait_closed()
+        await self._runner.cleanup()
+
+    # --- behaviour -------------------------------------------------------
+
+    async def _delay(self, route: str):
+        latency = self.route_latency_ms.get(route, self.latency_ms)
+        if self.jitter_ms:
+            latency += self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def _inject_error(self) -> bool:
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def _route(self, name: str, handler):
+        async def wrapped(request: web.Request) -> web.StreamResponse:
+            self.request_counts[name] = self.request_counts.get(name, 0) + 1
+            await self._delay(name)
+            if self._inject_error():
+                return web.Response(status=503, text="injected failure")
+            return await handler(request)
+        return wrapped
+
+    def _fixture_response(self, name: str, content_type: str, prefix: bytes = b""):
+        async def handler(request: web.Request) -> web.Response:
+            return web.Response(body=prefix + self._fixtures[name], content_type=content_type)
+        return handler
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        json_fixture = lambda name: self._fixture_response(name, "application/json")
+        routes = [
+            ("GET", "/pagespeedonline/v5/runPagespeed", "psi", json_fixture("psi.json")),
+            ("GET", "/ssllabs/api/v3/info", "ssllabs", json_fixture("ssllabs_info.json")),
+            ("GET", "/ssllabs/api/v3/analyze", "ssllabs", self._ssllabs_analyze),
+            ("GET", "/news/rss/search", "news", self._fixture_response("news_rss.xml", "application/xml")),
+            ("GET", "/trends-stub/trends/explore/", "trends", self._trends_cookie),
+            ("POST", "/trends-stub/trends/api/explore", "trends", self._trends_explore),
+            ("GET", "/trends-stub/trends/api/widgetdata/multiline", "trends",
+             self._fixture_response("trends_multiline.json", "application/json")),
+            ("GET", "/trends-stub/trends/api/widgetdata/relatedsearches", "trends",
+             self._fixture_response("trends_related.json", "application/json")),
+            ("GET", "/search", "google_search", self._fixture_response("google_search.html", "text/html")),
+            ("GET", "/social/{profile:.*}", "social_profiles",
+             self._fixture_response("social_profile.html", "text/html")),
+            ("POST", "/oauth/token", "oauth", json_fixture("oauth_token.json")),
+            ("GET", "/oauth/userinfo", "oauth", json_fixture("userinfo.json")),
+            ("GET", "/ga4admin/v1beta/accountSummaries", "ga4", json_fixture("ga4_account_summaries.json")),
+            ("POST", "/ga4data/v1beta/properties/{property}", "ga4", json_fixture("ga4_run_report.json")),
+            ("GET", "/webmasters/v3/sites", "search_console", self._sc_sites),
+            ("POST", "/webmasters/v3/sites/{site}/searchAnalytics/query", "search_console", self._sc_query),
+            ("GET", "/", "homepage", self._fixture_response("homepage.html", "text/html")),
+        ]
+        for method, path, name, handler in routes:
+            app.router.add_route(method, path, self._route(name, handler))
+        return app
+
+    async def _ssllabs_analyze(self, request: web.Request) -> web.Response:
+        data = json.loads(self._fixtures["ssllabs_analyze.json"])
+        data["host"] = request.query.get("host", data["host"])
+        return web.json_response(data, headers={"X-Max-Assessments": "25", "X-Current-Assessments": "1"})
+
+    async def _trends_cookie(self, request: web.Request) -> web.Response:
+        response = web.Response(text="ok", content_type="text/html")
+        response.set_cookie("NID", "stub-nid")
+        return response
+
+    async def _trends_explore(self, request: web.Request) -> web.Response:
+        # Echo the requested keyword back so pytrends can match widgets to keywords
+        req = json.loads(request.query.get("req", "{}"))
+        keyword = (req.get("comparisonItem") or [{}])[0].get("keyword", "")
+        widgets = [
+            {"id": "TIMESERIES", "token": "stub-ts", "request": {"time": "today 5-y", "keyword": keyword}},
+            {"id": "GEO_MAP", "token": "stub-geo", "request": {"keyword": keyword}},
+            {"id": "RELATED_QUERIES", "token": "stub-rq", "request": {
+                "restriction": {"complexKeywordsRestriction": {"keyword": [{"type": "BROAD", "value": keyword}]}}
+            }},
+        ]
+        return web.Response(text=")]}'" + json.dumps({"widgets": widgets}), content_type="application/json")
+
+    async def _sc_sites(self, request: web.Request) -> web.Response:
+        return web.json_response({"siteEntry": [
+            {"siteUrl": f"{self.base_url}/", "permissionLevel": "siteOwner"},
+        ]})
+
+    async def _sc_query(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        start = date.fromisoformat(body["startDate"])
+        end = date.fromisoformat(body["endDate"])
+        start_row = body.get("startRow", 0)
+        row_limit = body.get("rowLimit", 1000)
+        days = (end - start).days + 1
+        total = days * SC_TOTAL_ROWS_PER_DAY
+
+        rows = []
+        for index in range(start_row, min(start_row + row_limit, total)):
+            day = start + timedelta(days=index // SC_TOTAL_ROWS_PER_DAY)
+            n = index % SC_TOTAL_ROWS_PER_DAY
+            rows.append({
+                "keys": [day.isoformat(), f"example query {n % 50}", f"{self.base_url}/page-{n % 20}",
+                         ["usa", "gbr", "deu", "nga"][n % 4], ["DESKTOP", "MOBILE"][n % 2]],
+                "clicks": n % 7, "impressions": 10 + n, "ctr": (n % 7) / (10 + n), "position": 1 + n % 30,
+            })
+        return web.json_response({"rows": rows, "responseAggregationType": "byPage"})
+
+    async def _handle_whois(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.readline()
+        self.request_counts["whois"] = self.request_counts.get("whois", 0) + 1
+        await self._delay("whois")
+        writer.write(self._fixtures["whois.txt"])
+        await writer.drain()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded upstream responses locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--whois-port", type=int, default=8743)
+    parser.add_argument("--latency", type=float, default=0, help="Added latency per response in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Random +/- latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, args.whois_port, args.latency, args.jitter, args.error_rate).start()
+    for name, value in server.env().items():
+        print(f"export {name}={value}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
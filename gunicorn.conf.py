@@ -0,0 +1,33 @@
+# gunicorn.conf.py
+# Production serving: several uvicorn workers per host, sharing collector results through app.cache.
+import glob
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Requests mostly wait on upstreams inside each worker's thread pools, so one worker per core is enough
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# SSL Labs assessments can take several minutes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "420"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks in scraping libraries can't build up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+accesslog = "-"
+# Workers log JSON lines to stderr, collected by the master; several processes can't share a rotating file
+os.environ["DEBUG_LOG_PATH"] = ""
+# Workers write their metrics here so /metrics covers all of them, whichever one answers the scrape
+os.environ.setdefault("METRICS_DIR", "/tmp/webly-metrics")
+
+
+def on_starting(server):
+    # Session cookies and stored tokens are encrypted with TOKEN_ENCRYPTION_KEY, and without it
+    # every worker would make up its own key and reject the cookies issued by the others
+    if server.cfg.workers > 1 and not os.getenv("TOKEN_ENCRYPTION_KEY"):
+        raise RuntimeError("Set TOKEN_ENCRYPTION_KEY to run more than one worker")
+    # Counters start from zero on every server start, like they would in a single process
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.metrics")):
+        os.remove(path)
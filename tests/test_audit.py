@@ -0,0 +1,36 @@
+import asyncio
+
+from app import audit
+from app.targets import canonicalize
+
+
+def test_background_fills_are_deduplicated_and_capped(monkeypatch):
+    started = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def slow_fill(name, func, *args):
+            started.append(args[0].host)
+            await gate.wait()
+
+        monkeypatch.setattr(audit, "_fill_in", slow_fill)
+        limit = audit.background_limit("ssl")
+        targets = [canonicalize(f"site{n}.example") for n in range(limit + 5)]
+
+        assert audit.fill_in_later("ssl", None, targets[0])
+        assert not audit.fill_in_later("ssl", None, canonicalize("https://www.site0.example/"))
+        accepted = [audit.fill_in_later("ssl", None, target) for target in targets[1:]]
+        await asyncio.sleep(0)
+        running = len(audit._background)
+        gate.set()
+        await asyncio.gather(*audit._background.values())
+        return accepted, running
+
+    accepted, running = asyncio.run(main())
+    limit = audit.background_limit("ssl")
+    assert limit < audit.POOL_SPECS["ssl_labs"].max_workers + audit.POOL_SPECS["ssl_labs"].queue_limit
+    assert accepted.count(True) == limit - 1
+    assert running == limit
+    assert len(started) == limit
+    assert not audit._background
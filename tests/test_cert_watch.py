@@ -0,0 +1,39 @@
+from app.cert_watch import MAX_INTERVAL, MIN_INTERVAL, CertWatchScheduler, next_check_interval
+
+
+def drain(scheduler, now):
+    due = []
+    while (domain := scheduler._pop_due(now)) is not None:
+        due.append(domain)
+    return due
+
+
+def test_due_domains_pop_in_time_order(tmp_path):
+    scheduler = CertWatchScheduler(db_path=str(tmp_path / "watch.db"))
+    for domain, when in [("c.example", 30), ("a.example", 10), ("late.example", 500), ("b.example", 20)]:
+        scheduler.schedule(domain, when)
+
+    assert drain(scheduler, now=100) == ["a.example", "b.example", "c.example"]
+    assert scheduler._next_due() == 500
+    assert len(scheduler) == 1
+
+
+def test_rescheduled_and_removed_domains_leave_stale_entries_behind(tmp_path):
+    scheduler = CertWatchScheduler(db_path=str(tmp_path / "watch.db"))
+    scheduler.schedule("moved.example", 10)
+    scheduler.schedule("gone.example", 20)
+    scheduler.schedule("kept.example", 30)
+    scheduler.schedule("moved.example", 400)  # Its entry at 10 is now stale
+    scheduler.unschedule("gone.example")
+
+    assert scheduler._next_due() == 30  # Skips the stale entries at 10 and 20
+    assert drain(scheduler, now=100) == ["kept.example"]
+    assert drain(scheduler, now=1000) == ["moved.example"]
+    assert scheduler._next_due() is None
+
+
+def test_check_interval_follows_remaining_validity():
+    now = 1_000_000
+    assert next_check_interval(None, now) == MIN_INTERVAL
+    assert next_check_interval(now + 10, now) == MIN_INTERVAL
+    assert next_check_interval(now + 10 * 365 * 86400, now) == MAX_INTERVAL
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app import collectors
+from app.collectors import plan, register, run_graph
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(collectors, "REGISTRY", {})
+
+
+async def runner(name, func, *args, default=None):
+    result = func(*args)
+    return await result if asyncio.iscoroutine(result) else result
+
+
+def test_plan_puts_dependencies_first_once():
+    register("dns", lambda target: "addresses", internal=True)
+    register("page", lambda target, dns: "html", inputs=("target", "dns"), internal=True)
+    register("meta", lambda target, page: "tags", inputs=("target", "page"), cost="cheap")
+    register("ssl", lambda target, dns: "cert", inputs=("target", "dns"))
+
+    order = plan(["meta", "ssl"])
+    assert order == ["dns", "page", "meta", "ssl"]
+
+
+def test_cycles_and_unknown_collectors_are_rejected():
+    register("a", lambda b: b, inputs=("b",))
+    register("b", lambda a: a, inputs=("a",))
+
+    with pytest.raises(ValueError, match="cycle: a -> b -> a"):
+        plan(["a"])
+    with pytest.raises(ValueError, match="Unknown collector"):
+        plan(["missing"])
+
+
+def test_run_graph_feeds_outputs_to_dependents():
+    started = []
+
+    async def slow_dns(target):
+        started.append("dns")
+        await asyncio.sleep(0.01)
+        return [f"ip-of-{target}"]
+
+    def page(target, dns):
+        started.append("page")
+        return f"{target} at {dns[0]}"
+
+    register("dns", slow_dns, internal=True)
+    register("page", page, inputs=("target", "dns"))
+    register("broken", lambda target: 1 / 0, default="fallback")
+
+    results = asyncio.run(run_graph("example.com", ["page", "broken"], runner))
+    assert results == {"page": "example.com at ip-of-example.com", "broken": "fallback"}
+    assert started == ["dns", "page"]
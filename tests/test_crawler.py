@@ -0,0 +1,82 @@
+import time
+from contextlib import closing
+
+from app import crawler
+from app.crawler import HeadParser, _add_urls, _pending, _store_pages, claim_crawl, crawl_report, queue_crawl
+
+
+def parse(html):
+    parser = HeadParser()
+    parser.feed(html)
+    return parser
+
+
+def test_head_parser_reads_head_tags():
+    parser = parse("""
+        <html><head>
+          <title>  Widgets &amp;
+            gadgets </title>
+          <meta name="Description" content=" All the widgets ">
+          <meta name="robots" content="noindex">
+          <link rel="alternate canonical" href="https://example.com/widgets">
+        </head>
+    """)
+    assert parser.title == "Widgets & gadgets"
+    assert parser.description == "All the widgets"
+    assert parser.robots == "noindex"
+    assert parser.canonical == "https://example.com/widgets"
+    assert parser.done
+
+
+def test_head_parser_stops_at_body_without_closing_head():
+    parser = parse("<title>Only a title</title><body><title>Not this one</title>")
+    assert parser.title == "Only a title"
+    assert parser.done
+
+
+def set_heartbeat(db_path, crawl_id, heartbeat_at):
+    with closing(crawler._connect(db_path)) as conn, conn:
+        conn.execute("UPDATE crawls SET heartbeat_at = ? WHERE id = ?", (heartbeat_at, crawl_id))
+
+
+def test_claim_takes_queued_crawls_once(tmp_path):
+    db_path = str(tmp_path / "crawl.db")
+    first, second = queue_crawl("example.com", db_path), queue_crawl("example.org", db_path)
+
+    assert claim_crawl(db_path) == (first, "example.com")
+    assert claim_crawl(db_path) == (second, "example.org")
+    assert claim_crawl(db_path) is None  # Both are running with fresh heartbeats
+
+
+def test_stale_crawls_are_resumed_then_failed(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "crawl.db")
+    monkeypatch.setattr(crawler, "CRAWL_MAX_ATTEMPTS", 2)
+    crawl_id = queue_crawl("example.com", db_path)
+    assert claim_crawl(db_path) == (crawl_id, "example.com")
+
+    set_heartbeat(db_path, crawl_id, time.time() - crawler.STALE_AFTER - 1)
+    assert claim_crawl(db_path) == (crawl_id, "example.com")
+    assert crawl_report(crawl_id, db_path=db_path)["attempts"] == 2
+
+    set_heartbeat(db_path, crawl_id, time.time() - crawler.STALE_AFTER - 1)
+    assert claim_crawl(db_path) is None
+    report = crawl_report(crawl_id, db_path=db_path)
+    assert report["state"] == "failed"
+    assert report["error"] == "Interrupted too often"
+
+
+def test_resumed_crawl_only_fetches_pending_pages(tmp_path):
+    db_path = str(tmp_path / "crawl.db")
+    crawl_id = queue_crawl("example.com", db_path)
+    urls = [f"https://example.com/{n}" for n in range(4)]
+    assert _add_urls(crawl_id, urls, db_path) == 4
+    assert _add_urls(crawl_id, urls[:2], db_path) == 0  # Rediscovered URLs aren't queued twice
+
+    page = {"state": "ok", "status": 200, "final_url": urls[0], "title": "Home", "description": None,
+            "canonical": None, "robots": None, "error": None, "fetched_at": time.time()}
+    _store_pages(crawl_id, [{**page, "url": urls[0]}, {**page, "url": urls[2]}], db_path)
+
+    assert [url for _, url in _pending(crawl_id, 0, db_path)] == [urls[1], urls[3]]
+    report = crawl_report(crawl_id, db_path=db_path)
+    assert (report["discovered"], report["fetched"]) == (4, 2)
+    assert report["duplicate_titles"][0]["pages"] == 2
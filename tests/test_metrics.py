@@ -0,0 +1,30 @@
+import os
+import pickle
+
+from app import metrics
+from app.metrics import CACHE_REQUESTS, UPSTREAM_QUOTA_REMAINING, registry
+
+EXITED_PID = "999999999"  # Above pid_max, so never a live process
+
+
+def write_worker(directory, pid, snapshot):
+    with open(os.path.join(directory, f"{pid}.metrics"), "wb") as f:
+        pickle.dump(snapshot, f)
+
+
+def test_scrape_merges_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    before = CACHE_REQUESTS.value("merge-test", "hit")
+    CACHE_REQUESTS.inc("merge-test", "hit")
+    UPSTREAM_QUOTA_REMAINING.set("merge-test", value=5)
+    write_worker(tmp_path, EXITED_PID, {
+        CACHE_REQUESTS.name: {("merge-test", "hit"): 3},
+        UPSTREAM_QUOTA_REMAINING.name: {("merge-test",): 7},
+    })
+
+    for _ in range(2):  # The exited worker's counts survive being archived
+        rendered = registry.render()
+        assert f'webly_cache_requests_total{{cache="merge-test",result="hit"}} {before + 4}' in rendered
+        assert f'webly_upstream_quota_remaining{{upstream="merge-test",pid="{os.getpid()}"}} 5' in rendered
+        assert f'pid="{EXITED_PID}"' not in rendered
+    assert not (tmp_path / f"{EXITED_PID}.metrics").exists()
@@ -0,0 +1,59 @@
+import threading
+
+from app import news_fetcher
+from app.news_fetcher import demultiplex
+from app.targets import canonicalize
+
+# Domains whose bare names are everyday words
+TARGETS = [canonicalize(url) for url in ("today.com", "news.com", "target.com", "apple.com")]
+
+
+def item(title, source="Some Paper", source_url="https://somepaper.example"):
+    return {
+        "title": title,
+        "link": "https://news.google.com/rss/articles/abc",
+        "description": title,
+        "source": source,
+        "source_url": source_url,
+    }
+
+
+def test_bare_names_are_not_mentions():
+    items = [
+        item("Guest appears on the Today show"),
+        item("Breaking news on the target date for the apple harvest"),
+    ]
+    assert demultiplex(items, TARGETS) == {target.site_host: [] for target in TARGETS}
+
+
+def test_publisher_host_decides():
+    published = item("Anything at all about news.com", source="TODAY", source_url="https://www.today.com")
+    result = demultiplex([published], TARGETS)
+    assert result["today.com"] == [published]
+    assert result["news.com"] == []
+
+
+def test_full_domain_mention():
+    mentioned = item("Why target.com changed its checkout")
+    assert demultiplex([mentioned], TARGETS)["target.com"] == [mentioned]
+
+
+def test_ambiguous_items_are_dropped():
+    both = item("apple.com and target.com both report outages")
+    assert all(not found for found in demultiplex([both], TARGETS).values())
+
+
+def test_slow_batch_falls_back_to_a_single_query(monkeypatch):
+    release = threading.Event()
+
+    def stuck_batch(targets, cache=True):
+        release.wait(5)
+        return {}
+
+    monkeypatch.setattr(news_fetcher, "fetch_news_batch", stuck_batch)
+    monkeypatch.setattr(news_fetcher, "fetch_google_rss_news", lambda target: [item(f"Alone: {target.site_host}")])
+    batcher = news_fetcher.NewsBatcher(window=0.01, size=10, timeout=0.1)
+    try:
+        assert batcher.fetch("today.com")[0]["title"] == "Alone: today.com"
+    finally:
+        release.set()
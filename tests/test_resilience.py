@@ -0,0 +1,49 @@
+import time
+
+from app.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test-open", failure_threshold=3, recovery_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()  # A success resets the count
+    open_breaker(breaker)
+
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("test-half-open", failure_threshold=2, recovery_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # Only the one probe
+    breaker.release_probe()
+    assert breaker.allow()  # An inconclusive probe frees the slot for another
+
+
+def test_probe_outcome_closes_or_reopens():
+    breaker = CircuitBreaker("test-probe", failure_threshold=2, recovery_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
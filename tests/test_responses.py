@@ -0,0 +1,29 @@
+from starlette.requests import Request
+
+from app.responses import conditional_json
+
+
+def request(headers=None):
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def audit(probe_ms, days_remaining, grade="A"):
+    return {"collectors": {
+        "http": {"status": 200, "probe_ms": probe_ms, "timings_ms": {"total": {"median": probe_ms}},
+                 "redirects": [{"url": "https://example.com", "status": 200, "ms": probe_ms}]},
+        "ssl": {"grade": grade, "certificate": {"days_remaining": days_remaining}},
+    }}
+
+
+def test_timings_do_not_change_the_etag():
+    first = conditional_json(request(), audit(120.5, 40))
+    again = conditional_json(request({"If-None-Match": first.headers["ETag"]}), audit(98.1, 39))
+    assert again.status_code == 304
+
+
+def test_changed_results_change_the_etag():
+    first = conditional_json(request(), audit(120.5, 40))
+    changed = conditional_json(request({"If-None-Match": first.headers["ETag"]}), audit(120.5, 40, grade="B"))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
@@ -0,0 +1,28 @@
+import asyncio
+import time
+
+from app.executors import BoundedPool, PoolSpec
+from app.runtime_monitor import MonitoredExecutor
+
+
+def test_cancelled_jobs_leave_the_queue():
+    executor = MonitoredExecutor(max_workers=1, name="test-cancel")
+    futures = [executor.submit(time.sleep, 0.2) for _ in range(3)]
+    assert [future.cancel() for future in futures[1:]] == [True, True]
+    futures[0].result()
+    assert executor.snapshot()["queued"] == 0
+    executor.shutdown()
+
+
+def test_pool_timeouts_do_not_leak_queue_depth():
+    pool = BoundedPool("test-timeout", PoolSpec(max_workers=1, queue_limit=4, timeout=0.2))
+
+    async def main():
+        results = await asyncio.gather(*(pool.run(time.sleep, 0.5) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, TimeoutError) for result in results)
+
+    asyncio.run(main())
+    time.sleep(0.6)  # The job that was already running finishes in the background
+    assert pool.executor.snapshot()["queued"] == 0
+    assert pool.pending == 0
+    pool.shutdown()
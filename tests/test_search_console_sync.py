@@ -0,0 +1,59 @@
+from contextlib import closing
+from datetime import date, timedelta
+
+from app import search_console_sync
+from app.search_console_sync import DATA_DELAY_DAYS, get_last_synced_date, sync_site
+
+SITE = "sc-domain:example.com"
+
+
+class FakeResponse:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"rows": self.rows}
+
+
+class FakeSession:
+    """Answers searchAnalytics queries with one row per requested day"""
+
+    def post(self, url, json, timeout):
+        start, end = date.fromisoformat(json["startDate"]), date.fromisoformat(json["endDate"])
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        return FakeResponse([{"keys": [day.isoformat(), "q", "/", "usa", "DESKTOP"], "clicks": 1,
+                              "impressions": 10, "position": 3} for day in days])
+
+
+def stored_dates(db_path):
+    with closing(search_console_sync._connect(db_path)) as conn:
+        return [row[0] for row in conn.execute("SELECT date FROM sc_rows ORDER BY date")]
+
+
+def test_sync_prunes_rows_past_retention(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sc.db")
+    end_date = date.today() - timedelta(days=DATA_DELAY_DAYS)
+    with closing(search_console_sync._connect(db_path)) as conn, conn:
+        conn.execute("INSERT INTO sc_rows VALUES (?, ?, 'q', '/', 'usa', 'DESKTOP', 1, 10, 3)",
+                     (SITE, (end_date - timedelta(days=500)).isoformat()))
+    monkeypatch.setattr(search_console_sync, "RETENTION_DAYS", 120)
+
+    assert sync_site(FakeSession(), SITE, db_path) == search_console_sync.HISTORY_DAYS
+    dates = stored_dates(db_path)
+    assert dates[0] == (end_date - timedelta(days=search_console_sync.HISTORY_DAYS - 1)).isoformat()
+    assert get_last_synced_date(SITE, db_path) == end_date
+
+
+def test_backfill_runs_once_per_site(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sc.db")
+    calls = []
+    monkeypatch.setattr(search_console_sync, "sync_site", lambda session, site, path: calls.append(site))
+    monkeypatch.setattr(search_console_sync._backfill_executor, "submit", lambda fn, *args: calls.append("queued"))
+
+    assert search_console_sync.start_backfill({}, SITE, db_path)
+    assert not search_console_sync.start_backfill({}, SITE, db_path)
+    assert calls == ["queued"]
+    search_console_sync._backfilling.discard(SITE)
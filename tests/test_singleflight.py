@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app import audit
+from app.singleflight import SingleFlight
+from app.targets import canonicalize
+
+
+def test_concurrent_calls_share_one_run():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        flights = SingleFlight("test")
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+        return results, len(flights)
+
+    results, in_flight = asyncio.run(main())
+    assert results == [1] * 5
+    assert calls == 1
+    assert in_flight == 0
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        flights = SingleFlight("test")
+        results = await asyncio.gather(*(flights.do("key", failing) for _ in range(3)), return_exceptions=True)
+        # The failed flight is gone, so the next call runs again
+        with pytest.raises(RuntimeError):
+            await flights.do("key", failing)
+        return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == 2
+
+
+def test_coroutine_collectors_are_coalesced():
+    calls = 0
+
+    async def probe(target):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"host": target.host}
+
+    async def main():
+        target = canonicalize("example.com")
+        return await asyncio.gather(*(audit.run_collector("coalesce-test", probe, target) for _ in range(4)))
+
+    assert asyncio.run(main()) == [{"host": "example.com"}] * 4
+    assert calls == 1
@@ -0,0 +1,24 @@
+import pytest
+
+from app.targets import canonicalize
+
+
+def test_scheme_inside_query_is_not_a_scheme():
+    assert canonicalize("example.com/?next=http://x").url == "https://example.com"
+
+
+def test_ipv6_hosts_stay_bracketed():
+    target = canonicalize("[::1]:8443")
+    assert target.url == "https://[::1]:8443"
+    assert target.hostname == "::1"
+    assert target.port == 8443
+    assert canonicalize("https://[::1]:443/a").url == "https://[::1]/a"
+
+
+def test_spellings_of_one_site_share_a_key():
+    assert canonicalize("HTTPS://www.Example.COM:443/").key == canonicalize("sc-domain:example.com").key
+
+
+def test_empty_url_is_rejected():
+    with pytest.raises(ValueError):
+        canonicalize("  ")
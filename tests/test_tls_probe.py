@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.tls_probe import probe_tls
+from benchmarks.stub_server import StubServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = StubServer().start()
+    yield server
+    server.stop()
+
+
+def test_probe_against_stub_server(server):
+    result = asyncio.run(probe_tls(server.tls_url, cafile=server.cert_path, addresses=["127.0.0.1"]))
+
+    assert result["basic_info"]["source"] == "local_probe"
+    assert result["certificates"]["subject"] == "localhost"
+    assert result["certificates"]["verification_error"] is None
+    assert {"TLS 1.2", "TLS 1.3"} <= set(result["protocols"]["supported"])
+    # The stub's ECDSA key admits several ECDHE-ECDSA suites, each found by its own handshake
+    tls12 = result["cipher_suites"]["tls12"]
+    assert len(tls12) > 1
+    assert all(cipher.startswith("ECDHE-ECDSA") for cipher in tls12)
+    assert result["cipher_suites"]["forward_secrecy"]
+
+
+def test_untrusted_certificate_is_reported(server):
+    result = asyncio.run(probe_tls(server.tls_url, addresses=["127.0.0.1"]))
+
+    assert result["certificates"]["verification_error"]
+    assert result["basic_info"]["has_warnings"]